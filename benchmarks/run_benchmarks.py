@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import argparse
+import statistics
+import subprocess
+import multiprocessing as mp
+from collections import namedtuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import torch
+from hbo_bench.oracle import Oracle, OracleKey
+from hbo_bench.query_explorer import SearchingSettings
+from hbo_bench.runner import run_benchmark
+from hbo_bench.utils import extract_list_info
+from hbo_bench.vectorization import extract_vertices_and_edges
+from hbo_bench.dataset import WeightedBinaryTreeDataset, weighted_binary_tree_collate
+from hbo_bench.data_config import BENCH_NAMES, DOPS, HINTSETS
+from hbo_bench import local_search_settings
+
+# every case gets path to processed benchmark, prepares everything it needs and returns
+# `(timed function, number of items it processes)`; only the function is timed
+Case = Callable[[str], Tuple[Callable[[], Any], int]]
+# `setup_rss_mb` is the peak after imports and the setup of case, so `peak_rss_mb - setup_rss_mb` is due to the function
+CaseResult = namedtuple("CaseResult", ["seconds", "n_items", "setup_rss_mb", "peak_rss_mb"])
+COLLATE_BATCH_SIZE = 256
+
+PRESETS: "Dict[str, SearchingSettings]" = {
+    name: value for name, value in vars(local_search_settings).items() if isinstance(value, SearchingSettings)
+}
+
+
+def _get_all_requests(oracle: "Oracle") -> "List[OracleKey]":
+    return [OracleKey(name, dop, hintset) for name in oracle.get_query_names() for dop in DOPS for hintset in HINTSETS]
+
+
+def oracle_load(path_to_bench: "str") -> "Tuple[Callable[[], Any], int]":
+    return lambda: Oracle(path_to_bench), 1
+
+
+def oracle_load_store(path_to_bench: "str") -> "Tuple[Callable[[], Any], int]":
+    Oracle(path_to_bench, use_store=True)  # the store is compiled on the first opening
+    return lambda: Oracle(path_to_bench, use_store=True), 1
+
+
+def scalar_lookups(path_to_bench: "str") -> "Tuple[Callable[[], Any], int]":
+    oracle = Oracle(path_to_bench, use_store=True)
+    requests = _get_all_requests(oracle)
+
+    def run() -> "None":
+        for request in requests:
+            oracle.get_planning_time(request)
+            oracle.get_execution_time(request)
+
+    return run, len(requests)
+
+
+def batched_lookups(path_to_bench: "str") -> "Tuple[Callable[[], Any], int]":
+    oracle = Oracle(path_to_bench, use_store=True)
+    requests = _get_all_requests(oracle)
+    query_names, dops, hintsets = zip(*requests)
+
+    def run() -> "None":
+        oracle.get_planning_times()
+        oracle.get_execution_times(query_names, dops, hintsets)
+
+    return run, len(requests)
+
+
+def vectorization(path_to_bench: "str") -> "Tuple[Callable[[], Any], int]":
+    oracle = Oracle(path_to_bench, use_store=True)
+    plans = [oracle.get_explain_plan(request) for request in _get_all_requests(oracle)]
+    return lambda: [extract_vertices_and_edges(plan) for plan in plans], len(plans)
+
+
+def list_info_extraction(path_to_bench: "str") -> "Tuple[Callable[[], Any], int]":
+    oracle = Oracle(path_to_bench)
+    oracle.get_effective_execution_times()  # the table is built (or loaded) once per benchmark
+    query_names = oracle.get_query_names()
+    return lambda: extract_list_info(oracle, query_names), len(query_names) * len(DOPS) * len(HINTSETS)
+
+
+def _get_dataset_factory(path_to_bench: "str") -> "Tuple[Callable[[], WeightedBinaryTreeDataset], int]":
+    """constructor of the dataset of all records of benchmark and the number of records"""
+    oracle = Oracle(path_to_bench)
+    list_info = extract_list_info(oracle, oracle.get_query_names())
+    list_vertices, list_edges = [info["vertices"] for info in list_info], [info["edges"] for info in list_info]
+    list_time, tree_ids = [info["time"] for info in list_info], [info["plan_id"] for info in list_info]
+    return (
+        lambda: WeightedBinaryTreeDataset(list_vertices, list_edges, list_time, torch.device("cpu"), tree_ids),
+        len(list_info),
+    )
+
+
+def dataset_construction(path_to_bench: "str") -> "Tuple[Callable[[], Any], int]":
+    return _get_dataset_factory(path_to_bench)
+
+
+def collate(path_to_bench: "str") -> "Tuple[Callable[[], Any], int]":
+    dataset = _get_dataset_factory(path_to_bench)[0]()
+    batches = [
+        [dataset[idx] for idx in range(start, min(start + COLLATE_BATCH_SIZE, len(dataset)))]
+        for start in range(0, len(dataset), COLLATE_BATCH_SIZE)
+    ]
+    return lambda: [weighted_binary_tree_collate(batch) for batch in batches], len(dataset)
+
+
+def collate_packed(path_to_bench: "str") -> "Tuple[Callable[[], Any], int]":
+    dataset = _get_dataset_factory(path_to_bench)[0]()
+    batches = [
+        dataset[list(range(start, min(start + COLLATE_BATCH_SIZE, len(dataset))))]
+        for start in range(0, len(dataset), COLLATE_BATCH_SIZE)
+    ]
+    return lambda: [weighted_binary_tree_collate(batch) for batch in batches], len(dataset)
+
+
+def _get_explorer_case(settings: "SearchingSettings") -> "Case":
+    def explorer_run(path_to_bench: "str") -> "Tuple[Callable[[], Any], int]":
+        oracle = Oracle(path_to_bench, use_store=True)
+        return lambda: run_benchmark(oracle, settings), len(oracle.get_query_names())
+
+    return explorer_run
+
+
+CASES: "Dict[str, Case]" = {
+    "oracle_load": oracle_load,
+    "oracle_load_store": oracle_load_store,
+    "scalar_lookups": scalar_lookups,
+    "batched_lookups": batched_lookups,
+    "vectorization": vectorization,
+    "extract_list_info": list_info_extraction,
+    "dataset_construction": dataset_construction,
+    "collate": collate,
+    "collate_packed": collate_packed,
+    **{f"explorer_run[{name}]": _get_explorer_case(settings) for name, settings in PRESETS.items()},
+}
+
+
+def _get_peak_rss_mb() -> "float":
+    # `ru_maxrss` is in kilobytes on linux and in bytes on macos
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / 2**20 if sys.platform == "darwin" else peak_rss / 2**10
+
+
+def _run_case(case_name: "str", path_to_bench: "str", repeat: "int") -> "CaseResult":
+    func, n_items = CASES[case_name](path_to_bench)
+    setup_rss_mb = _get_peak_rss_mb()
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    return CaseResult(seconds=seconds, n_items=n_items, setup_rss_mb=setup_rss_mb, peak_rss_mb=_get_peak_rss_mb())
+
+
+def run_case(case_name: "str", path_to_bench: "str", repeat: "int" = 3) -> "Dict[str, Any]":
+    """the case is run in a fresh process, so its peak RSS and timings don't depend on the previous cases"""
+    with mp.get_context("spawn").Pool(1) as pool:
+        result: "CaseResult" = pool.apply(_run_case, (case_name, path_to_bench, repeat))
+    median = statistics.median(result.seconds)
+    return {
+        "case": case_name,
+        "bench": os.path.basename(os.path.normpath(path_to_bench)),
+        "seconds": result.seconds,
+        "min_seconds": min(result.seconds),
+        "median_seconds": median,
+        "n_items": result.n_items,
+        "items_per_second": result.n_items / median if median > 0 else float("inf"),
+        "setup_rss_mb": result.setup_rss_mb,
+        "peak_rss_mb": result.peak_rss_mb,
+        "case_rss_mb": result.peak_rss_mb - result.setup_rss_mb,
+    }
+
+
+def _get_commit() -> "Optional[str]":
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: "List[Dict[str, Any]]", baseline: "List[Dict[str, Any]]") -> "Dict[str, float]":
+    """ratios of median times `current / baseline` for cases present in both runs (> 1 means regression)"""
+    key_to_baseline = {(res["bench"], res["case"]): res["median_seconds"] for res in baseline}
+    return {
+        f"{res['bench']}/{res['case']}": res["median_seconds"] / key_to_baseline[res["bench"], res["case"]]
+        for res in results
+        if key_to_baseline.get((res["bench"], res["case"]), 0) > 0
+    }
+
+
+if __name__ == "__main__":
+    PATH_TO_PROCESSED = "src/hbo_bench/data/processed"
+    parser = argparse.ArgumentParser(description="Performance benchmarks of hbo_bench")
+    parser.add_argument("--path-to-processed", default=PATH_TO_PROCESSED)
+    parser.add_argument("--bench-names", nargs="*", default=BENCH_NAMES, choices=BENCH_NAMES)
+    parser.add_argument("--cases", nargs="*", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None, help="path to JSON with results, stdout by default")
+    parser.add_argument("--baseline", default=None, help="path to JSON of a previous run to compare with")
+    args = parser.parse_args()
+
+    all_results = []
+    for bench_name in args.bench_names:
+        for name in args.cases:
+            case_result = run_case(name, f"{args.path_to_processed}/{bench_name}", args.repeat)
+            print(
+                f"{bench_name:>16} {name:<40} {case_result['median_seconds']:10.4f}s "
+                f"{case_result['peak_rss_mb']:10.1f}MB (+{case_result['case_rss_mb']:.1f}MB after setup)",
+                file=sys.stderr,
+            )
+            all_results.append(case_result)
+
+    report: "Dict[str, Any]" = {
+        "commit": _get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": all_results,
+    }
+    if args.baseline is not None:
+        with open(args.baseline, "r") as baseline_file:
+            report["ratios_to_baseline"] = compare(all_results, json.load(baseline_file)["results"])
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
@@ -1,11 +1,24 @@
-from json import load, dumps, dump
+from json import load, dumps, JSONDecoder, JSONDecodeError
 import os
-from typing import Dict
+import shutil
+import hashlib
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
 from hbo_bench.data_types import Plans
 
 BENCH_NAMES = ["JOB", "sample_queries", "tpch_10gb"]
 DOPS = [1, 16, 64]
 
+# must be changed along with the processing logic, it invalidates all previously processed data
+PIPELINE_VERSION = 1
+MANIFEST_NAME = ".manifest.json"
+LEGACY_FRAGMENTS_FOLDER = ".fragments"
+READ_CHUNK_SIZE = 2**20
+
+Manifest = Dict[str, Dict[str, Dict[str, str]]]  # bench_name -> dop -> sql_name -> hash of raw data
+
 
 def _unify_actual_rows(root: "dict") -> "None":
     def recurse(node: "dict"):
@@ -18,51 +31,247 @@ def _unify_actual_rows(root: "dict") -> "None":
     recurse(node=root)
 
 
-def process_raw_data(path_to_raw: "str", path_to_processed: "str", bench_name: "str") -> "None":
-    bench_data: "Dict[str, Dict[str, Dict]]" = {}
+class _ChunkedText:
+    def __init__(self, text_file: "TextIO", chunk_size: "int"):
+        """text of `text_file` read by chunks, consumed characters are dropped on every read"""
+        self.text_file, self.chunk_size = text_file, chunk_size
+        self.text, self.pos = "", 0
+
+    def _read(self, size: "int") -> "bool":
+        chunk = self.text_file.read(size)
+        if not chunk:
+            return False
+        self.text, self.pos = self.text[self.pos :] + chunk, 0
+        return True
+
+    def peek(self) -> "str":
+        """next non-whitespace character, empty at the end of file"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in " \t\n\r":
+                self.pos += 1
+            if self.pos < len(self.text) or not self._read(self.chunk_size):
+                return self.text[self.pos : self.pos + 1]
+
+    def consume(self, char: "str") -> "bool":
+        if self.peek() != char:
+            return False
+        self.pos += 1
+        return True
+
+    def decode(self, decoder: "JSONDecoder") -> "Tuple[Any, str]":
+        """next json value and its raw text"""
+        self.peek()
+        while True:
+            # the buffer is at least doubled on every retry, so long values are decoded in linear time
+            retry_size = max(self.chunk_size, len(self.text) - self.pos)
+            try:
+                value, end = decoder.raw_decode(self.text, self.pos)
+            except JSONDecodeError:
+                if not self._read(retry_size):
+                    raise
+                continue
+            # a number can be cut by the end of buffer
+            if end == len(self.text) and self._read(retry_size):
+                continue
+            raw_value, self.pos = self.text[self.pos : end], end
+            return value, raw_value
+
+
+def iterate_raw_queries(
+    path_to_raw_file: "str", chunk_size: "int" = READ_CHUNK_SIZE
+) -> "Iterator[Tuple[str, dict, str]]":
+    """
+    Decodes the top-level object `{sql_name: sql_data}` one entry at a time from chunks of `chunk_size`
+    characters (so only about one query is held in memory) and yields `(sql_name, sql_data, hash of raw sql_data)`.
+    """
+    decoder = JSONDecoder()
+    with open(path_to_raw_file, "r") as raw_data_file:
+        text = _ChunkedText(raw_data_file, chunk_size)
+        assert text.consume("{"), f"Unexpected format of {path_to_raw_file}"
+        while not text.consume("}"):
+            sql_name, _ = text.decode(decoder)
+            assert text.consume(":"), f"Unexpected format of {path_to_raw_file}"
+            sql_data, raw_sql_data = text.decode(decoder)
+            yield sql_name, sql_data, hashlib.sha1(raw_sql_data.encode()).hexdigest()
+            assert text.consume(",") or text.peek() == "}", f"Unexpected format of {path_to_raw_file}"
+        assert text.peek() == "", f"Unexpected format of {path_to_raw_file}"
+
+
+def process_query_data(sql_data: "dict", dop: "int", validate: "bool" = False) -> "Dict[str, Dict]":
+    query_data = {}
+    hs_to_planning_time = sql_data["hs_to_planning_time"]
+    explain_plan_to_explain_analyze_plan = sql_data["explain_plan_to_explain_analyze_plan"]
+    for hs, explain_plan in sql_data["hs_to_explain_plan"].items():
+        # keys are exactly `json.dumps` of plans, so it's the only way to match them
+        explain_analyze_plan = explain_plan_to_explain_analyze_plan[dumps(explain_plan)]
+        if "Timeout" in explain_analyze_plan:
+            explain_analyze_plan = None
+        else:
+            _unify_actual_rows(root=explain_analyze_plan["Plan"])
+
+        explain_plan["Planner Runtime"] = hs_to_planning_time[str(hs)]
+        if explain_analyze_plan:
+            explain_analyze_plan["Planner Runtime"] = hs_to_planning_time[str(hs)]
+
+        query_data[str((dop, int(hs)))] = {
+            "explain_plan": explain_plan,
+            "explain_analyze_plan": explain_analyze_plan,
+        }
+        if validate:
+            assert Plans(**query_data[str((dop, int(hs)))])
+    return query_data
+
+
+def _get_path_to_output(path_to_processed: "str", bench_name: "str", sql_name: "str") -> "str":
+    return f"{path_to_processed}/{bench_name}/{sql_name.split('.')[0]}.json"
+
+
+def _get_dop(settings: "str") -> "int":
+    return int(settings[1:].split(",")[0])
+
+
+def _write_text(text: "str", path: "str") -> "None":
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _write_json(data: "dict", path: "str") -> "None":
+    # `json.dump` always uses the pure python encoder, `json.dumps` gives the same text with the C one
+    _write_text(dumps(data), path)
+
+
+def update_output(path_to_output: "str", dop_to_text: "Dict[int, Optional[str]]") -> "None":
+    """
+    Replaces settings of the given dops in processed data of query with serialized (by `json.dumps`) ones
+    from `dop_to_text` (removes them for `None`) by a single write; the file is read only if some dops are kept.
+    Settings are kept in the order of `DOPS`, and the file is removed when no settings are left.
+    """
+    dop_to_text = {dop: "{}" if text is None else text for dop, text in dop_to_text.items()}
+    if any(dop not in dop_to_text for dop in DOPS) and os.path.exists(path_to_output):
+        with open(path_to_output, "r") as output_file:
+            query_data: "Dict[str, Dict]" = load(output_file)
+        dop_to_query_data: "Dict[int, Dict[str, Dict]]" = {dop: {} for dop in DOPS}
+        for settings, plans in query_data.items():
+            dop_to_query_data[_get_dop(settings)][settings] = plans
+        for dop, dop_query_data in dop_to_query_data.items():
+            dop_to_text.setdefault(dop, dumps(dop_query_data))
+    # items of serialized objects are joined as `json.dumps` does it
+    items = [dop_to_text[dop][1:-1] for dop in DOPS if dop_to_text.get(dop, "{}") != "{}"]
+    if items:
+        _write_text("{" + ", ".join(items) + "}", path_to_output)
+    elif os.path.exists(path_to_output):
+        os.remove(path_to_output)
+
+
+def process_benchmark(
+    path_to_raw: "str",
+    path_to_processed: "str",
+    bench_name: "str",
+    known_hashes: "Dict[str, Dict[str, str]]",
+    *,
+    validate: "bool" = False,
+    chunk_size: "int" = READ_CHUNK_SIZE,
+) -> "Tuple[Dict[str, Dict[str, str]], List[str]]":
+    """
+    Streams raw files of `bench_name` dop by dop and updates processed data of a query only for dops,
+    where its raw data has changed (or for all dops, if the query has no processed data). Settings of queries
+    that have disappeared from raw data are pruned. Changes of all dops are collected first, so every updated
+    query file is written once. Returns hashes of raw data and names of updated queries.
+    """
+    hashes: "Dict[str, Dict[str, str]]" = {}
+    is_output_missing: "Dict[str, bool]" = {}
+    # serialized processed data of changed dops, every query file is written once after all raw files are read
+    sql_name_to_updates: "Dict[str, Dict[int, Optional[str]]]" = defaultdict(dict)
     for dop in DOPS:
-        with open(f"{path_to_raw}/dop{dop}/{bench_name}.json", "r") as raw_data_file:
-            raw_data = load(raw_data_file)
+        path_to_raw_file = f"{path_to_raw}/dop{dop}/{bench_name}.json"
+        if not os.path.exists(path_to_raw_file):
+            continue
+        dop_known_hashes, dop_hashes = known_hashes.get(str(dop), {}), hashes.setdefault(str(dop), {})
+        for sql_name, sql_data, sql_hash in iterate_raw_queries(path_to_raw_file, chunk_size):
+            dop_hashes[sql_name] = sql_hash
+            if sql_name not in is_output_missing:
+                path_to_output = _get_path_to_output(path_to_processed, bench_name, sql_name)
+                is_output_missing[sql_name] = not os.path.exists(path_to_output)
+            if dop_known_hashes.get(sql_name) == sql_hash and not is_output_missing[sql_name]:
+                continue
+            sql_name_to_updates[sql_name][dop] = dumps(process_query_data(sql_data, dop, validate))
+
+    for dop_key, dop_known_hashes in known_hashes.items():
+        for sql_name in set(dop_known_hashes) - set(hashes.get(dop_key, {})):
+            sql_name_to_updates[sql_name][int(dop_key)] = None
 
-        for sql_name, sql_data in raw_data.items():
-            bench_data[sql_name] = bench_data.get(sql_name, {})
+    for sql_name, dop_to_text in sql_name_to_updates.items():
+        update_output(_get_path_to_output(path_to_processed, bench_name, sql_name), dop_to_text)
+    return hashes, sorted(sql_name_to_updates)
 
-            for hs, explain_plan in sql_data["hs_to_explain_plan"].items():
-                explain_analyze_plan = sql_data["explain_plan_to_explain_analyze_plan"][dumps(explain_plan)]
-                if "Timeout" in explain_analyze_plan:
-                    explain_analyze_plan = None
-                else:
-                    _unify_actual_rows(root=explain_analyze_plan["Plan"])
 
-                explain_plan["Planner Runtime"] = sql_data["hs_to_planning_time"][str(hs)]
-                if explain_analyze_plan:
-                    explain_analyze_plan["Planner Runtime"] = sql_data["hs_to_planning_time"][str(hs)]
+def _load_manifest(path_to_processed: "str") -> "Manifest":
+    path_to_manifest = f"{path_to_processed}/{MANIFEST_NAME}"
+    if not os.path.exists(path_to_manifest):
+        return {}
+    with open(path_to_manifest, "r") as manifest_file:
+        manifest = load(manifest_file)
+    return manifest["benchmarks"] if manifest.get("version") == PIPELINE_VERSION else {}
 
-                bench_data[sql_name][str((dop, int(hs)))] = {
-                    "explain_plan": explain_plan,
-                    "explain_analyze_plan": explain_analyze_plan,
-                }
-                assert Plans(**bench_data[sql_name][str((dop, int(hs)))])
 
-    os.mkdir(f"{path_to_processed}/{bench_name}")
+def _save_manifest(path_to_processed: "str", manifest: "Manifest") -> "None":
+    _write_json({"version": PIPELINE_VERSION, "benchmarks": manifest}, f"{path_to_processed}/{MANIFEST_NAME}")
 
-    for sql_name, sql_data in bench_data.items():
-        with open(f"{path_to_processed}/{bench_name}/{sql_name.split('.')[0]}.json", "w") as f:
-            dump(sql_data, f)
+
+def process_raw_data(
+    path_to_raw: "str",
+    path_to_processed: "str",
+    bench_names: "Optional[List[str]]" = None,
+    workers: "int" = 1,
+    validate: "bool" = False,
+) -> "Dict[str, List[str]]":
+    """
+    Incrementally (re)builds processed data: every benchmark is handled by a separate worker (see
+    `process_benchmark`), and only queries whose raw data has changed since the previous run are processed.
+    Returns names of updated (including removed) queries for every benchmark.
+    """
+    bench_names = BENCH_NAMES if bench_names is None else bench_names
+    manifest = _load_manifest(path_to_processed)
+    # per-query fragments of the previous versions of the pipeline duplicated all processed data
+    shutil.rmtree(f"{path_to_processed}/{LEGACY_FRAGMENTS_FOLDER}", ignore_errors=True)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            bench_name: executor.submit(
+                process_benchmark,
+                path_to_raw,
+                path_to_processed,
+                bench_name,
+                manifest.get(bench_name, {}),
+                validate=validate,
+            )
+            for bench_name in bench_names
+        }
+        bench_to_updated: "Dict[str, List[str]]" = {}
+        for bench_name, future in futures.items():
+            manifest[bench_name], bench_to_updated[bench_name] = future.result()
+
+    _save_manifest(path_to_processed, manifest)
+    return bench_to_updated
 
 
 if __name__ == "__main__":
     DATA_FOLDER = "src/hbo_bench/data"
-    for name in BENCH_NAMES:
-        if os.path.exists(f"{DATA_FOLDER}/processed/{name}"):
-            print(f"Please, clear the folder '{DATA_FOLDER}/processed/{name}' before processing")
-            break
-    else:
-        for name in BENCH_NAMES:
-            print(f"Processing raw data from '{name}' has been started")
-            process_raw_data(
-                path_to_processed=f"{DATA_FOLDER}/processed",
-                path_to_raw=f"{DATA_FOLDER}/raw",
-                bench_name=name,
-            )
-            print(f"Raw data for '{name}' has been processed")
+    parser = argparse.ArgumentParser(description="Incremental processing of raw data")
+    parser.add_argument("--data-folder", default=DATA_FOLDER)
+    parser.add_argument("--bench-names", nargs="*", default=BENCH_NAMES, choices=BENCH_NAMES)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--validate", action="store_true", help="validate every processed entry with pydantic")
+    args = parser.parse_args()
+
+    updated = process_raw_data(
+        path_to_raw=f"{args.data_folder}/raw",
+        path_to_processed=f"{args.data_folder}/processed",
+        bench_names=args.bench_names,
+        workers=args.workers,
+        validate=args.validate,
+    )
+    for name, updated_sql_names in updated.items():
+        print(f"Raw data for '{name}' has been processed, {len(updated_sql_names)} queries have been updated")
@@ -0,0 +1,136 @@
+from typing import List, Optional, Tuple
+import numpy as np
+from hbo_bench.oracle import Oracle
+from hbo_bench.query_explorer import (
+    SearchingSettings,
+    SearchingState,
+    ALL_STATES,
+    STATE_TO_CODE,
+    N_STATES,
+    get_settings_neighbor_table,
+    get_hardcoded_batches,
+    is_hardcoded,
+)
+from hbo_bench.data_types import QueryName
+
+PADDING_CODE = -1
+
+
+def get_padded_neighbor_table(settings: "SearchingSettings") -> "np.ndarray":
+    """`[n_states, max_n_neighbors]` array version of `get_neighbor_table`, padded with `PADDING_CODE`"""
+    table = get_settings_neighbor_table(settings)
+    padded_table = np.full((N_STATES, max(len(row) for row in table)), PADDING_CODE, dtype=np.int64)
+    for code, row in enumerate(table):
+        padded_table[code, : len(row)] = row
+    return padded_table
+
+
+class BatchQueryExplorer:
+    def __init__(
+        self,
+        oracle: "Oracle",
+        settings: "SearchingSettings",
+        query_names: "Optional[List[QueryName]]" = None,
+    ):
+        """
+        Runs `QueryExplorer.run` for all queries in lockstep: every iteration is a handful of
+        array operations over `[n_queries, n_states]` tables, and the results (best states,
+        parallel times, tried and explored states) are identical to the ones of `QueryExplorer`.
+        """
+        self.oracle = oracle
+        self.settings = settings
+        self.query_names = oracle.get_query_names() if query_names is None else query_names
+        self.neighbor_table = get_padded_neighbor_table(settings)
+
+        # `[query, dop, hintset]` -> `[query, code]`, see `STATE_TO_CODE`
+        n_queries = len(self.query_names)
+        planning_times = oracle.get_planning_times(self.query_names).transpose(0, 2, 1).reshape(n_queries, -1) / 1000
+        execution_times = oracle.get_execution_times(self.query_names).transpose(0, 2, 1).reshape(n_queries, -1) / 1000
+        self.state_planning_times = planning_times
+        self.state_e2e_times = planning_times + execution_times
+
+        self.tried_mask = np.zeros((n_queries, N_STATES), dtype=bool)
+        self.explored_mask = np.zeros((n_queries, N_STATES), dtype=bool)
+        self.parallel_planning_times = np.zeros(n_queries)
+        self.parallel_e2e_times = np.zeros(n_queries)
+
+    def get_e2e_times(self, states: "List[SearchingState]") -> "np.ndarray":
+        codes = [STATE_TO_CODE[state] for state in states]
+        return self.state_e2e_times[np.arange(len(self.query_names)), codes]
+
+    def _explore_in_parallel(
+        self, neighbors: "np.ndarray", is_valid: "np.ndarray", timeouts: "np.ndarray", is_active: "np.ndarray"
+    ) -> "Tuple[np.ndarray, np.ndarray]":
+        """vectorized `QueryExplorer._explore_codes_in_parallel` for the active queries"""
+        rows = np.arange(len(self.query_names))[:, None]
+        self.tried_mask[np.broadcast_to(rows, neighbors.shape)[is_valid], neighbors[is_valid]] = True
+
+        e2e_times = np.where(is_valid, self.state_e2e_times[rows, neighbors], np.inf)
+        min_e2e_times = e2e_times.min(axis=1)
+        # ties are broken by the smallest code, as `min` over `(time, code)` pairs does
+        is_best = is_valid & (e2e_times == min_e2e_times[:, None])
+        best_codes = np.where(is_best, neighbors, N_STATES).min(axis=1)
+
+        timeouts = np.minimum(timeouts, min_e2e_times)
+        planning_times = np.minimum(self.state_planning_times[rows, neighbors], timeouts[:, None])
+        self.parallel_planning_times[is_active] += np.where(is_valid, planning_times, -np.inf).max(axis=1)[is_active]
+        e2e_times = np.minimum(e2e_times, timeouts[:, None])
+        self.parallel_e2e_times[is_active] += np.where(is_valid, e2e_times, np.inf).min(axis=1)[is_active]
+
+        is_explored = is_active & (min_e2e_times <= timeouts)
+        self.explored_mask[np.nonzero(is_explored)[0], best_codes[is_explored]] = True
+        return min_e2e_times, best_codes
+
+    def _run_hardcoded(self) -> "List[SearchingState]":
+        """vectorized `QueryExplorer._run_hardcoded`"""
+        n_queries = len(self.query_names)
+        def_code = STATE_TO_CODE[SearchingState(self.settings.default_hintset, self.settings.default_dop)]
+        record_codes = np.full(n_queries, def_code, dtype=np.int64)
+        record_times = np.full(n_queries, np.inf)
+        for batch in get_hardcoded_batches(self.settings):
+            timeouts = record_times / self.settings.relative_boost_threshold
+            neighbors = np.broadcast_to(np.array(batch, dtype=np.int64), (n_queries, len(batch)))
+            is_valid = np.ones(neighbors.shape, dtype=bool)
+            if self.settings.prune_hardcoded:
+                is_valid &= self.state_planning_times[:, batch] < timeouts[:, None]
+            is_active = np.asarray(is_valid.any(axis=1))
+            if not is_active.any():
+                continue
+            min_e2e_times, best_codes = self._explore_in_parallel(neighbors, is_valid, timeouts, is_active)
+            is_improved = is_active & (record_times / min_e2e_times > self.settings.relative_boost_threshold)
+            record_codes = np.where(is_improved, best_codes, record_codes)
+            record_times = np.where(is_improved, min_e2e_times, record_times)
+
+        return [ALL_STATES[code] for code in record_codes]
+
+    def run(self) -> "List[SearchingState]":
+        if is_hardcoded(self.settings):
+            return self._run_hardcoded()
+
+        n_queries = len(self.query_names)
+        rows = np.arange(n_queries)[:, None]
+        def_code = STATE_TO_CODE[SearchingState(self.settings.default_hintset, self.settings.default_dop)]
+        prev_codes = np.full(n_queries, PADDING_CODE, dtype=np.int64)
+        record_codes = np.full(n_queries, def_code, dtype=np.int64)
+        record_times = np.full(n_queries, np.inf)
+        is_active = np.ones(n_queries, dtype=bool)
+        it = 0
+        while it < self.settings.max_iter:
+            is_active &= prev_codes != record_codes
+            timeouts, prev_codes = record_times / self.settings.relative_boost_threshold, record_codes.copy()
+
+            neighbors = self.neighbor_table[record_codes]
+            is_valid = neighbors != PADDING_CODE
+            neighbors = np.where(is_valid, neighbors, 0)
+            is_valid &= ~self.tried_mask[rows, neighbors] & is_active[:, None]
+            is_active &= is_valid.any(axis=1)
+            if not is_active.any():
+                break
+
+            min_e2e_times, best_codes = self._explore_in_parallel(neighbors, is_valid, timeouts, is_active)
+            is_improved = is_active & (record_times / min_e2e_times > self.settings.relative_boost_threshold)
+            record_codes = np.where(is_improved, best_codes, record_codes)
+            record_times = np.where(is_improved, min_e2e_times, record_times)
+            it += 1
+
+        return [ALL_STATES[code] for code in record_codes]
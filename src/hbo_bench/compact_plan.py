@@ -0,0 +1,167 @@
+import sys
+from typing import Any, Dict, List, Optional, Tuple, Union
+import numpy as np
+from hbo_bench.data_types import ExplainPlan, ExplainAnalyzePlan, ExplainNode, ExplainAnalyzeNode, Time, TemplateID
+
+AnyExplainPlan = Union[ExplainPlan, ExplainAnalyzePlan]
+AnyExplainNode = Union[ExplainNode, ExplainAnalyzeNode]
+NO_NAME = -1
+NO_PARENT = -1
+
+
+class CompactPlan:
+    """
+    Array-backed counterpart of `ExplainPlan` / `ExplainAnalyzePlan`. Nodes are numbered in pre-order (as in
+    `extract_vertices_and_edges`), children of node `i` are `children[children_offsets[i]:children_offsets[i + 1]]`.
+    Node types, relation and index names are codes in the table `strings` of interned strings (`NO_NAME` for `None`).
+    Columns that the source plan doesn't have (`costs` / `real_cardinalities`, `execution_time`) are `None`.
+    """
+
+    __slots__ = (
+        "strings",
+        "node_types",
+        "relation_names",
+        "index_names",
+        "parents",
+        "children_offsets",
+        "children",
+        "estimated_cardinalities",
+        "costs",
+        "real_cardinalities",
+        "template_id",
+        "planning_time",
+        "execution_time",
+    )
+
+    def __init__(
+        self,
+        *,
+        strings: "Tuple[str, ...]",
+        node_types: "np.ndarray",
+        relation_names: "np.ndarray",
+        index_names: "np.ndarray",
+        parents: "np.ndarray",
+        children_offsets: "np.ndarray",
+        children: "np.ndarray",
+        estimated_cardinalities: "np.ndarray",
+        costs: "Optional[np.ndarray]",
+        real_cardinalities: "Optional[np.ndarray]",
+        template_id: "TemplateID",
+        planning_time: "Time",
+        execution_time: "Optional[Time]",
+    ):
+        self.strings = strings
+        self.node_types = node_types
+        self.relation_names = relation_names
+        self.index_names = index_names
+        self.parents = parents
+        self.children_offsets = children_offsets
+        self.children = children
+        self.estimated_cardinalities = estimated_cardinalities
+        self.costs = costs
+        self.real_cardinalities = real_cardinalities
+        self.template_id = template_id
+        self.planning_time = planning_time
+        self.execution_time = execution_time
+
+    def __len__(self) -> "int":
+        """number of nodes"""
+        return len(self.node_types)
+
+    @classmethod
+    def from_plan(cls, plan: "AnyExplainPlan") -> "CompactPlan":
+        is_analyze = isinstance(plan, ExplainAnalyzePlan)
+        string_to_code: "Dict[str, int]" = {}
+
+        def encode(string: "Optional[str]") -> "int":
+            if string is None:
+                return NO_NAME
+            return string_to_code.setdefault(sys.intern(string), len(string_to_code))
+
+        node_types: "List[int]" = []
+        relation_names: "List[int]" = []
+        index_names: "List[int]" = []
+        parents: "List[int]" = []
+        n_children: "List[int]" = []
+        cardinalities: "List[int]" = []
+        costs: "List[float]" = []
+        real_cardinalities: "List[int]" = []
+        stack: "List[Tuple[AnyExplainNode, int]]" = [(plan.plan, NO_PARENT)]
+        while stack:
+            node, parent = stack.pop()
+            num = len(node_types)
+            node_types.append(encode(node.node_type))
+            relation_names.append(encode(node.relation_name))
+            index_names.append(encode(node.index_name))
+            parents.append(parent)
+            cardinalities.append(node.estimated_cardinality)
+            if isinstance(node, ExplainAnalyzeNode):
+                real_cardinalities.append(node.real_cardinality)
+            else:
+                costs.append(node.cost)
+            n_children.append(len(node.plans))
+            children: "List[AnyExplainNode]" = list(node.plans)
+            stack.extend((child, num) for child in reversed(children))
+
+        parents_array = np.array(parents, dtype=np.int32)
+        children_offsets = np.zeros(len(parents) + 1, dtype=np.int32)
+        np.cumsum(n_children, out=children_offsets[1:])
+        return cls(
+            strings=tuple(string_to_code),
+            node_types=np.array(node_types, dtype=np.int32),
+            relation_names=np.array(relation_names, dtype=np.int32),
+            index_names=np.array(index_names, dtype=np.int32),
+            parents=parents_array,
+            children_offsets=children_offsets,
+            # pre-order keeps children of every node in their original order
+            children=np.argsort(parents_array[1:], kind="stable").astype(np.int32) + 1,
+            estimated_cardinalities=np.array(cardinalities, dtype=np.int64),
+            costs=None if is_analyze else np.array(costs, dtype=np.float64),
+            real_cardinalities=np.array(real_cardinalities, dtype=np.int64) if is_analyze else None,
+            template_id=plan.template_id,
+            planning_time=plan.planning_time,
+            execution_time=plan.execution_time if isinstance(plan, ExplainAnalyzePlan) else None,
+        )
+
+    def get_children(self, num: "int") -> "np.ndarray":
+        return self.children[self.children_offsets[num] : self.children_offsets[num + 1]]
+
+    def get_n_children(self) -> "np.ndarray":
+        return np.diff(self.children_offsets)
+
+    def decode(self, codes: "np.ndarray") -> "List[Optional[str]]":
+        return [None if code == NO_NAME else self.strings[code] for code in codes.tolist()]
+
+    def _to_nodes(self, extra_columns: "Dict[str, List]") -> "Dict[str, Any]":
+        columns: "Dict[str, List]" = {
+            "Node Type": self.decode(self.node_types),
+            "Plan Rows": self.estimated_cardinalities.tolist(),
+            "Index Name": self.decode(self.index_names),
+            "Relation Name": self.decode(self.relation_names),
+            **extra_columns,
+        }
+        nodes: "List[Dict[str, Any]]" = [
+            {alias: values[num] for alias, values in columns.items()} for num in range(len(self))
+        ]
+        for num, node in enumerate(nodes):
+            node["Plans"] = [nodes[child] for child in self.get_children(num).tolist()]
+        return nodes[0]
+
+    def to_explain_plan(self) -> "ExplainPlan":
+        assert self.costs is not None, "Plan has been built from `ExplainAnalyzePlan`, there are no costs"
+        root = self._to_nodes({"Total Cost": self.costs.tolist()})
+        return ExplainPlan.model_validate(
+            {"Plan": root, "Unique SQL Id": self.template_id, "Planner Runtime": self.planning_time}
+        )
+
+    def to_explain_analyze_plan(self) -> "ExplainAnalyzePlan":
+        assert self.real_cardinalities is not None, "Plan has been built from `ExplainPlan`, there's no execution"
+        root = self._to_nodes({"Actual Rows": self.real_cardinalities.tolist()})
+        return ExplainAnalyzePlan.model_validate(
+            {
+                "Plan": root,
+                "Unique SQL Id": self.template_id,
+                "Planner Runtime": self.planning_time,
+                "Total Runtime": self.execution_time,
+            }
+        )
@@ -1,7 +1,9 @@
-from typing import List, Tuple, Dict
+import hashlib
+import bisect
+from typing import Iterator, List, Optional, Sequence, Tuple, Dict, Union, overload
 import torch
 from torch import Tensor
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, Sampler
 
 
 def paddify_sequences(sequences: "List[Tensor]", target_length: "int") -> "List[Tensor]":
@@ -17,57 +19,234 @@ def paddify_sequences(sequences: "List[Tensor]", target_length: "int") -> "List[
     return padded_sequences
 
 
+def paddify_into_batch(sequences: "List[Tensor]", target_length: "int") -> "Tensor":
+    """
+    `[n_sequences, target_length, n_channels]` tensor of sequences padded by zeros, the same as
+    stacked `paddify_sequences`, but all sequences are copied into one preallocated tensor.
+    """
+    first = sequences[0]
+    batch = torch.zeros((len(sequences), target_length, first.shape[1]), dtype=first.dtype, device=first.device)
+    for idx, seq in enumerate(sequences):
+        batch[idx, : len(seq)] = seq
+    return batch
+
+
+def get_padded_length(max_length: "int", bucket_boundaries: "Optional[Sequence[int]]" = None) -> "int":
+    """the smallest bucket boundary fitting `max_length` (or `max_length` itself, when there's no such one)"""
+    if not bucket_boundaries:
+        return max_length
+    bucket_idx = bisect.bisect_left(bucket_boundaries, max_length)
+    return bucket_boundaries[bucket_idx] if bucket_idx < len(bucket_boundaries) else max_length
+
+
+class PackedTrees:
+    def __init__(self, vertices: "Tensor", edges: "Tensor", offsets: "Tensor"):
+        """
+        Many trees in 3 tensors (see `extract_packed_vertices_and_edges`): concatenated vertices,
+        concatenated edges with global numbering of nodes (`0` is a dummy edge) and `offsets`,
+        where nodes of tree `i` are `offsets[i]:offsets[i + 1]`.
+        """
+        self.vertices = vertices
+        self.edges = edges
+        self.offsets = offsets
+        self.bounds: "List[int]" = offsets.tolist()
+
+    @classmethod
+    def from_lists(cls, list_vertices: "List[Tensor]", list_edges: "List[Tensor]") -> "PackedTrees":
+        """packs trees given in the format of `extract_vertices_and_edges`"""
+        sizes = torch.tensor([len(vertices) for vertices in list_vertices], dtype=torch.long)
+        offsets = torch.cat((torch.zeros(1, dtype=torch.long), torch.cumsum(sizes, dim=0)))
+        edges = torch.cat(list_edges) if list_edges else torch.zeros((0, 3), dtype=torch.long)
+        edges = torch.where(edges > 0, edges + torch.repeat_interleave(offsets[:-1], sizes)[:, None], edges)
+        vertices = torch.cat(list_vertices) if list_vertices else torch.zeros((0, 0))
+        return cls(vertices=vertices, edges=edges, offsets=offsets)
+
+    def __len__(self) -> "int":
+        return len(self.bounds) - 1
+
+    def __getitem__(self, idx: "int") -> "Tuple[Tensor, Tensor]":
+        """vertices and edges of `idx`-th tree in the format of `extract_vertices_and_edges`"""
+        start, end = self.bounds[idx], self.bounds[idx + 1]
+        edges = self.edges[start:end]
+        return self.vertices[start:end], torch.where(edges > 0, edges - start, edges)
+
+    def __iter__(self) -> "Iterator[Tuple[Tensor, Tensor]]":
+        return (self[idx] for idx in range(len(self)))
+
+    def get_digests(self) -> "List[bytes]":
+        """digest of raw bytes of every tree (vertices and edges with local numbering), equal trees have equal ones"""
+        sizes = self.offsets[1:] - self.offsets[:-1]
+        starts = torch.repeat_interleave(self.offsets[:-1], sizes).to(device=self.edges.device)[:, None]
+        vertices_bytes = self.vertices.cpu().contiguous().numpy().tobytes()
+        edges_bytes = torch.where(self.edges > 0, self.edges - starts, 0).cpu().numpy().tobytes()
+        vertex_size = self.vertices.shape[1] * self.vertices.element_size()
+        edge_size = self.edges.shape[1] * self.edges.element_size()
+        return [
+            hashlib.blake2b(
+                vertices_bytes[start * vertex_size : end * vertex_size]
+                + edges_bytes[start * edge_size : end * edge_size]
+            ).digest()
+            for start, end in zip(self.bounds[:-1], self.bounds[1:])
+        ]
+
+    def select(self, indices: "Sequence[int]") -> "PackedTrees":
+        """packs the chosen trees (in the given order)"""
+        sizes = torch.tensor([self.bounds[idx + 1] - self.bounds[idx] for idx in indices], dtype=torch.long)
+        offsets = torch.cat((torch.zeros(1, dtype=torch.long), torch.cumsum(sizes, dim=0)))
+        shifts = torch.repeat_interleave(offsets[:-1] - self.offsets[list(indices)], sizes)
+        node_ids = (torch.arange(len(shifts)) - shifts).to(device=self.vertices.device)
+        edges = self.edges[node_ids]
+        edges = torch.where(edges > 0, edges + shifts.to(device=edges.device)[:, None], edges)
+        return PackedTrees(vertices=self.vertices[node_ids], edges=edges, offsets=offsets)
+
+    def to(self, device: "torch.device") -> "PackedTrees":
+        return PackedTrees(
+            vertices=self.vertices.to(device=device), edges=self.edges.to(device=device), offsets=self.offsets
+        )
+
+
+PackedBatch = Tuple[PackedTrees, Tensor, Tensor]  # trees, frequencies, times
+CollatedBatch = Tuple[Tuple[Tensor, Tensor, Tensor], Tensor]  # see `weighted_binary_tree_collate`
+
+
 class WeightedBinaryTreeDataset(Dataset):
     def __init__(
         self,
-        list_vertices: "List[Tensor]",
+        list_vertices: "Union[List[Tensor], PackedTrees]",
         list_edges: "List[Tensor]",
         list_time: "List[Tensor]",
         device: "torch.device",
+        tree_ids: "Optional[Sequence[int]]" = None,
     ):
         """
         An iterator over <tensor of vectorized tree nodes, tree structure, frequency execution time>
-        with the ability to move data to the specified device.
+        with the ability to move data to the specified device. Trees can be given either as lists
+        of tensors or as `PackedTrees` (then `list_edges` is ignored), and unique ones are kept packed.
+        Indexing by a list of indices gives the whole batch at once, see `weighted_binary_tree_collate`.
+        With `tree_ids` (e.g. `plan_id` of records of `extract_list_info`), where equal ids mean equal
+        trees, only one tree of every id is hashed.
         """
-        self.data_dict: "Dict[Tuple, Dict]" = {}
-
-        for vertices, edges, time in zip(list_vertices, list_edges, list_time):
-            key = str(vertices.flatten().tolist()), str(edges.flatten().tolist())
-            if key in self.data_dict:
-                self.data_dict[key]["freq"] += 1
-                self.data_dict[key]["time"].append(time)
-            else:
-                self.data_dict[key] = {"vertices": vertices, "edges": edges, "time": [time], "freq": 1}
-
-        self.list_vertices = [v["vertices"] for v in self.data_dict.values()]
-        self.list_edges = [v["edges"] for v in self.data_dict.values()]
-        self.list_time = [torch.stack(v["time"]).mean() for v in self.data_dict.values()]
-        self.list_frequencies = [torch.tensor(v["freq"]) for v in self.data_dict.values()]
-        self.size = len(self.data_dict)
+        trees = (
+            list_vertices
+            if isinstance(list_vertices, PackedTrees)
+            else PackedTrees.from_lists(list_vertices, list_edges)
+        )
+        if tree_ids is None:
+            digests = trees.get_digests()
+        else:
+            tree_id_to_first: "Dict[int, int]" = {}
+            for idx, tree_id in enumerate(tree_ids):
+                tree_id_to_first.setdefault(tree_id, idx)
+            tree_id_to_digest = dict(
+                zip(tree_id_to_first, trees.select(list(tree_id_to_first.values())).get_digests())
+            )
+            digests = [tree_id_to_digest[tree_id] for tree_id in tree_ids]
+
+        # unique trees are numbered in the order of the first appearance
+        digest_to_id: "Dict[bytes, int]" = {}
+        first_ids: "List[int]" = []
+        unique_ids: "List[int]" = []
+        for idx, digest in enumerate(digests):
+            if digest not in digest_to_id:
+                digest_to_id[digest] = len(first_ids)
+                first_ids.append(idx)
+            unique_ids.append(digest_to_id[digest])
+
+        self.trees = trees.select(first_ids)
+        self.size = len(first_ids)
+        inverse = torch.tensor(unique_ids, dtype=torch.long)
+        self.frequencies = torch.bincount(inverse, minlength=self.size)
+        times = torch.stack(list_time).reshape(len(list_time), -1) if list_time else torch.zeros((0, 1))
+        # mean over all time values of the same tree, accumulated in double precision
+        time_sums = torch.zeros((self.size, times.shape[1]), dtype=torch.float64)
+        time_sums.index_add_(0, inverse, times.to(dtype=torch.float64))
+        self.times = (time_sums.sum(dim=1) / (self.frequencies * times.shape[1])).to(dtype=times.dtype)
         self.device = device
         self.move_to_device()
 
+    @property
+    def list_vertices(self) -> "List[Tensor]":
+        return [self.trees[idx][0] for idx in range(self.size)]
+
+    @property
+    def list_edges(self) -> "List[Tensor]":
+        return [self.trees[idx][1] for idx in range(self.size)]
+
+    @property
+    def list_time(self) -> "List[Tensor]":
+        return list(self.times)
+
+    @property
+    def list_frequencies(self) -> "List[Tensor]":
+        return list(self.frequencies)
+
     def move_to_device(self) -> "None":
-        for idx in range(self.size):
-            self.list_vertices[idx] = self.list_vertices[idx].to(device=self.device)
-            self.list_edges[idx] = self.list_edges[idx].to(device=self.device)
-            self.list_frequencies[idx] = self.list_frequencies[idx].to(device=self.device)
-            self.list_time[idx] = self.list_time[idx].to(device=self.device)
+        self.trees = self.trees.to(device=self.device)
+        self.frequencies = self.frequencies.to(device=self.device)
+        self.times = self.times.to(device=self.device)
 
     def __len__(self) -> "int":
         return self.size
 
-    def __getitem__(self, idx) -> "Tuple[Tensor, Tensor, Tensor, Tensor]":
-        return self.list_vertices[idx], self.list_edges[idx], self.list_frequencies[idx], self.list_time[idx]
+    def get_lengths(self) -> "List[int]":
+        """number of nodes of every tree"""
+        return [end - start for start, end in zip(self.trees.bounds[:-1], self.trees.bounds[1:])]
+
+    @overload
+    def __getitem__(self, idx: "int") -> "Tuple[Tensor, Tensor, Tensor, Tensor]": ...
+
+    @overload
+    def __getitem__(self, idx: "Sequence[int]") -> "PackedBatch": ...
+
+    def __getitem__(
+        self, idx: "Union[int, Sequence[int]]"
+    ) -> "Union[Tuple[Tensor, Tensor, Tensor, Tensor], PackedBatch]":
+        if not isinstance(idx, int):
+            ids = torch.tensor(idx, dtype=torch.long, device=self.device)
+            return self.trees.select(idx), self.frequencies[ids], self.times[ids]
+        vertices, edges = self.trees[idx]
+        return vertices, edges, self.frequencies[idx], self.times[idx]
+
+
+def paddify_packed_trees(trees: "PackedTrees", target_length: "int") -> "Tuple[Tensor, Tensor]":
+    """
+    `[n_trees, target_length, n_channels]` vertices and `[n_trees, target_length, 3]` edges (with
+    local numbering) padded by zeros, the same as `paddify_sequences` gives for separate trees.
+    """
+    device = trees.vertices.device
+    sizes = trees.offsets[1:] - trees.offsets[:-1]
+    starts = torch.repeat_interleave(trees.offsets[:-1], sizes)
+    tree_ids = torch.repeat_interleave(torch.arange(len(trees)), sizes).to(device=device)
+    positions = (torch.arange(len(starts)) - starts).to(device=device)
+
+    vertices = torch.zeros(
+        (len(trees), target_length, trees.vertices.shape[1]), dtype=trees.vertices.dtype, device=device
+    )
+    vertices[tree_ids, positions] = trees.vertices
+    edges = torch.zeros((len(trees), target_length, trees.edges.shape[1]), dtype=trees.edges.dtype, device=device)
+    edges[tree_ids, positions] = torch.where(trees.edges > 0, trees.edges - starts.to(device=device)[:, None], 0)
+    return vertices, edges
 
 
 def weighted_binary_tree_collate(
-    batch: "List[Tuple[Tensor, Tensor, Tensor, Tensor]]", target_length: "int"
-) -> "Tuple[Tuple[Tensor, Tensor, Tensor], Tensor]":
+    batch: "Union[List[Tuple[Tensor, Tensor, Tensor, Tensor]], PackedBatch]",
+    target_length: "Optional[int]" = None,
+    bucket_boundaries: "Optional[Sequence[int]]" = None,
+) -> "CollatedBatch":
     """
     Adds padding to equalize lengths, changes the number of axes and
     their order to make neural network inference more suitable.
+    Batch is either a list of dataset items or a packed batch (`dataset[indices]`).
+    Trees are padded to `target_length`, or (when it's `None`) to the longest tree in
+    the batch rounded up to `bucket_boundaries`, see `LengthBucketBatchSampler`.
     """
+    if isinstance(batch, tuple) and isinstance(batch[0], PackedTrees):
+        trees, batch_freq, batch_time = batch
+        if target_length is None:
+            target_length = get_padded_length(int((trees.offsets[1:] - trees.offsets[:-1]).max()), bucket_boundaries)
+        padded_vertices, padded_edges = paddify_packed_trees(trees, target_length)
+        return (padded_vertices.transpose(1, 2), padded_edges.unsqueeze(1), batch_freq), batch_time
+
     list_vertices, list_edges, list_freq, list_time = [], [], [], []
     for vertices, edges, freq, time in batch:
         list_vertices.append(vertices)
@@ -75,7 +254,98 @@ def weighted_binary_tree_collate(
         list_freq.append(freq)
         list_time.append(time)
 
-    batch_vertices = torch.stack(paddify_sequences(list_vertices, target_length)).transpose(1, 2)
-    batch_edges = torch.stack(paddify_sequences(list_edges, target_length)).unsqueeze(1)
+    if target_length is None:
+        target_length = get_padded_length(max(len(vertices) for vertices in list_vertices), bucket_boundaries)
+    batch_vertices = paddify_into_batch(list_vertices, target_length).transpose(1, 2)
+    batch_edges = paddify_into_batch(list_edges, target_length).unsqueeze(1)
     batch_freq = torch.stack(list_freq)
     return (batch_vertices, batch_edges, batch_freq), torch.stack(list_time)
+
+
+class CollatedTreeDataset(Dataset):
+    def __init__(
+        self, dataset: "WeightedBinaryTreeDataset", target_length: "Optional[int]" = None, pin_memory: "bool" = False
+    ):
+        """
+        The whole `dataset` collated once (see `weighted_binary_tree_collate`) into contiguous
+        `[N, C, L]` vertices, `[N, 1, L, 3]` edges, `[N]` frequencies and times on the device of
+        dataset (CPU tensors can be pinned for faster asynchronous copying). Item is already a batch,
+        e.g. `collated_dataset[indices]`, so an epoch (`iterate_batches`) is just a few gathers per batch.
+        """
+        (vertices, edges, frequencies), times = weighted_binary_tree_collate(
+            dataset[list(range(len(dataset)))], target_length
+        )
+        self.vertices, self.edges = vertices.contiguous(), edges.contiguous()
+        self.frequencies, self.times = frequencies.contiguous(), times.contiguous()
+        if pin_memory and self.vertices.device.type == "cpu":
+            self.vertices, self.edges = self.vertices.pin_memory(), self.edges.pin_memory()
+            self.frequencies, self.times = self.frequencies.pin_memory(), self.times.pin_memory()
+
+    def __len__(self) -> "int":
+        return len(self.vertices)
+
+    def __getitem__(self, idx: "Union[int, slice, Sequence[int], Tensor]") -> "CollatedBatch":
+        return (self.vertices[idx], self.edges[idx], self.frequencies[idx]), self.times[idx]
+
+    def iterate_batches(
+        self, batch_size: "int", shuffle: "bool" = False, generator: "Optional[torch.Generator]" = None
+    ) -> "Iterator[CollatedBatch]":
+        if shuffle:
+            order = torch.randperm(len(self), generator=generator).to(device=self.vertices.device)
+            for ids in order.split(batch_size):
+                yield self[ids]
+        else:
+            for start in range(0, len(self), batch_size):
+                yield self[start : start + batch_size]
+
+
+class LengthBucketBatchSampler(Sampler):
+    def __init__(
+        self,
+        lengths: "Sequence[int]",
+        batch_size: "int",
+        bucket_boundaries: "Optional[Sequence[int]]" = None,
+        *,
+        shuffle: "bool" = True,
+        drop_last: "bool" = False,
+        seed: "int" = 0,
+    ):
+        """
+        Yields batches of indices of trees with similar lengths (`lengths`, e.g. `dataset.get_lengths()`),
+        so padding to the batch maximum is small. Bucket `i` holds lengths in `(boundaries[i - 1], boundaries[i]]`,
+        without `bucket_boundaries` every length forms its own bucket. With `shuffle` both trees inside buckets
+        and the order of batches are shuffled, differently on every epoch. It can be used either as
+        `batch_sampler` or as `sampler` with `batch_size=None` (then the dataset gives packed batches).
+        """
+        super().__init__()
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+        bucket_to_ids: "Dict[int, List[int]]" = {}
+        for idx, length in enumerate(lengths):
+            bucket = bisect.bisect_left(bucket_boundaries, length) if bucket_boundaries else length
+            bucket_to_ids.setdefault(bucket, []).append(idx)
+        self.buckets = [bucket_to_ids[bucket] for bucket in sorted(bucket_to_ids)]
+
+    def __iter__(self) -> "Iterator[List[int]]":
+        generator = torch.Generator().manual_seed(self.seed + self.epoch)
+        self.epoch += 1
+        batches: "List[List[int]]" = []
+        for bucket in self.buckets:
+            ids = (
+                [bucket[i] for i in torch.randperm(len(bucket), generator=generator).tolist()]
+                if self.shuffle
+                else bucket
+            )
+            n_batches = len(ids) // self.batch_size if self.drop_last else -(-len(ids) // self.batch_size)
+            batches.extend(ids[i * self.batch_size : (i + 1) * self.batch_size] for i in range(n_batches))
+        if self.shuffle:
+            batches = [batches[i] for i in torch.randperm(len(batches), generator=generator).tolist()]
+        return iter(batches)
+
+    def __len__(self) -> "int":
+        if self.drop_last:
+            return sum(len(bucket) // self.batch_size for bucket in self.buckets)
+        return sum(-(-len(bucket) // self.batch_size) for bucket in self.buckets)
@@ -0,0 +1,75 @@
+import os
+from collections import namedtuple
+from typing import List, Optional, Tuple
+import numpy as np
+from hbo_bench.data_types import ExplainPlan, QueryName
+from hbo_bench.data_config import DEFAULT_HINTSET
+from hbo_bench.store import save_query_table, load_query_table
+
+# how the effective execution time of setting was obtained
+MEASURED = 0
+# T/O, but the same logical plan has been executed with other settings of the query - mean of their times
+MEAN_OF_LOGICAL_PLAN = 1
+# T/O, the logical plan has never been executed - twice the maximum default time over dops with T/O
+TWICE_MAX_DEFAULT_TIME = 2
+IMPUTATION_RULES = {
+    MEASURED: "measured",
+    MEAN_OF_LOGICAL_PLAN: "mean execution time of the same logical plan",
+    TWICE_MAX_DEFAULT_TIME: "2 * max execution time of the default hintset over dops with T/O",
+}
+# must be changed along with the imputation rules, it invalidates all persisted tables
+IMPUTATION_VERSION = 1
+EFFECTIVE_TIMES_SUFFIX = ".effective_times.npz"
+
+# pre-order sequence of `(node type, relation, index, number of children)`, see `utils.get_logical_tree`
+LogicalPlanKey = Tuple[Tuple, ...]
+# `[query, dop_idx, hintset]` arrays; logical plans are numbered within every query by the first appearance
+EffectiveTimes = namedtuple("EffectiveTimes", ["effective_execution_time", "imputation_rule", "logical_plan_id"])
+
+
+def get_logical_plan_key(plan: "ExplainPlan") -> "LogicalPlanKey":
+    key = []
+    stack = [plan.plan]
+    while stack:
+        node = stack.pop()
+        key.append((node.node_type, node.relation_name, node.index_name, len(node.plans)))
+        stack.extend(reversed(node.plans))
+    return tuple(key)
+
+
+def compute_effective_times(
+    execution_times: "np.ndarray", is_timeout: "np.ndarray", logical_plan_ids: "np.ndarray"
+) -> "EffectiveTimes":
+    """all arguments are `[query, dop_idx, hintset]` arrays, see `IMPUTATION_RULES`"""
+    effective_times = np.where(is_timeout, np.nan, execution_times)
+    rules = np.where(is_timeout, MEAN_OF_LOGICAL_PLAN, MEASURED).astype(np.int8)
+    for query_id, query_times in enumerate(execution_times):
+        query_plan_ids, query_is_timeout = logical_plan_ids[query_id], is_timeout[query_id]
+        for plan_id in np.unique(query_plan_ids[query_is_timeout]).tolist():
+            is_plan = query_plan_ids == plan_id
+            executed_times = query_times[is_plan & ~query_is_timeout]
+            if len(executed_times):
+                time, rule = float(np.mean(executed_times)), MEAN_OF_LOGICAL_PLAN
+            else:
+                timeouted_dop_ids = np.flatnonzero((is_plan & query_is_timeout).any(axis=1))
+                time = 2 * float(query_times[timeouted_dop_ids, DEFAULT_HINTSET].max(initial=0.0))
+                rule = TWICE_MAX_DEFAULT_TIME
+            effective_times[query_id][is_plan & query_is_timeout] = time
+            rules[query_id][is_plan & query_is_timeout] = rule
+    return EffectiveTimes(effective_times, rules, logical_plan_ids)
+
+
+def get_path_to_effective_times(path_to_bench: "str") -> "str":
+    return f"{os.path.normpath(path_to_bench)}{EFFECTIVE_TIMES_SUFFIX}"
+
+
+def save_effective_times(
+    path: "str", fingerprint: "str", query_names: "List[QueryName]", table: "EffectiveTimes"
+) -> "bool":
+    return save_query_table(path, fingerprint, IMPUTATION_VERSION, query_names, table._asdict())
+
+
+def load_effective_times(path: "str", fingerprint: "str", query_names: "List[QueryName]") -> "Optional[EffectiveTimes]":
+    """persisted table in the order of `query_names`, or `None` if it's absent or outdated"""
+    columns = load_query_table(path, fingerprint, IMPUTATION_VERSION, query_names)
+    return None if columns is None else EffectiveTimes(**columns)
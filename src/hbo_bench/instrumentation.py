@@ -0,0 +1,186 @@
+import sys
+import cProfile
+import threading
+from time import perf_counter
+from functools import wraps
+from collections import defaultdict
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from hbo_bench import oracle as oracle_module, query_explorer, utils, vectorization, vectorization_cache
+from hbo_bench.oracle import Oracle
+from hbo_bench.query_explorer import QueryExplorer
+from hbo_bench.batch_explorer import BatchQueryExplorer
+from hbo_bench.vectorization_cache import VectorizationCache
+
+
+class InstrumentationStats:
+    def __init__(self) -> "None":
+        """
+        Number of calls and total (inclusive, i.e. with nested instrumented calls) time in seconds per
+        instrumented function, and `counters` of events, e.g. hits and misses of caches; see `instrument`
+        """
+        self.calls: "Dict[str, int]" = defaultdict(int)
+        self.seconds: "Dict[str, float]" = defaultdict(float)
+        self.counters: "Dict[str, int]" = defaultdict(int)
+
+    def record(self, label: "str", seconds: "float") -> "None":
+        self.calls[label] += 1
+        self.seconds[label] += seconds
+
+    def to_dict(self) -> "Dict[str, Dict[str, Any]]":
+        return {"calls": dict(self.calls), "seconds": dict(self.seconds), "counters": dict(self.counters)}
+
+    def __str__(self) -> "str":
+        lines = [f"{'function':<50} {'calls':>10} {'seconds':>10}"]
+        for label in sorted(self.seconds, key=self.seconds.__getitem__, reverse=True):
+            lines.append(f"{label:<50} {self.calls[label]:>10} {self.seconds[label]:>10.4f}")
+        lines.extend(f"{name:<50} {count:>10}" for name, count in sorted(self.counters.items()))
+        return "\n".join(lines)
+
+
+def _timed(func: "Callable", stats: "InstrumentationStats") -> "Callable":
+    label = func.__qualname__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats.record(label, perf_counter() - start)
+
+    return wrapper
+
+
+def _get_caller_label(depth: "int") -> "str":
+    """qualified name of the function `depth` frames up the stack, frames of wrappers aren't counted"""
+    frame = sys._getframe(1)  # pylint: disable=protected-access
+    while frame is not None:
+        if frame.f_code.co_filename != __file__:
+            if depth == 0:
+                return getattr(frame.f_code, "co_qualname", frame.f_code.co_name)
+            depth -= 1
+        frame = frame.f_back  # type: ignore[assignment]
+    return "<unknown>"  # pragma: no cover
+
+
+def _timed_get_plans(func: "Callable", stats: "InstrumentationStats") -> "Callable":
+    """
+    Besides timing, attributes calls to the method, which requested plans from `Oracle` (e.g. `PlanIndex.__init__`
+    for `Oracle.get_explain_plan` called by it), and splits them into hits and misses of the plans cache;
+    misses are parsed with pydantic.
+    """
+    label = func.__qualname__
+
+    @wraps(func)
+    def wrapper(self: "Oracle", request):
+        # the first frame is the getter of `Oracle`, which called `_get_plans`
+        caller_label = f"{label} <- {_get_caller_label(depth=1)}"
+        n_misses = self.get_plans_cache_info().misses if self.use_store else 0
+        start = perf_counter()
+        try:
+            plans = func(self, request)
+        finally:
+            seconds = perf_counter() - start
+            stats.record(label, seconds)
+            stats.record(caller_label, seconds)
+        if self.use_store:
+            is_miss = self.get_plans_cache_info().misses > n_misses
+            stats.counters["plans_cache_misses" if is_miss else "plans_cache_hits"] += 1
+            if is_miss:
+                stats.record("Oracle._parse_plans", seconds)
+        return plans
+
+    return wrapper
+
+
+def _timed_get_vertices_and_edges(func: "Callable", stats: "InstrumentationStats") -> "Callable":
+    timed_func = _timed(func, stats)
+
+    @wraps(func)
+    def wrapper(self: "VectorizationCache", plan):
+        n_new_records = len(self.new_records)
+        vertices_and_edges = timed_func(self, plan)
+        is_miss = len(self.new_records) > n_new_records
+        stats.counters["vectorization_cache_misses" if is_miss else "vectorization_cache_hits"] += 1
+        return vertices_and_edges
+
+    return wrapper
+
+
+# `(owner, attribute, wrapper factory)`; module-level functions are patched in every module that calls them
+INSTRUMENTED: "List[Tuple[Union[type, ModuleType], str, Callable]]" = [
+    (oracle_module, "_load_benchmark_data", _timed),
+    (Oracle, "__init__", _timed),
+    (Oracle, "_get_plans", _timed_get_plans),
+    *[
+        (Oracle, name, _timed)
+        for name in [
+            "get_planning_time",
+            "get_cost",
+            "get_execution_time",
+            "get_explain_plan",
+            "get_explain_analyze_plan",
+            "get_planning_times",
+            "get_costs",
+            "get_execution_times",
+            "get_timeout_mask",
+            "get_effective_execution_times",
+        ]
+    ],
+    *[
+        (QueryExplorer, name, _timed)
+        for name in ["__init__", "run", "_get_neighbor_codes", "explore_in_parallel", "_explore_codes_in_parallel"]
+    ],
+    (query_explorer, "get_neighbor_table", _timed),
+    *[(BatchQueryExplorer, name, _timed) for name in ["__init__", "run", "_explore_in_parallel"]],
+    (VectorizationCache, "get_vertices_and_edges", _timed_get_vertices_and_edges),
+    (vectorization, "extract_packed_vertices_and_edges", _timed),
+    (vectorization_cache, "extract_vertices_and_edges", _timed),
+    (utils, "extract_vertices_and_edges", _timed),
+]
+
+
+# patched functions are shared by the whole process
+_INSTRUMENT_LOCK = threading.Lock()
+
+
+@contextmanager
+def instrument(stats: "Optional[InstrumentationStats]" = None) -> "Iterator[InstrumentationStats]":
+    """
+    Counts and times calls of hot-path functions (see `INSTRUMENTED`) made inside the context in the current
+    process. Functions are patched only while the context is active, so there is no overhead otherwise.
+    Patching is process-wide and stats aren't synchronized, so calls from other threads are counted too,
+    and only one context can be active at a time (a nested or concurrent one raises `RuntimeError`).
+    """
+    if not _INSTRUMENT_LOCK.acquire(blocking=False):
+        raise RuntimeError("Another instrumentation context is active")
+    stats = InstrumentationStats() if stats is None else stats
+    patched: "List[Tuple[Union[type, ModuleType], str, Callable]]" = []
+    try:
+        for owner, name, make_wrapper in INSTRUMENTED:
+            original = vars(owner)[name]
+            setattr(owner, name, make_wrapper(original, stats))
+            patched.append((owner, name, original))
+        yield stats
+    finally:
+        for owner, name, original in reversed(patched):
+            setattr(owner, name, original)
+        _INSTRUMENT_LOCK.release()
+
+
+@contextmanager
+def profile(path: "Optional[str]" = None) -> "Iterator[cProfile.Profile]":
+    """
+    cProfile of everything inside the context, e.g. a single sweep; the trace is saved to `path`
+    (if given) in `pstats` format, which is readable by `pstats`, `snakeviz`, `gprof2dot`, etc.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path is not None:
+            profiler.dump_stats(path)
@@ -0,0 +1,122 @@
+import os
+import sys
+import multiprocessing as mp
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from hbo_bench.data_types import QueryName, Plans
+from hbo_bench.data_config import BENCH_NAMES
+from hbo_bench.store import ColumnarStore, open_store, get_cache_prefix, MAX_QUERY_NAME_LENGTH
+from hbo_bench.effective_times import EffectiveTimes
+from hbo_bench.optimum_index import OptimumIndex
+from hbo_bench.oracle import Oracle, DEFAULT_PLANS_CACHE_SIZE
+
+BENCH_SEPARATOR = "/"
+
+
+def make_query_name(bench_name: "str", query_name: "QueryName") -> "QueryName":
+    """global name of query `query_name` from benchmark `bench_name` in `MultiOracle`"""
+    return f"{bench_name}{BENCH_SEPARATOR}{query_name}"
+
+
+def split_query_name(query_name: "QueryName") -> "Tuple[str, QueryName]":
+    bench_name, _, local_query_name = query_name.partition(BENCH_SEPARATOR)
+    return bench_name, local_query_name
+
+
+def _compile_store(path_to_bench: "str") -> "None":
+    # nothing is returned, the parent process memory-maps the compiled store itself
+    open_store(path_to_bench)
+
+
+def _intern_strings(plans: "Plans") -> "Plans":
+    """the same node types and relation (index) names across all plans share a single string object"""
+    stack = [plans.explain_plan.plan]
+    if plans.explain_analyze_plan is not None:
+        stack.append(plans.explain_analyze_plan.plan)
+    while stack:
+        node = stack.pop()
+        node.node_type = sys.intern(node.node_type)
+        if node.relation_name is not None:
+            node.relation_name = sys.intern(node.relation_name)
+        if node.index_name is not None:
+            node.index_name = sys.intern(node.index_name)
+        stack.extend(node.plans)
+    return plans
+
+
+class MultiOracle(Oracle):
+    # pylint: disable=super-init-not-called
+    def __init__(
+        self,
+        path_to_processed: "str",
+        bench_names: "Optional[Sequence[str]]" = None,
+        plans_cache_size: "Optional[int]" = DEFAULT_PLANS_CACHE_SIZE,
+        workers: "int" = 1,
+        cache_dir: "Optional[str]" = None,
+    ):
+        """
+        Oracle over several benchmarks from `path_to_processed` (all of `BENCH_NAMES` by default) with a single
+        columnar store and a global query-id space, so it can be used anywhere instead of `Oracle`. Queries are
+        named `"{bench_name}/{query_name}"` (see `make_query_name`) to avoid collisions between benchmarks.
+        Stores of benchmarks are (re)compiled by a pool of `workers` processes; plans are parsed lazily from
+        packed plans of every benchmark and kept in one LRU cache of `plans_cache_size` entries.
+        Derived tables are persisted per benchmark as in `Oracle` (next to them or to `cache_dir`).
+        """
+        self.bench_names = list(BENCH_NAMES) if bench_names is None else list(bench_names)
+        assert self.bench_names, "There are no benchmarks to load"
+        paths_to_bench = [os.path.join(path_to_processed, bench_name) for bench_name in self.bench_names]
+        if workers > 1 and len(paths_to_bench) > 1:
+            with mp.Pool(processes=min(workers, len(paths_to_bench))) as pool:
+                pool.map(_compile_store, paths_to_bench)
+        self.oracles: "Dict[str, Oracle]" = {
+            bench_name: Oracle(path_to_bench, use_store=True, plans_cache_size=0, cache_dir=cache_dir)
+            for bench_name, path_to_bench in zip(self.bench_names, paths_to_bench)
+        }
+
+        # global query id -> (benchmark, its query id)
+        self._locations: "List[Tuple[str, int]]" = []
+        query_names = []
+        for bench_name, oracle in self.oracles.items():
+            for local_query_id, query_name in enumerate(oracle.get_query_names()):
+                self._locations.append((bench_name, local_query_id))
+                query_names.append(make_query_name(bench_name, query_name))
+        assert all(len(name) <= MAX_QUERY_NAME_LENGTH for name in query_names), "Too long query name"
+        table = np.concatenate([np.asarray(oracle.store.table) for oracle in self.oracles.values()])
+        table["query_name"] = query_names
+
+        self.path_to_processed = path_to_processed
+        # there are no files of this benchmark, it only names the derived ones (e.g. `get_plan_index`)
+        self.path_to_bench = os.path.join(path_to_processed, "+".join(self.bench_names))
+        self.cache_dir = cache_dir
+        self.cache_prefix = get_cache_prefix(self.path_to_bench, cache_dir)
+        self.shared_memory_name = None
+        self.use_store = True
+        self.benchmark_data = {}
+        self._init_store(ColumnarStore(table), plans_cache_size)
+
+    def get_reopen_args(self) -> "Tuple[Callable[..., Oracle], Tuple]":
+        return MultiOracle, (self.path_to_processed, self.bench_names, self.plans_cache_size, 1, self.cache_dir)
+
+    def _parse_plans(self, index: "Tuple[int, int, int]") -> "Plans":
+        query_id, dop_idx, hintset = index
+        bench_name, local_query_id = self._locations[query_id]
+        plans_bytes = self.oracles[bench_name].store.get_plans_bytes((local_query_id, dop_idx, hintset))
+        return _intern_strings(Plans.model_validate_json(plans_bytes))
+
+    def _get_effective_times(self) -> "EffectiveTimes":
+        """concatenation of the tables of all benchmarks, so they are persisted (and reused) per benchmark"""
+        if self._effective_times is None:
+            oracles = list(self.oracles.values())
+            self._effective_times = EffectiveTimes(
+                effective_execution_time=np.concatenate([oracle.get_effective_execution_times() for oracle in oracles]),
+                imputation_rule=np.concatenate([oracle.get_imputation_rules() for oracle in oracles]),
+                logical_plan_id=np.concatenate([oracle.get_logical_plan_ids() for oracle in oracles]),
+            )
+        return self._effective_times
+
+    def get_optimum_index(self) -> "OptimumIndex":
+        """concatenation of the indices of all benchmarks, see `_get_effective_times`"""
+        if self._optimum_index is None:
+            indices = [oracle.get_optimum_index() for oracle in self.oracles.values()]
+            self._optimum_index = OptimumIndex(*[np.concatenate(columns) for columns in zip(*indices)])
+        return self._optimum_index
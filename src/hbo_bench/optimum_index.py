@@ -0,0 +1,64 @@
+import os
+from collections import namedtuple
+from typing import List, Optional
+import numpy as np
+from hbo_bench.data_types import QueryName
+from hbo_bench.data_config import DOPS, DEFAULT_DOP, DEFAULT_HINTSET
+from hbo_bench.store import save_query_table, load_query_table
+
+# must be changed along with `compute_optimum_index`, it invalidates all persisted indices
+OPTIMUM_INDEX_VERSION = 1
+OPTIMUM_INDEX_SUFFIX = ".optimum_index.npz"
+
+# per-query arrays of e2e times (planning + execution, T/O included as is) in ms:
+# - `default_e2e_time`, `optimal_e2e_time` and optimal state (`optimal_dop_idx`, `optimal_hintset`) are `[query]`
+# - `state_rank` is `[query, dop_idx, hintset]`, where 0 is the optimal state
+# - `dop_optimal_e2e_time` and `dop_optimal_hintset` are `[query, dop_idx]`
+# ties are broken in favour of the smaller `SearchingState`, as explorers do
+OptimumIndex = namedtuple(
+    "OptimumIndex",
+    [
+        "default_e2e_time",
+        "optimal_e2e_time",
+        "optimal_dop_idx",
+        "optimal_hintset",
+        "state_rank",
+        "dop_optimal_e2e_time",
+        "dop_optimal_hintset",
+    ],
+)
+
+
+def compute_optimum_index(e2e_times: "np.ndarray") -> "OptimumIndex":
+    """`e2e_times` is `[query, dop_idx, hintset]` array"""
+    n_queries, n_dops, n_hintsets = e2e_times.shape
+    # states in the order of `SearchingState(hintset, dop)`
+    state_e2e_times = e2e_times.transpose(0, 2, 1).reshape(n_queries, -1)
+    order = np.argsort(state_e2e_times, axis=1, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.broadcast_to(np.arange(order.shape[1]), order.shape), axis=1)
+    best_states = order[:, 0]
+    return OptimumIndex(
+        default_e2e_time=e2e_times[:, DOPS.index(DEFAULT_DOP), DEFAULT_HINTSET],
+        optimal_e2e_time=state_e2e_times[np.arange(n_queries), best_states],
+        optimal_dop_idx=best_states % n_dops,
+        optimal_hintset=best_states // n_dops,
+        state_rank=ranks.reshape((n_queries, n_hintsets, n_dops)).transpose((0, 2, 1)),
+        dop_optimal_e2e_time=e2e_times.min(axis=2),
+        dop_optimal_hintset=e2e_times.argmin(axis=2),
+    )
+
+
+def get_path_to_optimum_index(path_to_bench: "str") -> "str":
+    return f"{os.path.normpath(path_to_bench)}{OPTIMUM_INDEX_SUFFIX}"
+
+
+def save_optimum_index(
+    path: "str", fingerprint: "str", query_names: "List[QueryName]", index: "OptimumIndex"
+) -> "bool":
+    return save_query_table(path, fingerprint, OPTIMUM_INDEX_VERSION, query_names, index._asdict())
+
+
+def load_optimum_index(path: "str", fingerprint: "str", query_names: "List[QueryName]") -> "Optional[OptimumIndex]":
+    columns = load_query_table(path, fingerprint, OPTIMUM_INDEX_VERSION, query_names)
+    return None if columns is None else OptimumIndex(**columns)
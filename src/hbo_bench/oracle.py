@@ -1,6 +1,9 @@
 import os
 from json import load
-from typing import Optional, Dict
+from functools import lru_cache
+from collections import namedtuple
+from typing import Optional, Dict, Tuple, Sequence, Union, Mapping, Any, Callable
+import numpy as np
 from pydantic import BaseModel
 from hbo_bench.data_types import (
     QueryName,
@@ -12,9 +15,29 @@ from hbo_bench.data_types import (
     ExplainAnalyzePlan,
     ExplainPlan,
     Plans,
+    Settings,
+)
+from hbo_bench.data_config import DOPS, HINTSETS
+from hbo_bench.store import ColumnarStore, open_store, get_cache_prefix, TIMEOUT
+from hbo_bench.shared_store import attach_store
+from hbo_bench.effective_times import (
+    EffectiveTimes,
+    LogicalPlanKey,
+    get_logical_plan_key,
+    compute_effective_times,
+    get_path_to_effective_times,
+    load_effective_times,
+    save_effective_times,
+)
+from hbo_bench.optimum_index import (
+    OptimumIndex,
+    compute_optimum_index,
+    get_path_to_optimum_index,
+    load_optimum_index,
+    save_optimum_index,
 )
 
-TIMEOUT = float(2**42)
+DEFAULT_PLANS_CACHE_SIZE = 4096
 
 
 def _load_benchmark_data(path_to_bench: "str") -> "Dict[QueryName, QueryData]":
@@ -29,44 +52,263 @@ def _load_benchmark_data(path_to_bench: "str") -> "Dict[QueryName, QueryData]":
     return benchmark_data
 
 
+# array-like of query names / dops / hintsets for batched look-ups, `None` stands for the whole axis
+BatchArgument = Optional[Union[Sequence, np.ndarray]]
+
+
+def _to_ids(values: "Union[Sequence, np.ndarray]", mapping: "Mapping[Any, int]") -> "np.ndarray":
+    values = np.asarray(values)
+    ids = []
+    for value in values.ravel().tolist():
+        assert value in mapping, f"Unknown value {value}"
+        ids.append(mapping[value])
+    return np.array(ids, dtype=np.int64).reshape(values.shape)
+
+
 class OracleRequest(BaseModel):
     query_name: "QueryName"
     dop: "QueryDop"
     hintset: "HintsetCode"
 
 
+# unvalidated counterpart of `OracleRequest` for hot loops, where the fields are known to be correct
+OracleKey = namedtuple("OracleKey", ["query_name", "dop", "hintset"])
+AnyRequest = Union[OracleRequest, OracleKey]
+
+_SETTINGS_KEYS: "Dict[Tuple[QueryDop, HintsetCode], Settings]" = {
+    (dop, hintset): str((dop, hintset)) for dop in DOPS for hintset in HINTSETS
+}
+
+
 class Oracle:
-    def __init__(self, path_to_bench: "str"):
-        self.benchmark_data: "Dict[QueryName, QueryData]" = _load_benchmark_data(path_to_bench=path_to_bench)
+    def __init__(
+        self,
+        path_to_bench: "str",
+        use_store: "bool" = False,
+        plans_cache_size: "Optional[int]" = DEFAULT_PLANS_CACHE_SIZE,
+        shared_memory_name: "Optional[str]" = None,
+        cache_dir: "Optional[str]" = None,
+    ):
+        """
+        With `use_store=True` all scalar look-ups are served by the memory-mapped
+        columnar store (see `hbo_bench.store`), and plans are parsed from packed bytes
+        only on the first request to them and kept in LRU cache of `plans_cache_size`
+        entries; otherwise all the data is loaded up front. With `shared_memory_name`
+        the store published by another process (see `hbo_bench.shared_store`) is used
+        without copying. Derived tables (e.g. `get_effective_execution_times`) are persisted
+        next to the benchmark or to `cache_dir`, when it's given; it's best-effort, so
+        read-only data only means that they are recomputed by every new oracle.
+        """
+        self.path_to_bench = path_to_bench
+        self.cache_dir = cache_dir
+        # common prefix of paths to the persisted derived tables
+        self.cache_prefix = get_cache_prefix(path_to_bench, cache_dir)
+        self.shared_memory_name = shared_memory_name
+        self.use_store = use_store or shared_memory_name is not None
+        self.benchmark_data: "Dict[QueryName, QueryData]" = {}
+        if shared_memory_name is not None:
+            store = attach_store(shared_memory_name)
+        elif use_store:
+            store = open_store(path_to_bench)
+        else:
+            self.benchmark_data = _load_benchmark_data(path_to_bench=path_to_bench)
+            store = ColumnarStore.from_benchmark_data(self.benchmark_data)
+        self._init_store(store, plans_cache_size)
+
+    def _init_store(self, store: "ColumnarStore", plans_cache_size: "Optional[int]") -> "None":
+        self.store: "ColumnarStore" = store
+        self.plans_cache_size = plans_cache_size
+        self._get_cached_plans = lru_cache(maxsize=plans_cache_size)(self._parse_plans)
+        self.query_name_to_id: "Dict[QueryName, int]" = {name: idx for idx, name in enumerate(self.store.query_names)}
+        self.dop_to_idx: "Dict[QueryDop, int]" = {dop: idx for idx, dop in enumerate(DOPS)}
+        self._fingerprint: "Optional[str]" = None
+        self._effective_times: "Optional[EffectiveTimes]" = None
+        self._optimum_index: "Optional[OptimumIndex]" = None
+
+    def get_reopen_args(self) -> "Tuple[Callable[..., Oracle], Tuple]":
+        """
+        Picklable constructor and its arguments, which open the same data in another process;
+        the store is memory-mapped (or attached to), so nothing is parsed or copied there.
+        """
+        return Oracle, (self.path_to_bench, True, self.plans_cache_size, self.shared_memory_name, self.cache_dir)
 
     def get_query_names(self):
-        return list(self.benchmark_data.keys())
+        return list(self.store.query_names)
+
+    def get_fingerprint(self) -> "str":
+        if self._fingerprint is None:
+            self._fingerprint = self.store.get_fingerprint()
+        return self._fingerprint
+
+    def _get_index(self, request: "AnyRequest") -> "Tuple[int, int, int]":
+        assert request.query_name in self.query_name_to_id, f"Unknown query {request.query_name}"
+        return self.query_name_to_id[request.query_name], self.dop_to_idx[request.dop], request.hintset
 
-    def _get_plans(self, request: "OracleRequest") -> "Plans":
+    def _parse_plans(self, index: "Tuple[int, int, int]") -> "Plans":
+        return Plans.model_validate_json(self.store.get_plans_bytes(index))
+
+    def get_plans_cache_info(self):
+        """hits, misses, maxsize and currsize of the cache with lazily parsed plans"""
+        return self._get_cached_plans.cache_info()
+
+    def _get_plans(self, request: "AnyRequest") -> "Plans":
+        if self.use_store:
+            return self._get_cached_plans(self._get_index(request))
         assert request.query_name in self.benchmark_data, f"Unknown query {request.query_name}"
-        settings = str((request.dop, request.hintset))
+        settings = _SETTINGS_KEYS[request.dop, request.hintset]
         return self.benchmark_data[request.query_name][settings]
 
-    def get_planning_time(self, request: "OracleRequest") -> "Time":
-        plans = self._get_plans(request=request)
-        return plans.explain_plan.planning_time
+    def get_planning_time(self, request: "AnyRequest") -> "Time":
+        return float(self.store.planning_time[self._get_index(request)])
 
-    def get_cost(self, request: "OracleRequest") -> "Cost":
-        plans = self._get_plans(request=request)
-        return plans.explain_plan.plan.cost
+    def get_cost(self, request: "AnyRequest") -> "Cost":
+        return float(self.store.cost[self._get_index(request)])
 
-    def get_execution_time(self, request: "OracleRequest") -> "Time":
-        plans = self._get_plans(request=request)
-        if plans.explain_analyze_plan:
-            execution_time = plans.explain_analyze_plan.execution_time
-        else:
-            execution_time = TIMEOUT
-        return execution_time
+    def get_execution_time(self, request: "AnyRequest") -> "Time":
+        return float(self.store.execution_time[self._get_index(request)])
 
-    def get_explain_plan(self, request: "OracleRequest") -> "ExplainPlan":
+    def get_explain_plan(self, request: "AnyRequest") -> "ExplainPlan":
         plans = self._get_plans(request=request)
         return plans.explain_plan
 
-    def get_explain_analyze_plan(self, request: "OracleRequest") -> "Optional[ExplainAnalyzePlan]":
+    def get_explain_analyze_plan(self, request: "AnyRequest") -> "Optional[ExplainAnalyzePlan]":
         plans = self._get_plans(request=request)
         return plans.explain_analyze_plan
+
+    def _get_batch_index(
+        self,
+        query_names: "BatchArgument" = None,
+        dops: "BatchArgument" = None,
+        hintsets: "BatchArgument" = None,
+    ) -> "Tuple[np.ndarray, ...]":
+        """
+        If all arguments are given, they are broadcasted against each other and addressed
+        element-wise (as in numpy). Otherwise, the missing ones stand for the whole axis,
+        and the result is the grid `[query, dop, hintset]` over the given 1-d arrays.
+        """
+        if query_names is not None and dops is not None and hintsets is not None:
+            query_ids, dop_ids = _to_ids(query_names, self.query_name_to_id), _to_ids(dops, self.dop_to_idx)
+            return tuple(np.broadcast_arrays(query_ids, dop_ids, np.asarray(hintsets, dtype=np.int64)))
+        _, n_dops, n_hintsets = self.store.execution_time.shape
+        return np.ix_(
+            np.arange(len(self.store)) if query_names is None else _to_ids(query_names, self.query_name_to_id),
+            np.arange(n_dops) if dops is None else _to_ids(dops, self.dop_to_idx),
+            np.arange(n_hintsets) if hintsets is None else np.asarray(hintsets, dtype=np.int64),
+        )
+
+    def get_planning_times(
+        self, query_names: "BatchArgument" = None, dops: "BatchArgument" = None, hintsets: "BatchArgument" = None
+    ) -> "np.ndarray":
+        """batched version of `get_planning_time`, see `_get_batch_index` for the addressing rules"""
+        return np.asarray(self.store.planning_time[self._get_batch_index(query_names, dops, hintsets)])
+
+    def get_costs(
+        self, query_names: "BatchArgument" = None, dops: "BatchArgument" = None, hintsets: "BatchArgument" = None
+    ) -> "np.ndarray":
+        """batched version of `get_cost`, see `_get_batch_index` for the addressing rules"""
+        return np.asarray(self.store.cost[self._get_batch_index(query_names, dops, hintsets)])
+
+    def get_execution_times(
+        self,
+        query_names: "BatchArgument" = None,
+        dops: "BatchArgument" = None,
+        hintsets: "BatchArgument" = None,
+        timeout_value: "Time" = TIMEOUT,
+    ) -> "np.ndarray":
+        """
+        Batched version of `get_execution_time`, see `_get_batch_index` for the addressing rules.
+        Timeouted settings are filled with `timeout_value` (e.g. `np.nan` to mask them out).
+        """
+        index = self._get_batch_index(query_names, dops, hintsets)
+        execution_times = np.asarray(self.store.execution_time[index])
+        if timeout_value != TIMEOUT:
+            execution_times[self.store.is_timeout[index]] = timeout_value
+        return execution_times
+
+    def get_timeout_mask(
+        self, query_names: "BatchArgument" = None, dops: "BatchArgument" = None, hintsets: "BatchArgument" = None
+    ) -> "np.ndarray":
+        return np.asarray(self.store.is_timeout[self._get_batch_index(query_names, dops, hintsets)])
+
+    def _compute_logical_plan_ids(self) -> "np.ndarray":
+        logical_plan_ids = np.zeros(self.store.execution_time.shape, dtype=np.int64)
+        for query_id, query_name in enumerate(self.store.query_names):
+            key_to_id: "Dict[LogicalPlanKey, int]" = {}
+            for dop_idx, dop in enumerate(DOPS):
+                for hintset in HINTSETS:
+                    key = get_logical_plan_key(self.get_explain_plan(OracleKey(query_name, dop, hintset)))
+                    logical_plan_ids[query_id, dop_idx, hintset] = key_to_id.setdefault(key, len(key_to_id))
+        return logical_plan_ids
+
+    def _get_effective_times(self) -> "EffectiveTimes":
+        """
+        The table is computed once per benchmark (it's the only place where plans are parsed for it) and persisted
+        (see `cache_prefix`), so it's recomputed only when the data (see `get_fingerprint`) or the imputation rules
+        change.
+        """
+        if self._effective_times is None:
+            path = get_path_to_effective_times(self.cache_prefix)
+            self._effective_times = load_effective_times(path, self.get_fingerprint(), self.store.query_names)
+            if self._effective_times is None:
+                self._effective_times = compute_effective_times(
+                    np.asarray(self.store.execution_time),
+                    np.asarray(self.store.is_timeout),
+                    self._compute_logical_plan_ids(),
+                )
+                save_effective_times(path, self.get_fingerprint(), self.store.query_names, self._effective_times)
+        return self._effective_times
+
+    def get_effective_execution_time(self, request: "AnyRequest") -> "Time":
+        """execution time, where T/O is replaced with its imputed lower bound (see `hbo_bench.effective_times`)"""
+        return float(self._get_effective_times().effective_execution_time[self._get_index(request)])
+
+    def get_effective_execution_times(
+        self, query_names: "BatchArgument" = None, dops: "BatchArgument" = None, hintsets: "BatchArgument" = None
+    ) -> "np.ndarray":
+        """batched version of `get_effective_execution_time`, see `_get_batch_index` for the addressing rules"""
+        index = self._get_batch_index(query_names, dops, hintsets)
+        return self._get_effective_times().effective_execution_time[index]
+
+    def get_imputation_rules(
+        self, query_names: "BatchArgument" = None, dops: "BatchArgument" = None, hintsets: "BatchArgument" = None
+    ) -> "np.ndarray":
+        """codes of the rules, by which effective execution times were obtained (see `IMPUTATION_RULES`)"""
+        return self._get_effective_times().imputation_rule[self._get_batch_index(query_names, dops, hintsets)]
+
+    def get_logical_plan_ids(
+        self, query_names: "BatchArgument" = None, dops: "BatchArgument" = None, hintsets: "BatchArgument" = None
+    ) -> "np.ndarray":
+        """ids of logical plans (see `utils.get_logical_tree`), they are numbered within every query"""
+        return self._get_effective_times().logical_plan_id[self._get_batch_index(query_names, dops, hintsets)]
+
+    def get_optimum_index(self) -> "OptimumIndex":
+        """
+        Default and optimal e2e times and states of every query (in the order of `get_query_names`), see
+        `hbo_bench.optimum_index`; it's built once per benchmark and persisted (see `cache_prefix`) as
+        `_get_effective_times`.
+        """
+        if self._optimum_index is None:
+            path = get_path_to_optimum_index(self.cache_prefix)
+            self._optimum_index = load_optimum_index(path, self.get_fingerprint(), self.store.query_names)
+            if self._optimum_index is None:
+                e2e_times = np.asarray(self.store.planning_time) + np.asarray(self.store.execution_time)
+                self._optimum_index = compute_optimum_index(e2e_times)
+                save_optimum_index(path, self.get_fingerprint(), self.store.query_names, self._optimum_index)
+        return self._optimum_index
+
+    def _get_query_index(self, query_names: "BatchArgument" = None) -> "Union[slice, np.ndarray]":
+        return slice(None) if query_names is None else _to_ids(query_names, self.query_name_to_id)
+
+    def get_default_e2e_times(self, query_names: "BatchArgument" = None) -> "np.ndarray":
+        """e2e times of queries (all by default) in the default state, see `get_optimum_index`"""
+        return self.get_optimum_index().default_e2e_time[self._get_query_index(query_names)]
+
+    def get_optimal_e2e_times(self, query_names: "BatchArgument" = None) -> "np.ndarray":
+        """the best e2e times of queries (all by default), see `get_optimum_index`"""
+        return self.get_optimum_index().optimal_e2e_time[self._get_query_index(query_names)]
+
+    def get_state_ranks(
+        self, query_names: "BatchArgument" = None, dops: "BatchArgument" = None, hintsets: "BatchArgument" = None
+    ) -> "np.ndarray":
+        """ranks of states by e2e time within every query (0 is optimal), see `_get_batch_index` for the addressing"""
+        return self.get_optimum_index().state_rank[self._get_batch_index(query_names, dops, hintsets)]
@@ -0,0 +1,124 @@
+import os
+import weakref
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from hbo_bench.oracle import Oracle, OracleKey
+from hbo_bench.data_types import ExplainPlan, QueryName, QueryDop, HintsetCode
+from hbo_bench.data_config import DOPS, HINTSETS
+from hbo_bench.store import save_query_table, load_query_table
+
+# must be changed along with `get_plan_key`, it invalidates all persisted indices
+PLAN_INDEX_VERSION = 1
+PLAN_INDEX_SUFFIX = ".plan_index.npz"
+
+PlanId = int
+# pre-order sequence of `(node type, relation, index, cardinality, cost, number of children)`
+PlanKey = Tuple[Tuple, ...]
+
+
+def get_plan_key(plan: "ExplainPlan") -> "PlanKey":
+    """hashable structure of physical plan, equal keys mean equal plans (up to planning time)"""
+    key = []
+    stack = [plan.plan]
+    while stack:
+        node = stack.pop()
+        key.append(
+            (
+                node.node_type,
+                node.relation_name,
+                node.index_name,
+                node.estimated_cardinality,
+                node.cost,
+                len(node.plans),
+            )
+        )
+        stack.extend(reversed(node.plans))
+    return tuple(key)
+
+
+class PlanIndex:
+    def __init__(
+        self,
+        oracle: "Oracle",
+        query_names: "Optional[List[QueryName]]" = None,
+        plan_ids: "Optional[np.ndarray]" = None,
+    ):
+        """
+        Maps every setting `(query_name, dop, hintset)` to the id of its physical plan; settings with
+        the same plan share the id (within a query as well as across queries), and ids are numbered in
+        the order of the first appearance. So everything that depends only on the plan (vectorization,
+        logical tree, etc.) can be computed once per id, e.g. for `get_representative(plan_id)`.
+        Already known `plan_ids` of `query_names` (e.g. persisted ones) spare parsing of all plans.
+        """
+        self.query_names = oracle.get_query_names() if query_names is None else query_names
+        self.query_name_to_id: "Dict[QueryName, int]" = {name: idx for idx, name in enumerate(self.query_names)}
+        self.groups: "List[List[OracleKey]]" = []
+        if plan_ids is not None:
+            self.plan_ids = plan_ids
+            self.groups = [[] for _ in range(int(plan_ids.max(initial=-1)) + 1)]
+            for query_id, query_name in enumerate(self.query_names):
+                for dop_idx, dop in enumerate(DOPS):
+                    for hintset in HINTSETS:
+                        self.groups[plan_ids[query_id, dop_idx, hintset]].append(OracleKey(query_name, dop, hintset))
+            return
+
+        self.plan_ids = np.zeros((len(self.query_names), len(DOPS), len(HINTSETS)), dtype=np.int64)
+        key_to_plan_id: "Dict[PlanKey, PlanId]" = {}
+        for query_id, query_name in enumerate(self.query_names):
+            for dop_idx, dop in enumerate(DOPS):
+                for hintset in HINTSETS:
+                    request = OracleKey(query_name, dop, hintset)
+                    plan_key = get_plan_key(oracle.get_explain_plan(request))
+                    if plan_key not in key_to_plan_id:
+                        key_to_plan_id[plan_key] = len(self.groups)
+                        self.groups.append([])
+                    plan_id = key_to_plan_id[plan_key]
+                    self.plan_ids[query_id, dop_idx, hintset] = plan_id
+                    self.groups[plan_id].append(request)
+
+    def __len__(self) -> "int":
+        """number of unique plans"""
+        return len(self.groups)
+
+    def get_plan_id(self, query_name: "QueryName", dop: "QueryDop", hintset: "HintsetCode") -> "PlanId":
+        assert query_name in self.query_name_to_id, f"Unknown query {query_name}"
+        return int(self.plan_ids[self.query_name_to_id[query_name], DOPS.index(dop), hintset])
+
+    def get_query_plan_ids(self, query_name: "QueryName") -> "np.ndarray":
+        """`[dop_idx, hintset]` array of plan ids of the query"""
+        assert query_name in self.query_name_to_id, f"Unknown query {query_name}"
+        return self.plan_ids[self.query_name_to_id[query_name]]
+
+    def get_group(self, plan_id: "PlanId") -> "List[OracleKey]":
+        """all settings with the plan"""
+        return self.groups[plan_id]
+
+    def get_representative(self, plan_id: "PlanId") -> "OracleKey":
+        return self.groups[plan_id][0]
+
+
+def get_path_to_plan_index(path_to_bench: "str") -> "str":
+    return f"{os.path.normpath(path_to_bench)}{PLAN_INDEX_SUFFIX}"
+
+
+# indices of all queries of oracles, they live as long as their oracles
+_ORACLE_TO_PLAN_INDEX: "weakref.WeakKeyDictionary[Oracle, PlanIndex]" = weakref.WeakKeyDictionary()
+
+
+def get_plan_index(oracle: "Oracle") -> "PlanIndex":
+    """
+    Index of all queries of the benchmark, it's built once per benchmark and persisted (best-effort, see
+    `Oracle.cache_prefix`), so plans are parsed for it only when the data changes.
+    """
+    if oracle not in _ORACLE_TO_PLAN_INDEX:
+        path, query_names = get_path_to_plan_index(oracle.cache_prefix), oracle.get_query_names()
+        columns = load_query_table(path, oracle.get_fingerprint(), PLAN_INDEX_VERSION, query_names)
+        if columns is None:
+            plan_index = PlanIndex(oracle, query_names)
+            save_query_table(
+                path, oracle.get_fingerprint(), PLAN_INDEX_VERSION, query_names, {"plan_id": plan_index.plan_ids}
+            )
+        else:
+            plan_index = PlanIndex(oracle, query_names, columns["plan_id"])
+        _ORACLE_TO_PLAN_INDEX[oracle] = plan_index
+    return _ORACLE_TO_PLAN_INDEX[oracle]
@@ -1,8 +1,9 @@
 from typing import Set, List, Tuple
+from functools import lru_cache
 from collections import namedtuple
-from hbo_bench.oracle import Oracle, OracleRequest
+from hbo_bench.oracle import Oracle, OracleKey
 from hbo_bench.data_types import QueryName, Time, ExplainPlan
-from hbo_bench.data_config import DEFAULT_DOP, DEFAULT_HINTSET, DOPS, HINTS
+from hbo_bench.data_config import DEFAULT_DOP, DEFAULT_HINTSET, DOPS, HINTS, HINTSETS
 
 
 OFF_INL_HINT = 64 | 8 | 2
@@ -28,6 +29,8 @@ SearchingSettings = namedtuple(
         "default_dop",
         "hardcoded_hintsets",
         "hardcoded_dops",
+        "hardcoded_batch_size",
+        "prune_hardcoded",
     ],
     defaults=[
         False,
@@ -41,10 +44,99 @@ SearchingSettings = namedtuple(
         DEFAULT_DOP,
         None,
         None,
+        None,
+        False,
     ],
 )
 
 
+# states are encoded by integers `hintset * len(DOPS) + dop_idx`, so the order of codes
+# matches the order of `SearchingState` tuples (it matters for breaking ties by `min`)
+StateCode = int
+ALL_STATES: "List[SearchingState]" = [SearchingState(hintset, dop) for hintset in HINTSETS for dop in DOPS]
+STATE_TO_CODE = {state: code for code, state in enumerate(ALL_STATES)}
+N_STATES = len(ALL_STATES)
+
+
+def _collect_neighbors(state: "SearchingState", settings: "SearchingSettings") -> "Set[SearchingState]":
+    current_dop, current_hintset = state.dop, state.hintset
+    neighbors = set()
+
+    if settings.use_joined_search and settings.decrease_dop:
+        to_try_dops = DOPS
+    else:
+        to_try_dops = [current_dop]
+
+    for dop in to_try_dops:
+        if settings.disable_scans:
+            for op_num in range(N_SCANS):
+                neighbors.add(SearchingState(dop=dop, hintset=current_hintset | (1 << op_num)))
+
+        if settings.disable_joins:
+            for op_num in range(N_SCANS, N_SCANS + N_JOINS):
+                neighbors.add(SearchingState(dop=dop, hintset=current_hintset | (1 << op_num)))
+
+        if settings.disable_inl:
+            neighbors.add(SearchingState(dop=dop, hintset=current_hintset | (OFF_INL_HINT)))
+
+        if settings.decrease_dop:
+            for new_dop in [new_dop for new_dop in DOPS if new_dop < dop]:
+                neighbors.add(SearchingState(dop=new_dop, hintset=current_hintset))
+
+    return neighbors
+
+
+@lru_cache(maxsize=None)
+def get_neighbor_table(
+    disable_joins: "bool", disable_scans: "bool", decrease_dop: "bool", disable_inl: "bool", use_joined_search: "bool"
+) -> "Tuple[Tuple[StateCode, ...], ...]":
+    """
+    Neighbour relation over the whole state space compiled once for every combination of flags:
+    `table[code]` lists codes of the state itself followed by its (distinct) neighbours.
+    """
+    settings = SearchingSettings(
+        disable_joins=disable_joins,
+        disable_scans=disable_scans,
+        decrease_dop=decrease_dop,
+        disable_inl=disable_inl,
+        use_joined_search=use_joined_search,
+    )
+    table = []
+    for code, state in enumerate(ALL_STATES):
+        neighbor_codes = sorted(STATE_TO_CODE[st] for st in _collect_neighbors(state, settings) if st != state)
+        table.append(tuple([code] + neighbor_codes))
+    return tuple(table)
+
+
+def get_settings_neighbor_table(settings: "SearchingSettings") -> "Tuple[Tuple[StateCode, ...], ...]":
+    return get_neighbor_table(
+        bool(settings.disable_joins),
+        bool(settings.disable_scans),
+        bool(settings.decrease_dop),
+        bool(settings.disable_inl),
+        bool(settings.use_joined_search),
+    )
+
+
+def is_hardcoded(settings: "SearchingSettings") -> "bool":
+    return settings.hardcoded_hintsets is not None or settings.hardcoded_dops is not None
+
+
+def get_hardcoded_batches(settings: "SearchingSettings") -> "List[List[StateCode]]":
+    """
+    Distinct states of the grid `hardcoded_hintsets x hardcoded_dops` (a missing one is replaced
+    by the default value) split into rounds of `hardcoded_batch_size` (all at once by default).
+    As in the local search, the default state is still explored when the grid is empty (e.g. `EMPTY_SS`).
+    """
+    hintsets = [settings.default_hintset] if settings.hardcoded_hintsets is None else settings.hardcoded_hintsets
+    dops = [settings.default_dop] if settings.hardcoded_dops is None else settings.hardcoded_dops
+    codes = list(dict.fromkeys(STATE_TO_CODE[SearchingState(hintset, dop)] for hintset in hintsets for dop in dops))
+    if not codes:
+        codes = [STATE_TO_CODE[SearchingState(settings.default_hintset, settings.default_dop)]]
+    batch_size = settings.hardcoded_batch_size or max(1, len(codes))
+    return [codes[start : start + batch_size] for start in range(0, len(codes), batch_size)]
+
+
 class QueryExplorer:
     def __init__(
         self,
@@ -55,19 +147,33 @@ class QueryExplorer:
         self.oracle = oracle
         self.query_name = query_name
         self.settings = settings
+        self.neighbor_table = get_settings_neighbor_table(settings)
+
+        # times in seconds of all states (in order of their codes) are gathered at once
+        planning_times = oracle.get_planning_times(query_names=[query_name])[0].T.ravel() / 1000
+        execution_times = oracle.get_execution_times(query_names=[query_name])[0].T.ravel() / 1000
+        self.state_planning_times: "List[Time]" = planning_times.tolist()
+        self.state_e2e_times: "List[Time]" = (planning_times + execution_times).tolist()
 
-        self.tried_states: "Set[SearchingState]" = set()
-        self.explored_states: "Set[SearchingState]" = set()
+        self.tried_codes = bytearray(N_STATES)
+        self.explored_codes: "Set[StateCode]" = set()
 
         self.parallel_planning_time = 0.0
         self.parallel_e2e_time = 0.0
 
-    def _prepare_request(self, state: "SearchingState") -> "OracleRequest":
-        return OracleRequest(query_name=self.query_name, hintset=state.hintset, dop=state.dop)
+    @property
+    def tried_states(self) -> "Set[SearchingState]":
+        return {ALL_STATES[code] for code in range(N_STATES) if self.tried_codes[code]}
+
+    @property
+    def explored_states(self) -> "Set[SearchingState]":
+        return {ALL_STATES[code] for code in self.explored_codes}
+
+    def _prepare_request(self, state: "SearchingState") -> "OracleKey":
+        return OracleKey(query_name=self.query_name, hintset=state.hintset, dop=state.dop)
 
     def get_execution_time(self, state: "SearchingState") -> "Time":
-        request = OracleRequest(query_name=self.query_name, hintset=state.hintset, dop=state.dop)
-        return self.oracle.get_execution_time(request) / 1000
+        return self.oracle.get_execution_time(self._prepare_request(state)) / 1000
 
     def get_planning_time(self, state: "SearchingState") -> "Time":
         return self.oracle.get_planning_time(self._prepare_request(state)) / 1000
@@ -78,57 +184,63 @@ class QueryExplorer:
     def _get_explain_plan(self, state: "SearchingState") -> "ExplainPlan":
         return self.oracle.get_explain_plan(self._prepare_request(state))  # pragma: no cover
 
-    def explore_in_parallel(self, neighbors: "List[SearchingState]", timeout: "Time") -> "Tuple[Time, SearchingState]":
-        self.tried_states |= set(neighbors)
-        min_e2e_time, best_st = min((self.get_planning_time(st) + self.get_execution_time(st), st) for st in neighbors)
+    def _explore_codes_in_parallel(self, codes: "List[StateCode]", timeout: "Time") -> "Tuple[Time, StateCode]":
+        e2e_times, planning_times = self.state_e2e_times, self.state_planning_times
+        for code in codes:
+            self.tried_codes[code] = 1
+        min_e2e_time, best_code = min((e2e_times[code], code) for code in codes)
         timeout = min(timeout, min_e2e_time)
-        plan_times = [self.get_planning_time(st) for st in neighbors]
-        e2e_times = [self.get_planning_time(st) + self.get_execution_time(st) for st in neighbors]
-        self.parallel_planning_time += max(min(plan_time, timeout) for plan_time in plan_times)
-        self.parallel_e2e_time += min(min(e2e_time, timeout) for e2e_time in e2e_times)
+        self.parallel_planning_time += max(min(planning_times[code], timeout) for code in codes)
+        self.parallel_e2e_time += min(min(e2e_times[code], timeout) for code in codes)
         if min_e2e_time <= timeout:
-            self.explored_states.add(best_st)
-        return min_e2e_time, best_st
+            self.explored_codes.add(best_code)
+        return min_e2e_time, best_code
+
+    def explore_in_parallel(self, neighbors: "List[SearchingState]", timeout: "Time") -> "Tuple[Time, SearchingState]":
+        codes = [STATE_TO_CODE[st] for st in neighbors]
+        min_e2e_time, best_code = self._explore_codes_in_parallel(codes, timeout)
+        return min_e2e_time, ALL_STATES[best_code]
+
+    def _run_hardcoded(self) -> "SearchingState":
+        """
+        Exhaustive exploration of the hardcoded grid by rounds of parallel executions. With `prune_hardcoded`
+        states, which can't beat the record since their planning alone exceeds the timeout, are skipped.
+        """
+        def_code = STATE_TO_CODE[SearchingState(self.settings.default_hintset, self.settings.default_dop)]
+        record_code, record_time = def_code, float("inf")
+        for batch in get_hardcoded_batches(self.settings):
+            timeout = record_time / self.settings.relative_boost_threshold
+            if self.settings.prune_hardcoded:
+                batch = [code for code in batch if self.state_planning_times[code] < timeout]
+            if not batch:
+                continue
+            best_time, best_code = self._explore_codes_in_parallel(batch, timeout)
+            if record_time / best_time > self.settings.relative_boost_threshold:
+                record_code, record_time = best_code, best_time
+
+        return ALL_STATES[record_code]
 
     def run(self) -> "SearchingState":
-        def_state = SearchingState(self.settings.default_hintset, self.settings.default_dop)
-        prev_state, record_state, record_time = None, def_state, float("inf")
+        if is_hardcoded(self.settings):
+            return self._run_hardcoded()
+
+        def_code = STATE_TO_CODE[SearchingState(self.settings.default_hintset, self.settings.default_dop)]
+        prev_code, record_code, record_time = None, def_code, float("inf")
         it = 0
-        while it < self.settings.max_iter and prev_state != record_state:
-            timeout, prev_state = record_time / self.settings.relative_boost_threshold, record_state
-            neighbors = list(filter(lambda st: st not in self.tried_states, self.get_neighbors(state=record_state)))
+        while it < self.settings.max_iter and prev_code != record_code:
+            timeout, prev_code = record_time / self.settings.relative_boost_threshold, record_code
+            neighbors = [code for code in self._get_neighbor_codes(record_code) if not self.tried_codes[code]]
             if not neighbors:
                 break  # pragma: no cover
-            best_ngb_time, best_ngb = self.explore_in_parallel(neighbors, timeout)
+            best_ngb_time, best_ngb = self._explore_codes_in_parallel(neighbors, timeout)
             if record_time / best_ngb_time > self.settings.relative_boost_threshold:
-                record_state, record_time = best_ngb, best_ngb_time
+                record_code, record_time = best_ngb, best_ngb_time
             it += 1
 
-        return record_state
-
-    def get_neighbors(self, state: "SearchingState") -> "List[SearchingState]":
-        current_dop, current_hintset = state.dop, state.hintset
-        neighbors = set()
-
-        if self.settings.use_joined_search and self.settings.decrease_dop:
-            to_try_dops = DOPS
-        else:
-            to_try_dops = [current_dop]
+        return ALL_STATES[record_code]
 
-        for dop in to_try_dops:
-            if self.settings.disable_scans:
-                for op_num in range(N_SCANS):
-                    neighbors.add(SearchingState(dop=dop, hintset=current_hintset | (1 << op_num)))
+    def _get_neighbor_codes(self, code: "StateCode") -> "Tuple[StateCode, ...]":
+        return self.neighbor_table[code]
 
-            if self.settings.disable_joins:
-                for op_num in range(N_SCANS, N_SCANS + N_JOINS):
-                    neighbors.add(SearchingState(dop=dop, hintset=current_hintset | (1 << op_num)))
-
-            if self.settings.disable_inl:
-                neighbors.add(SearchingState(dop=dop, hintset=current_hintset | (OFF_INL_HINT)))
-
-            if self.settings.decrease_dop:
-                for new_dop in [new_dop for new_dop in DOPS if new_dop < dop]:
-                    neighbors.add(SearchingState(dop=new_dop, hintset=current_hintset))
-
-        return [state] + list(neighbors)
+    def get_neighbors(self, state: "SearchingState") -> "List[SearchingState]":
+        return [ALL_STATES[code] for code in self._get_neighbor_codes(STATE_TO_CODE[state])]
@@ -0,0 +1,125 @@
+import multiprocessing as mp
+from collections import namedtuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from hbo_bench.oracle import Oracle
+from hbo_bench.query_explorer import QueryExplorer, SearchingSettings, SearchingState
+from hbo_bench.batch_explorer import BatchQueryExplorer
+from hbo_bench.data_types import QueryName
+
+QueryRunResult = namedtuple(
+    "QueryRunResult",
+    ["best_state", "parallel_planning_time", "parallel_e2e_time", "def_e2e_time", "best_e2e_time", "boost"],
+)
+
+# the oracle of the current process; workers get it either by `fork` (without any copying
+# thanks to copy-on-write) or by reopening it in `_init_worker` (see `Oracle.get_reopen_args`)
+_WORKER_ORACLE: "Optional[Oracle]" = None
+
+
+def run_query(oracle: "Oracle", settings: "SearchingSettings", query_name: "QueryName") -> "QueryRunResult":
+    explorer = QueryExplorer(oracle, query_name, settings)
+    best_state = explorer.run()
+    def_state = SearchingState(settings.default_hintset, settings.default_dop)
+    def_e2e_time, best_e2e_time = explorer.get_e2e_time(def_state), explorer.get_e2e_time(best_state)
+    return QueryRunResult(
+        best_state=best_state,
+        parallel_planning_time=explorer.parallel_planning_time,
+        parallel_e2e_time=explorer.parallel_e2e_time,
+        def_e2e_time=def_e2e_time,
+        best_e2e_time=best_e2e_time,
+        boost=def_e2e_time / best_e2e_time,
+    )
+
+
+def _init_worker(open_oracle: "Callable[..., Oracle]", args: "Tuple") -> "None":
+    global _WORKER_ORACLE  # pylint: disable=global-statement
+    _WORKER_ORACLE = open_oracle(*args)
+
+
+def _call_with_worker_oracle(func_and_item: "Tuple[Callable[[Oracle, Any], Any], Any]") -> "Any":
+    assert _WORKER_ORACLE is not None, "Worker hasn't been initialized"
+    func, item = func_and_item
+    return func(_WORKER_ORACLE, item)
+
+
+def imap_with_oracle(
+    oracle: "Oracle",
+    func: "Callable[[Oracle, Any], Any]",
+    items: "Iterable[Any]",
+    workers: "int" = 1,
+    chunksize: "int" = 1,
+    start_method: "Optional[str]" = None,
+) -> "Iterator[Any]":
+    """
+    Lazily yields `func(oracle, item)` for every item (in the same order) computed by a pool of `workers` processes,
+    `func` must be a module-level function. The oracle is never pickled: with `fork` (used by default, when it's
+    available) workers inherit it, otherwise they reopen it (see `Oracle.get_reopen_args`).
+    """
+    global _WORKER_ORACLE  # pylint: disable=global-statement
+    if workers <= 1:
+        yield from (func(oracle, item) for item in items)
+        return
+
+    if start_method is None:
+        start_method = "fork" if "fork" in mp.get_all_start_methods() else mp.get_start_method()
+    if start_method == "fork":
+        _WORKER_ORACLE = oracle
+        pool = mp.get_context("fork").Pool(processes=workers)  # workers are forked right here
+        _WORKER_ORACLE = None
+    else:
+        pool = mp.get_context(start_method).Pool(
+            processes=workers, initializer=_init_worker, initargs=oracle.get_reopen_args()
+        )
+    with pool:
+        yield from pool.imap(_call_with_worker_oracle, ((func, item) for item in items), chunksize=chunksize)
+
+
+def _run_task(oracle: "Oracle", task: "Tuple[SearchingSettings, QueryName]") -> "QueryRunResult":
+    settings, query_name = task
+    return run_query(oracle, settings, query_name)
+
+
+def run_tasks(
+    oracle: "Oracle", tasks: "List[Tuple[SearchingSettings, QueryName]]", workers: "int" = 1
+) -> "List[QueryRunResult]":
+    """runs explorations `(settings, query_name)` using a pool of `workers` processes, see `imap_with_oracle`"""
+    if len(tasks) <= 1:
+        workers = 1
+    chunksize = max(1, len(tasks) // (4 * workers))
+    return list(imap_with_oracle(oracle, _run_task, tasks, workers, chunksize))
+
+
+def run_benchmark(
+    oracle: "Oracle",
+    settings: "SearchingSettings",
+    query_names: "Optional[List[QueryName]]" = None,
+    workers: "int" = 1,
+) -> "Dict[QueryName, QueryRunResult]":
+    """explores every query of benchmark with the given settings, see `run_tasks`"""
+    query_names = oracle.get_query_names() if query_names is None else query_names
+    results = run_tasks(oracle, [(settings, query_name) for query_name in query_names], workers)
+    return dict(zip(query_names, results))
+
+
+def run_benchmark_vectorized(
+    oracle: "Oracle",
+    settings: "SearchingSettings",
+    query_names: "Optional[List[QueryName]]" = None,
+) -> "Dict[QueryName, QueryRunResult]":
+    """the same as `run_benchmark`, but all queries are explored in lockstep by `BatchQueryExplorer`"""
+    explorer = BatchQueryExplorer(oracle, settings, query_names)
+    best_states = explorer.run()
+    def_state = SearchingState(settings.default_hintset, settings.default_dop)
+    def_e2e_times = explorer.get_e2e_times([def_state] * len(best_states)).tolist()
+    best_e2e_times = explorer.get_e2e_times(best_states).tolist()
+    return {
+        query_name: QueryRunResult(
+            best_state=best_states[query_id],
+            parallel_planning_time=float(explorer.parallel_planning_times[query_id]),
+            parallel_e2e_time=float(explorer.parallel_e2e_times[query_id]),
+            def_e2e_time=def_e2e_times[query_id],
+            best_e2e_time=best_e2e_times[query_id],
+            boost=def_e2e_times[query_id] / best_e2e_times[query_id],
+        )
+        for query_id, query_name in enumerate(explorer.query_names)
+    }
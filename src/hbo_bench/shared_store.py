@@ -0,0 +1,99 @@
+import sys
+import signal
+import argparse
+from multiprocessing import shared_memory, resource_tracker
+from typing import Optional, Tuple
+import numpy as np
+from hbo_bench.store import ColumnarStore, STORE_DTYPE, open_store
+
+# `(number of queries, size of packed plans)`, the table starts at `HEADER_SIZE` to keep it aligned
+HEADER_DTYPE = np.dtype([("n_queries", np.int64), ("plans_size", np.int64)])
+HEADER_SIZE = 64
+
+
+def publish_store(store: "ColumnarStore", name: "Optional[str]" = None) -> "shared_memory.SharedMemory":
+    """
+    Copies the table and packed plans (if any) of `store` into a new block of shared memory named `name`
+    (random by default); the caller owns the block and has to `close` and `unlink` it.
+    """
+    table = np.asarray(store.table)
+    packed_plans = np.zeros(0, dtype=np.uint8) if store.packed_plans is None else np.asarray(store.packed_plans)
+    block = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + table.nbytes + packed_plans.nbytes)
+    header, shared_table, shared_plans = _get_views(block, len(table), len(packed_plans))
+    header[0] = (len(table), len(packed_plans))
+    shared_table[:], shared_plans[:] = table, packed_plans
+    del header, shared_table, shared_plans  # otherwise the block can't be closed
+    return block
+
+
+def _get_views(
+    block: "shared_memory.SharedMemory", n_queries: "int", plans_size: "int"
+) -> "Tuple[np.ndarray, np.ndarray, np.ndarray]":
+    table_offset = HEADER_SIZE
+    plans_offset = table_offset + n_queries * STORE_DTYPE.itemsize
+    return (
+        np.ndarray((1,), dtype=HEADER_DTYPE, buffer=block.buf),
+        np.ndarray((n_queries,), dtype=STORE_DTYPE, buffer=block.buf, offset=table_offset),
+        np.ndarray((plans_size,), dtype=np.uint8, buffer=block.buf, offset=plans_offset),
+    )
+
+
+def _open_untracked(name: "str") -> "shared_memory.SharedMemory":
+    """the block is owned (and unlinked) by its publisher, so it mustn't be unlinked when this process exits"""
+    if sys.version_info >= (3, 13):  # pragma: no cover
+        return shared_memory.SharedMemory(name=name, track=False)  # pylint: disable=unexpected-keyword-arg
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def attach_store(name: "str") -> "ColumnarStore":
+    """
+    Read-only store over the block published by `publish_store`; nothing is copied, so any number
+    of processes can attach to the same block without additional memory.
+    """
+    block = _open_untracked(name)
+    header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=block.buf)
+    n_queries, plans_size = int(header["n_queries"][0]), int(header["plans_size"][0])
+    del header
+    _, table, packed_plans = _get_views(block, n_queries, plans_size)
+    table.flags.writeable, packed_plans.flags.writeable = False, False
+    return ColumnarStore(table, packed_plans if plans_size else None, buffer_owner=block)
+
+
+class SharedStore:
+    def __init__(self, path_to_bench: "str", name: "Optional[str]" = None):
+        """
+        Publishes the compiled store of benchmark (see `open_store`) to shared memory, where it stays until `close`.
+        Clients attach to it by `self.name` with `Oracle(path_to_bench, shared_memory_name=name)`.
+        """
+        self._block = publish_store(open_store(path_to_bench), name)
+        self.name: "str" = self._block.name
+
+    def close(self) -> "None":
+        self._block.close()
+        self._block.unlink()
+
+    def __enter__(self) -> "SharedStore":
+        return self
+
+    def __exit__(self, *args) -> "None":
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the store of benchmark from shared memory until interrupted")
+    parser.add_argument("path_to_bench")
+    parser.add_argument("--name", default=None, help="name of the shared memory block, random by default")
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    with SharedStore(args.path_to_bench, args.name) as shared_store:
+        print(shared_store.name, flush=True)
+        try:
+            signal.pause()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,229 @@
+import os
+import hashlib
+import contextlib
+from json import load, dumps
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from hbo_bench.data_types import QueryName, QueryData
+from hbo_bench.data_config import DOPS, HINTSETS
+
+TIMEOUT = float(2**42)
+
+STORE_SUFFIX = ".npy"
+PACKED_PLANS_SUFFIX = ".plans"
+MAX_QUERY_NAME_LENGTH = 64
+GRID_SHAPE = (len(DOPS), len(HINTSETS))
+STORE_DTYPE = np.dtype(
+    [
+        ("query_name", f"U{MAX_QUERY_NAME_LENGTH}"),
+        ("planning_time", np.float64, GRID_SHAPE),
+        ("execution_time", np.float64, GRID_SHAPE),
+        ("cost", np.float64, GRID_SHAPE),
+        ("is_timeout", np.bool_, GRID_SHAPE),
+        ("plans_offset", np.int64, GRID_SHAPE),
+        ("plans_size", np.int64, GRID_SHAPE),
+    ]
+)
+
+
+class ColumnarStore:
+    def __init__(
+        self, table: "np.ndarray", packed_plans: "Optional[np.ndarray]" = None, buffer_owner: "Optional[Any]" = None
+    ):
+        """
+        Columnar view of a benchmark: one record per query, every column is
+        indexed by `[query_id, dop_idx, hintset]`. The table can be a memory-mapped
+        array, so opening the store doesn't require reading the data itself.
+        Serialized `Plans` are kept (if any) in `packed_plans` - a flat byte buffer
+        addressed by the `plans_offset` and `plans_size` columns. `buffer_owner` is
+        kept alive as long as the store, e.g. shared memory under both arrays.
+        """
+        assert table.dtype == STORE_DTYPE, "Store has been compiled with an outdated layout"
+        self.table = table
+        self.packed_plans = packed_plans
+        self.buffer_owner = buffer_owner
+        self.query_names: "List[QueryName]" = [str(query_name) for query_name in table["query_name"]]
+        self.planning_time: "np.ndarray" = table["planning_time"]
+        self.execution_time: "np.ndarray" = table["execution_time"]
+        self.cost: "np.ndarray" = table["cost"]
+        self.is_timeout: "np.ndarray" = table["is_timeout"]
+        self.plans_offset: "np.ndarray" = table["plans_offset"]
+        self.plans_size: "np.ndarray" = table["plans_size"]
+
+    def __len__(self) -> "int":
+        return len(self.query_names)
+
+    def get_fingerprint(self) -> "str":
+        """stable (w.r.t. order of queries) hash of all look-up values, it changes whenever data changes"""
+        order = np.argsort(self.table["query_name"])
+        digest = hashlib.sha1()
+        for column in ["query_name", "planning_time", "execution_time", "cost", "is_timeout"]:
+            digest.update(np.ascontiguousarray(self.table[column][order]).tobytes())
+        return digest.hexdigest()
+
+    def get_plans_bytes(self, index: "Tuple[int, int, int]") -> "bytes":
+        assert self.packed_plans is not None, "Store has been opened without packed plans"
+        offset, size = int(self.plans_offset[index]), int(self.plans_size[index])
+        return self.packed_plans[offset : offset + size].tobytes()
+
+    @classmethod
+    def from_benchmark_data(cls, benchmark_data: "Dict[QueryName, QueryData]") -> "ColumnarStore":
+        table = np.zeros(len(benchmark_data), dtype=STORE_DTYPE)
+        table["plans_offset"], table["plans_size"] = -1, 0
+        for query_id, (query_name, query_data) in enumerate(benchmark_data.items()):
+            table["query_name"][query_id] = query_name
+            for dop_idx, dop in enumerate(DOPS):
+                for hintset in HINTSETS:
+                    plans = query_data[str((dop, hintset))]
+                    explain_analyze_plan = plans.explain_analyze_plan
+                    table["planning_time"][query_id, dop_idx, hintset] = plans.explain_plan.planning_time
+                    table["cost"][query_id, dop_idx, hintset] = plans.explain_plan.plan.cost
+                    table["is_timeout"][query_id, dop_idx, hintset] = explain_analyze_plan is None
+                    table["execution_time"][query_id, dop_idx, hintset] = (
+                        explain_analyze_plan.execution_time if explain_analyze_plan else TIMEOUT
+                    )
+        return cls(table)
+
+
+def get_path_to_store(path_to_bench: "str") -> "str":
+    return f"{os.path.normpath(path_to_bench)}{STORE_SUFFIX}"
+
+
+def get_cache_prefix(path_to_bench: "str", cache_dir: "Optional[str]" = None) -> "str":
+    """prefix of the derived tables of benchmark, they are kept next to it unless `cache_dir` is given"""
+    if cache_dir is None:
+        return os.path.normpath(path_to_bench)
+    return os.path.join(cache_dir, os.path.basename(os.path.normpath(path_to_bench)))
+
+
+def get_path_to_packed_plans(path_to_bench: "str") -> "str":
+    return f"{os.path.normpath(path_to_bench)}{PACKED_PLANS_SUFFIX}"
+
+
+def _get_query_name(file_name: "str") -> "QueryName":
+    return file_name.split(".")[0]
+
+
+def _list_query_files(path_to_bench: "str") -> "List[str]":
+    return sorted(file_name for file_name in os.listdir(path_to_bench) if file_name.endswith(".json"))
+
+
+def compile_store(path_to_bench: "str", path_to_packed_plans: "str") -> "ColumnarStore":
+    """
+    Reads raw json of every query without building pydantic models; serialized
+    `Plans` of every setting are appended one after another to `path_to_packed_plans`.
+    """
+    file_names = _list_query_files(path_to_bench)
+    assert file_names, f"There are no query files in {path_to_bench}"
+    table = np.zeros(len(file_names), dtype=STORE_DTYPE)
+    offset, tmp_path = 0, f"{path_to_packed_plans}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as packed_plans_file:
+        for query_id, file_name in enumerate(file_names):
+            with open(f"{path_to_bench}/{file_name}", "r") as query_file:
+                query_data = load(query_file)
+            table["query_name"][query_id] = _get_query_name(file_name)
+            for dop_idx, dop in enumerate(DOPS):
+                for hintset in HINTSETS:
+                    index = query_id, dop_idx, hintset
+                    plans = query_data[str((dop, hintset))]
+                    plans_bytes = dumps(plans).encode()
+                    packed_plans_file.write(plans_bytes)
+                    table["plans_offset"][index], table["plans_size"][index] = offset, len(plans_bytes)
+                    offset += len(plans_bytes)
+
+                    explain_plan, explain_analyze_plan = plans["explain_plan"], plans["explain_analyze_plan"]
+                    table["planning_time"][index] = explain_plan["Planner Runtime"]
+                    table["cost"][index] = explain_plan["Plan"]["Total Cost"]
+                    table["is_timeout"][index] = explain_analyze_plan is None
+                    table["execution_time"][index] = (
+                        explain_analyze_plan["Total Runtime"] if explain_analyze_plan else TIMEOUT
+                    )
+    os.replace(tmp_path, path_to_packed_plans)
+    return ColumnarStore(table)
+
+
+def save_store(store: "ColumnarStore", path_to_store: "str") -> "None":
+    """writes to a temporary file first, so concurrent readers never see a partially written store"""
+    tmp_path = f"{path_to_store}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as store_file:
+        np.save(store_file, np.asarray(store.table))
+    os.replace(tmp_path, path_to_store)
+
+
+def load_packed_plans(path_to_packed_plans: "str") -> "np.ndarray":
+    if not os.path.getsize(path_to_packed_plans):
+        return np.zeros(0, dtype=np.uint8)  # pragma: no cover
+    return np.memmap(path_to_packed_plans, dtype=np.uint8, mode="r")
+
+
+def load_store(path_to_store: "str", path_to_packed_plans: "Optional[str]" = None) -> "ColumnarStore":
+    packed_plans = load_packed_plans(path_to_packed_plans) if path_to_packed_plans else None
+    return ColumnarStore(np.load(path_to_store, mmap_mode="r"), packed_plans)
+
+
+def is_store_outdated(path_to_bench: "str", path_to_store: "str") -> "bool":
+    """
+    The store is outdated when query files were modified after it was compiled or the set of queries changed
+    (removed queries, or added files that are older than the store, aren't visible by modification times).
+    """
+    if not os.path.exists(path_to_store) or not os.path.exists(get_path_to_packed_plans(path_to_bench)):
+        return True
+    table = np.load(path_to_store, mmap_mode="r")
+    file_names = _list_query_files(path_to_bench)
+    if table.dtype != STORE_DTYPE or ColumnarStore(table).query_names != [_get_query_name(n) for n in file_names]:
+        return True
+    store_mtime = os.path.getmtime(path_to_store)
+    return any(os.path.getmtime(f"{path_to_bench}/{file_name}") > store_mtime for file_name in file_names)
+
+
+def open_store(path_to_bench: "str") -> "ColumnarStore":
+    """memory-maps the compiled store of benchmark, (re)compiling it when query files are changed"""
+    path_to_store, path_to_packed_plans = get_path_to_store(path_to_bench), get_path_to_packed_plans(path_to_bench)
+    if is_store_outdated(path_to_bench, path_to_store):
+        save_store(compile_store(path_to_bench, path_to_packed_plans), path_to_store)
+    return load_store(path_to_store, path_to_packed_plans)
+
+
+def save_query_table(
+    path: "str",
+    fingerprint: "str",
+    version: "int",
+    query_names: "List[QueryName]",
+    columns: "Dict[str, np.ndarray]",
+) -> "bool":
+    """
+    Persists `columns` derived from the store (indexed by query id first), e.g. `effective_times`;
+    they are valid only for the data with `fingerprint` and the derivation logic of `version`.
+    It's best-effort: `False` is returned if the table can't be written (e.g. the data is read-only).
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    arrays: "Dict[str, Any]" = {"version": version, "fingerprint": fingerprint, "query_name": query_names, **columns}
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        return False
+    return True
+
+
+def load_query_table(
+    path: "str", fingerprint: "str", version: "int", query_names: "List[QueryName]"
+) -> "Optional[Dict[str, np.ndarray]]":
+    """columns saved by `save_query_table` in the order of `query_names`, or `None` if they're absent or outdated"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        if int(data["version"]) != version or str(data["fingerprint"]) != fingerprint:
+            return None
+        name_to_id: "Dict[QueryName, int]" = {str(name): idx for idx, name in enumerate(data["query_name"])}
+        if sorted(name_to_id) != sorted(query_names):
+            return None
+        order = [name_to_id[name] for name in query_names]
+        return {
+            column: np.asarray(data[column])[order]
+            for column in data.files
+            if column not in ("version", "fingerprint", "query_name")
+        }
@@ -0,0 +1,194 @@
+import os
+import itertools
+from json import load, dump
+from collections import namedtuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from hbo_bench.oracle import Oracle
+from hbo_bench.query_explorer import SearchingSettings, SearchingState, is_hardcoded, get_hardcoded_batches
+from hbo_bench.runner import QueryRunResult, run_tasks, run_benchmark_vectorized
+from hbo_bench.data_types import QueryName
+from hbo_bench.data_config import DOPS, HINTSETS
+
+# every improvement moves the search to a new state, so there can't be more iterations than states (+ last one)
+MAX_USEFUL_ITER = len(DOPS) * len(HINTSETS) + 1
+
+SweepPoint = namedtuple("SweepPoint", ["bench_name", "settings", "results"])
+
+
+def generate_settings_grid(**field_to_values: "Sequence[Any]") -> "List[SearchingSettings]":
+    """
+    Cartesian product of the given values of `SearchingSettings` fields, the rest are defaults, e.g.
+    `generate_settings_grid(max_iter=[1, float("inf")], decrease_dop=[False, True])` gives 4 settings.
+    """
+    unknown_fields = set(field_to_values) - set(SearchingSettings._fields)
+    assert not unknown_fields, f"Unknown fields {unknown_fields}"
+    fields = list(field_to_values)
+    return [
+        SearchingSettings(**dict(zip(fields, values)))
+        for values in itertools.product(*(field_to_values[field] for field in fields))
+    ]
+
+
+def canonicalize_settings(settings: "SearchingSettings") -> "SearchingSettings":
+    """
+    Maps settings to a hashable representative, which is shared by all settings leading
+    to exactly the same exploration (so it's enough to run only one of them).
+    """
+    if is_hardcoded(settings):
+        n_states = sum(len(batch) for batch in get_hardcoded_batches(settings))
+        batch_size = settings.hardcoded_batch_size
+        hintsets = [settings.default_hintset] if settings.hardcoded_hintsets is None else settings.hardcoded_hintsets
+        dops = [settings.default_dop] if settings.hardcoded_dops is None else settings.hardcoded_dops
+        return SearchingSettings(
+            relative_boost_threshold=settings.relative_boost_threshold,
+            max_iter=float("inf"),
+            default_hintset=settings.default_hintset,
+            default_dop=settings.default_dop,
+            hardcoded_hintsets=tuple(hintsets),
+            hardcoded_dops=tuple(dops),
+            hardcoded_batch_size=None if not batch_size or batch_size >= n_states else batch_size,
+            prune_hardcoded=bool(settings.prune_hardcoded),
+        )
+
+    max_iter = settings.max_iter if settings.max_iter < MAX_USEFUL_ITER else float("inf")
+    if not (settings.disable_joins or settings.disable_scans or settings.decrease_dop or settings.disable_inl):
+        max_iter = min(max_iter, 1)  # there are no neighbours except the state itself
+    return settings._replace(
+        use_joined_search=settings.use_joined_search and settings.decrease_dop,
+        max_iter=float(max_iter),
+        hardcoded_batch_size=None,
+        prune_hardcoded=False,
+    )
+
+
+def _settings_to_key(settings: "SearchingSettings") -> "str":
+    return repr(tuple(canonicalize_settings(settings)))
+
+
+def _result_to_json(result: "QueryRunResult") -> "List":
+    return [list(result.best_state)] + list(result[1:])
+
+
+def _result_from_json(data: "List") -> "QueryRunResult":
+    return QueryRunResult(SearchingState(*data[0]), *data[1:])
+
+
+class SweepCache:
+    def __init__(self, cache_dir: "str", fingerprint: "str"):
+        """
+        On-disk memo of exploration results of one benchmark, keyed by canonical settings;
+        data fingerprint is a part of the file name, so changed data never hits old results.
+        """
+        self.path = f"{cache_dir}/{fingerprint}.json"
+        self.data: "Dict[str, Dict[QueryName, List]]" = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as cache_file:
+                self.data = load(cache_file)
+
+    def get(self, key: "str", query_name: "QueryName") -> "Optional[QueryRunResult]":
+        result = self.data.get(key, {}).get(query_name)
+        return None if result is None else _result_from_json(result)
+
+    def put(self, key: "str", query_name: "QueryName", result: "QueryRunResult") -> "None":
+        self.data.setdefault(key, {})[query_name] = _result_to_json(result)
+
+    def save(self) -> "None":
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as cache_file:
+            dump(self.data, cache_file)
+        os.replace(tmp_path, self.path)
+
+
+def run_sweep(
+    oracles: "Dict[str, Oracle]",
+    settings_list: "List[SearchingSettings]",
+    cache_dir: "Optional[str]" = None,
+    workers: "int" = 1,
+    vectorized: "bool" = False,
+) -> "List[SweepPoint]":
+    """
+    Evaluates every settings on every benchmark (`bench_name -> oracle`). Identical explorations
+    are computed only once, and with `cache_dir` only points absent in the on-disk memo are computed.
+    With `vectorized=True` each settings is evaluated over the whole benchmark by `BatchQueryExplorer`.
+    """
+    sweep_points = []
+    for bench_name, oracle in oracles.items():
+        cache = SweepCache(cache_dir, oracle.get_fingerprint()) if cache_dir else None
+        query_names = oracle.get_query_names()
+        key_to_settings = {_settings_to_key(settings): settings for settings in settings_list}
+
+        key_to_results: "Dict[str, Dict[QueryName, QueryRunResult]]" = {key: {} for key in key_to_settings}
+        tasks: "List[Tuple[SearchingSettings, QueryName]]" = []
+        task_keys: "List[str]" = []
+        for key, settings in key_to_settings.items():
+            for query_name in query_names:
+                result = cache.get(key, query_name) if cache else None
+                if result is None:
+                    tasks.append((settings, query_name))
+                    task_keys.append(key)
+                else:
+                    key_to_results[key][query_name] = result
+
+        computed: "List[Tuple[str, QueryName, QueryRunResult]]" = []
+        if tasks and vectorized:
+            for key in dict.fromkeys(task_keys):
+                results = run_benchmark_vectorized(oracle, key_to_settings[key], query_names)
+                computed.extend((key, query_name, result) for query_name, result in results.items())
+        elif tasks:
+            results_list = run_tasks(oracle, tasks, workers)
+            computed.extend(
+                (key, query_name, result) for key, (_, query_name), result in zip(task_keys, tasks, results_list)
+            )
+
+        for key, query_name, result in computed:
+            key_to_results[key][query_name] = result
+            if cache:
+                cache.put(key, query_name, result)
+        if cache and computed:
+            cache.save()
+
+        for settings in settings_list:
+            results = key_to_results[_settings_to_key(settings)]
+            sweep_points.append(SweepPoint(bench_name, settings, {name: results[name] for name in query_names}))
+    return sweep_points
+
+
+def summarize(point: "SweepPoint") -> "Dict[str, float]":
+    """workload-level metrics of a sweep point"""
+    results = point.results.values()
+    def_e2e_time = sum(result.def_e2e_time for result in results)
+    best_e2e_time = sum(result.best_e2e_time for result in results)
+    return {
+        "def_e2e_time": def_e2e_time,
+        "best_e2e_time": best_e2e_time,
+        "parallel_e2e_time": sum(result.parallel_e2e_time for result in results),
+        "parallel_planning_time": sum(result.parallel_planning_time for result in results),
+        "boost": def_e2e_time / best_e2e_time,
+    }
+
+
+def score_states(oracle: "Oracle", query_to_state: "Dict[QueryName, SearchingState]") -> "Dict[str, float]":
+    """
+    Workload-level metrics (times in seconds, as in `summarize`) of the chosen states against the default
+    and the optimal ones (see `Oracle.get_optimum_index`); `mean_rank` is 0 when all chosen states are optimal.
+    """
+    assert query_to_state, "There are no states to score"
+    query_names, states = list(query_to_state), list(query_to_state.values())
+    dops, hintsets = [state.dop for state in states], [state.hintset for state in states]
+    e2e_times = oracle.get_planning_times(query_names, dops, hintsets) + oracle.get_execution_times(
+        query_names, dops, hintsets
+    )
+    e2e_time = float(e2e_times.sum()) / 1000
+    def_e2e_time = float(oracle.get_default_e2e_times(query_names).sum()) / 1000
+    optimal_e2e_time = float(oracle.get_optimal_e2e_times(query_names).sum()) / 1000
+    return {
+        "def_e2e_time": def_e2e_time,
+        "e2e_time": e2e_time,
+        "optimal_e2e_time": optimal_e2e_time,
+        "boost": def_e2e_time / e2e_time,
+        "optimal_boost": def_e2e_time / optimal_e2e_time,
+        "regret": e2e_time - optimal_e2e_time,
+        "relative_regret": e2e_time / optimal_e2e_time,
+        "mean_rank": float(oracle.get_state_ranks(query_names, dops, hintsets).mean()),
+    }
@@ -1,19 +1,51 @@
+import os
 from collections import defaultdict
-from typing import List, Tuple, TypedDict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypedDict
+import numpy as np
 import torch
 from torch import Tensor
-from hbo_bench.data_types import ExplainPlan, ExplainNode, Cardinality, Selectivity, QueryName, HintsetCode, QueryDop
+from hbo_bench.data_types import ExplainNode, Cardinality, Selectivity, QueryName, HintsetCode, QueryDop
 from hbo_bench.dataset import paddify_sequences
-from hbo_bench.oracle import Oracle, OracleRequest, TIMEOUT
-from hbo_bench.vectorization import extract_vertices_and_edges
-from hbo_bench.data_config import HINTSETS, DOPS, DEFAULT_HINTSET
+from hbo_bench.oracle import Oracle
+from hbo_bench.vectorization import extract_vertices_and_edges, FEATURES_SCHEMA_HASH, AnyPlan
+from hbo_bench.compact_plan import CompactPlan
+from hbo_bench.vectorization_cache import VectorizationCache
+from hbo_bench.plan_index import PlanIndex, PlanId, get_plan_index, PLAN_INDEX_VERSION
+from hbo_bench.runner import imap_with_oracle
+from hbo_bench.effective_times import IMPUTATION_VERSION
+from hbo_bench.data_config import HINTSETS, DOPS
 
 
 # hardcoded constant
 MAX_TREE_LENGTH = 66
 
 
-def get_logical_tree(plan: "ExplainPlan", with_rels: "bool" = True) -> "str":
+def _get_compact_tree(plan: "CompactPlan", get_node_description: "Callable[[int], str]") -> "str":
+    res = []
+    stack = [0]
+    while stack:
+        num = stack.pop()
+        if num < 0:
+            res.append("]")
+            continue
+        res.append(get_node_description(num))
+        res.append("[")
+        stack.append(-1)
+        stack.extend(reversed(plan.get_children(num).tolist()))
+    return " ".join(res)
+
+
+def get_logical_tree(plan: "AnyPlan", with_rels: "bool" = True) -> "str":
+    if isinstance(plan, CompactPlan):
+        node_types, rel_names, index_names = (
+            plan.decode(plan.node_types),
+            plan.decode(plan.relation_names),
+            plan.decode(plan.index_names),
+        )
+        if with_rels:
+            return _get_compact_tree(plan, lambda i: f"{node_types[i]} (Rel={rel_names[i]}|Index={index_names[i]})")
+        return _get_compact_tree(plan, lambda i: f"{node_types[i]}")
+
     res = []
 
     def recurse(node: "ExplainNode") -> "None":
@@ -30,7 +62,20 @@ def get_logical_tree(plan: "ExplainPlan", with_rels: "bool" = True) -> "str":
     return " ".join(res)
 
 
-def get_full_plan(plan: "ExplainPlan", with_rels: "bool" = True) -> "str":
+def get_full_plan(plan: "AnyPlan", with_rels: "bool" = True) -> "str":
+    if isinstance(plan, CompactPlan):
+        node_types, rel_names, index_names = (
+            plan.decode(plan.node_types),
+            plan.decode(plan.relation_names),
+            plan.decode(plan.index_names),
+        )
+        cards = plan.estimated_cardinalities.tolist()
+        if with_rels:
+            return _get_compact_tree(
+                plan, lambda i: f"{node_types[i]} (Rel={rel_names[i]}|Index={index_names[i]}|Cards={cards[i]})"
+            )
+        return _get_compact_tree(plan, lambda i: f"{node_types[i]} (Cards={cards[i]})")
+
     res = []
 
     def recurse(node: "ExplainNode") -> "None":
@@ -49,7 +94,21 @@ def get_full_plan(plan: "ExplainPlan", with_rels: "bool" = True) -> "str":
     return " ".join(res)
 
 
-def get_selectivities(plan: "ExplainPlan") -> "List[Selectivity]":
+def get_selectivities(plan: "AnyPlan") -> "List[Selectivity]":
+    if isinstance(plan, CompactPlan):
+        cards, children, offsets = (
+            plan.estimated_cardinalities.tolist(),
+            plan.children.tolist(),
+            plan.children_offsets.tolist(),
+        )
+        selectivities = []
+        for num, current_size in enumerate(cards):
+            max_possible_size = 1
+            for child in children[offsets[num] : offsets[num + 1]]:
+                max_possible_size *= cards[child]
+            selectivities.append(current_size / max_possible_size)
+        return selectivities
+
     res = []
 
     def recurse(node: "ExplainNode") -> "None":
@@ -66,7 +125,10 @@ def get_selectivities(plan: "ExplainPlan") -> "List[Selectivity]":
     return res
 
 
-def get_cardinalities(plan: "ExplainPlan") -> "List[Cardinality]":
+def get_cardinalities(plan: "AnyPlan") -> "List[Cardinality]":
+    if isinstance(plan, CompactPlan):
+        return plan.estimated_cardinalities.tolist()
+
     res = []
 
     def recurse(node: "ExplainNode") -> "None":
@@ -82,6 +144,7 @@ class QueryInfo(TypedDict):
     query_name: "QueryName"
     hintset: "HintsetCode"
     dop: "QueryDop"
+    plan_id: "PlanId"
     vertices: "Tensor"
     edges: "Tensor"
     time: "Tensor"
@@ -95,62 +158,159 @@ def preprocess(v: "Tensor", e: "Tensor") -> "Tuple[Tensor, Tensor]":
     return v, e
 
 
-def extract_list_info(oracle: "Oracle", query_names: "List[QueryName]") -> "List[QueryInfo]":
-    """initial plan processing and T/O handling with search for maximum lower bound of execution time"""
+def extract_query_info(
+    oracle: "Oracle",
+    query_name: "QueryName",
+    vectorization_cache: "Optional[VectorizationCache]" = None,
+    plan_index: "Optional[PlanIndex]" = None,
+    plan_id_to_vectors: "Optional[Dict[PlanId, Tuple[Tensor, Tensor]]]" = None,
+) -> "List[QueryInfo]":
+    """
+    initial plan processing, T/O are replaced with lower bounds of execution time (see `get_effective_execution_times`);
+    with `vectorization_cache` identical plans are vectorized once (new vectors aren't saved to it here);
+    `plan_index` is the index of the whole benchmark by default (see `get_plan_index`), and vectors of its plans
+    are put to `plan_id_to_vectors`, so passing the same dict for many queries shares vectors across them
+    """
+    vectorize = (
+        vectorization_cache.get_vertices_and_edges if vectorization_cache is not None else extract_vertices_and_edges
+    )
+    plan_index = get_plan_index(oracle) if plan_index is None else plan_index
+    plan_id_to_vectors = {} if plan_id_to_vectors is None else plan_id_to_vectors
+    # every unique plan is parsed and vectorized only once,
+    # so all settings with the same plan share the same `vertices` and `edges` tensors
+    query_plan_ids = plan_index.get_query_plan_ids(query_name).tolist()
+    for plan_id in sorted({plan_id for dop_plan_ids in query_plan_ids for plan_id in dop_plan_ids}):
+        if plan_id not in plan_id_to_vectors:
+            representative = plan_index.get_representative(plan_id)
+            plan_id_to_vectors[plan_id] = vectorize(oracle.get_explain_plan(representative))
+
+    query_times = oracle.get_effective_execution_times(query_names=[query_name])[0].tolist()
+    query_is_timeout = oracle.get_timeout_mask(query_names=[query_name])[0].tolist()
+    query_logical_plan_ids = oracle.get_logical_plan_ids(query_names=[query_name])[0].tolist()
+
+    # executed settings go first, then timeouted ones grouped by logical plan
+    settings = [(dop_idx, hintset) for dop_idx in range(len(DOPS)) for hintset in HINTSETS]
+    timeouted_logical_plan_to_settings: "Dict[int, List[Tuple[int, HintsetCode]]]" = defaultdict(list)
+    for dop_idx, hintset in settings:
+        if query_is_timeout[dop_idx][hintset]:
+            timeouted_logical_plan_to_settings[query_logical_plan_ids[dop_idx][hintset]].append((dop_idx, hintset))
+    ordered_settings = [(dop_idx, hs) for dop_idx, hs in settings if not query_is_timeout[dop_idx][hs]]
+    for timeouted_settings in timeouted_logical_plan_to_settings.values():
+        ordered_settings.extend(timeouted_settings)
+
     list_info = []
+    for dop_idx, hintset in ordered_settings:
+        plan_id = query_plan_ids[dop_idx][hintset]
+        vertices, edges = plan_id_to_vectors[plan_id]
+        info: "QueryInfo" = {
+            "query_name": query_name,
+            "hintset": hintset,
+            "dop": DOPS[dop_idx],
+            "plan_id": plan_id,
+            "time": torch.tensor(query_times[dop_idx][hintset] / 1000, dtype=torch.float32),
+            "vertices": vertices,
+            "edges": edges,
+        }
+        list_info.append(info)
+    return list_info
+
+
+# read-only vectorization cache of a worker process, it's opened by the first task and reused by the next ones
+_WORKER_CACHE: "Optional[VectorizationCache]" = None
+
+
+def _extract_query_info(
+    oracle: "Oracle", task: "Tuple[QueryName, Optional[str]]"
+) -> "Tuple[List[QueryInfo], Dict[bytes, np.ndarray]]":
+    """records of query and vectors that were added to the worker cache for it (only the parent saves them)"""
+    global _WORKER_CACHE  # pylint: disable=global-statement
+    query_name, path_to_processed = task
+    if path_to_processed is None:
+        return extract_query_info(oracle, query_name), {}
+    if _WORKER_CACHE is None or _WORKER_CACHE.path_to_processed != path_to_processed:
+        _WORKER_CACHE = VectorizationCache(path_to_processed, read_only=True)
+    known_fingerprints = set(_WORKER_CACHE.new_records)
+    query_list_info = extract_query_info(oracle, query_name, _WORKER_CACHE)
+    new_records = {fp: rec for fp, rec in _WORKER_CACHE.new_records.items() if fp not in known_fingerprints}
+    return query_list_info, new_records
+
+
+def _merge_new_records(
+    results: "Iterator[Tuple[List[QueryInfo], Dict[bytes, np.ndarray]]]",
+    vectorization_cache: "Optional[VectorizationCache]",
+) -> "Iterator[List[QueryInfo]]":
+    for query_list_info, new_records in results:
+        if vectorization_cache is not None:
+            vectorization_cache.add_records(new_records)
+        yield query_list_info
+
+
+def _get_path_to_checkpoint(oracle: "Oracle", checkpoint_dir: "str", query_name: "QueryName") -> "str":
+    # records depend on the data, the features, imputed times and plan ids
+    versions = f"{FEATURES_SCHEMA_HASH}.{IMPUTATION_VERSION}.{PLAN_INDEX_VERSION}"
+    return f"{checkpoint_dir}/{oracle.get_fingerprint()}.{versions}/{query_name}.pt"
+
+
+def _save_checkpoint(query_list_info: "List[QueryInfo]", path: "str") -> "None":
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save(query_list_info, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def iterate_list_info(
+    oracle: "Oracle",
+    query_names: "List[QueryName]",
+    vectorization_cache: "Optional[VectorizationCache]" = None,
+    workers: "int" = 1,
+    checkpoint_dir: "Optional[str]" = None,
+) -> "Iterator[QueryInfo]":
+    """
+    Streaming version of `extract_list_info`: records are yielded query by query (in the order of `query_names`)
+    as soon as they are ready, queries are processed by a pool of `workers` processes (see `imap_with_oracle`).
+    With `checkpoint_dir` records of every finished query are saved there and taken from it on the next runs.
+    Workers open `vectorization_cache` read-only and send back only new vectors, which are saved here at the end.
+    """
+    path_to_checkpoint: "Dict[QueryName, str]" = {}
+    if checkpoint_dir is not None:
+        path_to_checkpoint = {name: _get_path_to_checkpoint(oracle, checkpoint_dir, name) for name in query_names}
+    is_done = {name: name in path_to_checkpoint and os.path.exists(path_to_checkpoint[name]) for name in query_names}
+
+    query_names_to_process = [name for name in query_names if not is_done[name]]
+    if query_names_to_process:
+        # tables are built (or loaded) once here instead of in every worker
+        oracle.get_effective_execution_times()
+    plan_index = get_plan_index(oracle) if query_names_to_process else None
+    results: "Iterator[List[QueryInfo]]"
+    if workers <= 1:
+        plan_id_to_vectors: "Dict[PlanId, Tuple[Tensor, Tensor]]" = {}
+        results = (
+            extract_query_info(oracle, name, vectorization_cache, plan_index, plan_id_to_vectors)
+            for name in query_names_to_process
+        )
+    else:
+        path_to_processed = None if vectorization_cache is None else vectorization_cache.path_to_processed
+        tasks = [(name, path_to_processed) for name in query_names_to_process]
+        results = _merge_new_records(imap_with_oracle(oracle, _extract_query_info, tasks, workers), vectorization_cache)
 
     for query_name in query_names:
-        seen_logical_plans = set()
-        timeouted_logical_plans_to_dops = defaultdict(set)
-        timeouted_logical_plans_to_settings = defaultdict(list)
-        logical_plan_to_times = defaultdict(list)
-
-        for dop in DOPS:
-            for hintset in HINTSETS:
-                custom_request = OracleRequest(query_name=query_name, hintset=hintset, dop=dop)
-                custom_logical_plan = get_logical_tree(oracle.get_explain_plan(custom_request))
-                custom_time = oracle.get_execution_time(custom_request)
-                if custom_time != TIMEOUT:
-                    time = torch.tensor(custom_time / 1000, dtype=torch.float32)
-                    vertices, edges = extract_vertices_and_edges(oracle.get_explain_plan(request=custom_request))
-                    seen_logical_plans.add(custom_logical_plan)
-                    info: "QueryInfo" = {
-                        "query_name": query_name,
-                        "hintset": hintset,
-                        "dop": dop,
-                        "time": time,
-                        "vertices": vertices,
-                        "edges": edges,
-                    }
-                    list_info.append(info)
-                    logical_plan_to_times[custom_logical_plan].append(time)
-                else:
-                    timeouted_logical_plans_to_dops[custom_logical_plan].add(dop)
-                    timeouted_logical_plans_to_settings[custom_logical_plan].append((dop, hintset))
-
-        for custom_logical_plan in timeouted_logical_plans_to_settings:
-            if custom_logical_plan in logical_plan_to_times:
-                time = torch.mean(torch.stack(logical_plan_to_times[custom_logical_plan]))
-            else:
-                max_def_time = 0.0
-                for dop in timeouted_logical_plans_to_dops[custom_logical_plan]:
-                    def_request = OracleRequest(query_name=query_name, hintset=DEFAULT_HINTSET, dop=dop)
-                    def_time = oracle.get_execution_time(request=def_request)
-                    max_def_time = max(max_def_time, def_time)
-                time = torch.tensor(2 * max_def_time / 1000, dtype=torch.float32)
-
-            for dop, hintset in timeouted_logical_plans_to_settings[custom_logical_plan]:
-                custom_request = OracleRequest(query_name=query_name, hintset=hintset, dop=dop)
-                vertices, edges = extract_vertices_and_edges(oracle.get_explain_plan(request=custom_request))
-                timeouted_info: "QueryInfo" = {
-                    "query_name": query_name,
-                    "hintset": hintset,
-                    "dop": dop,
-                    "time": time,
-                    "vertices": vertices,
-                    "edges": edges,
-                }
-
-                list_info.append(timeouted_info)
+        if is_done[query_name]:
+            query_list_info = torch.load(path_to_checkpoint[query_name], weights_only=True)
+        else:
+            query_list_info = next(results)  # pylint: disable=stop-iteration-return
+            if query_name in path_to_checkpoint:
+                _save_checkpoint(query_list_info, path_to_checkpoint[query_name])
+        yield from query_list_info
 
-    return list_info
+    if vectorization_cache is not None:
+        vectorization_cache.save()
+
+
+def extract_list_info(
+    oracle: "Oracle", query_names: "List[QueryName]", vectorization_cache: "Optional[VectorizationCache]" = None
+) -> "List[QueryInfo]":
+    """
+    initial plan processing and T/O handling for all queries, see `extract_query_info`;
+    with `vectorization_cache` identical plans are vectorized once (and new vectors are saved to it)
+    """
+    return list(iterate_list_info(oracle, query_names, vectorization_cache))
@@ -1,8 +1,12 @@
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Sequence, Union
 import math
+from itertools import groupby
+import hashlib
+import numpy as np
 import torch
 from torch import Tensor
 from hbo_bench.data_types import ExplainNode, ExplainPlan
+from hbo_bench.compact_plan import CompactPlan
 
 
 # works only for `JOB` and `sample_queries``
@@ -36,6 +40,17 @@ ALL_OPERATIONS = [
 
 ALL_FEATURES = ALL_OPERATIONS + ["Cardinality", "Selectivity"]
 
+OPERATION_TO_INDEX: "Dict[str, int]" = {op: i for i, op in enumerate(ALL_OPERATIONS)}
+CARDINALITY_INDEX = ALL_FEATURES.index("Cardinality")
+SELECTIVITY_INDEX = ALL_FEATURES.index("Selectivity")
+MAX_N_CHILDREN = 2
+
+# must be changed along with the computation of features, as well as `ALL_FEATURES` it invalidates vectorized plans
+VECTORIZATION_VERSION = 1
+FEATURES_SCHEMA_HASH = hashlib.sha1(repr((VECTORIZATION_VERSION, ALL_FEATURES)).encode()).hexdigest()[:16]
+
+AnyPlan = Union[ExplainPlan, CompactPlan]
+
 
 def node_to_features(node: "ExplainNode") -> "Dict[str, float]":
     features = {}
@@ -66,7 +81,139 @@ def node_to_feature_tensor(node: "ExplainNode") -> "Tensor":
     return features_to_tensor(features=node_to_features(node=node))
 
 
-def extract_vertices_and_edges(plan: "ExplainPlan") -> "Tuple[Tensor, Tensor]":
+def get_plan_fingerprint(plan: "AnyPlan") -> "str":
+    """stable hash of everything vectorization depends on: tree structure, node types and cardinalities"""
+    tokens: "List[str]" = []
+    if isinstance(plan, CompactPlan):
+        node_types, n_children = plan.decode(plan.node_types), plan.get_n_children().tolist()
+        for node_type, cardinality, n in zip(node_types, plan.estimated_cardinalities.tolist(), n_children):
+            tokens.append(f"{node_type}|{cardinality!r}|{n}")
+        return hashlib.sha1(";".join(tokens).encode()).hexdigest()
+    stack = [plan.plan]
+    while stack:
+        node = stack.pop()
+        tokens.append(f"{node.node_type}|{node.estimated_cardinality!r}|{len(node.plans)}")
+        stack.extend(reversed(node.plans))
+    return hashlib.sha1(";".join(tokens).encode()).hexdigest()
+
+
+def _get_compact_plans_columns(
+    plans: "List[CompactPlan]", first_num: "int"
+) -> "Tuple[List[int], List[float], List[float], List[int], List[int]]":
+    """
+    columns of `extract_packed_vertices_and_edges` for the plans, whose nodes are numbered (consecutively)
+    from `first_num`; all plans are processed at once, so there is no per-node or per-plan python work
+    """
+    n_edges = MAX_N_CHILDREN + 1
+    n_nodes = np.array([len(plan) for plan in plans], dtype=np.int64)
+    n_strings = np.array([len(plan.strings) for plan in plans], dtype=np.int64)
+    n_plan_children = n_nodes - 1
+    node_starts = np.cumsum(n_nodes) - n_nodes
+    string_starts = np.cumsum(n_strings) - n_strings
+    children_starts = np.cumsum(n_plan_children) - n_plan_children
+
+    strings = [string for plan in plans for string in plan.strings]
+    op_table = np.array([OPERATION_TO_INDEX.get(string, -1) for string in strings], dtype=np.int64)
+    node_types = np.concatenate([plan.node_types for plan in plans]) + np.repeat(string_starts, n_nodes)
+    op_ids = op_table[node_types]
+    assert (op_ids >= 0).all(), f"Unknown node type - {strings[node_types[op_ids < 0][0]]}"
+    children_offsets = np.concatenate([plan.children_offsets[:-1] for plan in plans]) + np.repeat(
+        children_starts, n_nodes
+    )
+    children = np.concatenate([plan.children for plan in plans]) + np.repeat(node_starts, n_plan_children)
+    parents = np.concatenate([plan.parents for plan in plans]) + np.repeat(node_starts, n_nodes)
+    n_children = np.concatenate([plan.get_n_children() for plan in plans])
+    assert n_children.max() <= MAX_N_CHILDREN, f"Too many children - {n_children.max()}"
+
+    # the same float operations in the same order as for `ExplainPlan`, so features are bit-identical
+    estimated_cardinalities = np.concatenate([plan.estimated_cardinalities for plan in plans])
+    cardinalities = estimated_cardinalities.astype(np.float64)
+    max_possible_sizes = np.ones(len(cardinalities), dtype=np.float64)
+    for child_idx in range(MAX_N_CHILDREN):
+        has_child = n_children > child_idx
+        max_possible_sizes[has_child] *= cardinalities[children[children_offsets[has_child] + child_idx]]
+    selectivities = np.where(n_children > 0, cardinalities / max_possible_sizes, 1.0)
+
+    child_parents = parents[children]
+    child_ids = np.arange(len(children)) - children_offsets[child_parents]
+    return (
+        op_ids.tolist(),
+        [math.log(cardinality) for cardinality in estimated_cardinalities.tolist()],
+        selectivities.tolist(),
+        ((first_num + child_parents) * n_edges + 1 + child_ids).tolist(),
+        (first_num + children + 1).tolist(),
+    )
+
+
+def extract_packed_vertices_and_edges(plans: "Sequence[AnyPlan]") -> "Tuple[Tensor, Tensor, Tensor]":
+    """
+    Vectorizes all plans at once. Returns concatenated vertex embeddings of all plans,
+    their concatenated edges (numbered globally, i.e. node `k` of plan `i` has number
+    `offsets[i] + k + 1`, and `0` is still a dummy edge) and 1-d tensor of `offsets`,
+    where nodes of plan `i` are `offsets[i]:offsets[i + 1]`; see `extract_vertices_and_edges`
+    """
+    padding_shift = 1
+    n_edges = MAX_N_CHILDREN + 1
+
+    # iterative pre-order traversal, nodes are numbered in the order of visiting; features are
+    # computed in python floats and rounded only once, exactly as `node_to_features` does
+    op_ids: "List[int]" = []
+    cardinalities: "List[float]" = []
+    selectivities: "List[float]" = []
+    child_slots: "List[int]" = []  # positions in flattened `edges`
+    child_nums: "List[int]" = []
+    offsets: "List[int]" = [0]
+    for is_compact, run in groupby(plans, key=lambda plan: isinstance(plan, CompactPlan)):
+        if is_compact:
+            compact_plans = [plan for plan in run if isinstance(plan, CompactPlan)]
+            first_num = len(op_ids)
+            plan_op_ids, plan_cardinalities, plan_selectivities, plan_child_slots, plan_child_nums = (
+                _get_compact_plans_columns(compact_plans, first_num)
+            )
+            op_ids.extend(plan_op_ids)
+            cardinalities.extend(plan_cardinalities)
+            selectivities.extend(plan_selectivities)
+            child_slots.extend(plan_child_slots)
+            child_nums.extend(plan_child_nums)
+            offsets.extend((first_num + np.cumsum([len(plan) for plan in compact_plans])).tolist())
+            continue
+        for plan in run:
+            assert isinstance(plan, ExplainPlan)
+            stack: "List[Tuple[ExplainNode, int]]" = [(plan.plan, -1)]
+            while stack:
+                node, slot = stack.pop()
+                num, children, cardinality = len(op_ids), node.plans, node.estimated_cardinality
+                assert node.node_type in OPERATION_TO_INDEX, f"Unknown node type - {node.node_type}"
+                assert len(children) <= MAX_N_CHILDREN, f"Too many children - {len(children)}"
+                op_ids.append(OPERATION_TO_INDEX[node.node_type])
+                cardinalities.append(math.log(cardinality))
+                if slot >= 0:
+                    child_slots.append(slot)
+                    child_nums.append(num + padding_shift)
+                if not children:
+                    selectivities.append(1.0)
+                    continue
+                max_possible_size = 1.0
+                for child in children:
+                    max_possible_size *= child.estimated_cardinality
+                selectivities.append(cardinality / max_possible_size)
+                for child_idx in range(len(children) - 1, -1, -1):
+                    stack.append((children[child_idx], num * n_edges + 1 + child_idx))
+            offsets.append(len(op_ids))
+
+    n_nodes = len(op_ids)
+    vertices = np.zeros((n_nodes, len(ALL_FEATURES)), dtype=np.float32)
+    vertices[np.arange(n_nodes), op_ids] = 1.0
+    vertices[:, CARDINALITY_INDEX] = cardinalities
+    vertices[:, SELECTIVITY_INDEX] = selectivities
+    edges = np.zeros((n_nodes, n_edges), dtype=np.int64)  # zeros are edges to padding node
+    edges[:, 0] = np.arange(padding_shift, n_nodes + padding_shift)
+    edges.reshape(-1)[child_slots] = child_nums
+
+    return torch.from_numpy(vertices), torch.from_numpy(edges), torch.tensor(offsets, dtype=torch.long)
+
+
+def extract_vertices_and_edges(plan: "AnyPlan") -> "Tuple[Tensor, Tensor]":
     """
     Traverses plan and extracts a) embeddings of its nodes and b) its edges.
     Returns 2-d tensor of flattened vertex embeddings and 2-d tensor of edges,
@@ -75,25 +222,5 @@ def extract_vertices_and_edges(plan: "ExplainPlan") -> "Tuple[Tensor, Tensor]":
     P.S. all vertices have exactly 3 edges (if there are less in the plan, we
     use a dummy edge at index 0, where there will be a padding node in the future)
     """
-    padding_num = 0
-    padding_shift = 1
-    vertices: "List[Tensor]" = []
-    edges: "List[List[int]]" = []
-
-    def recurse(node: "ExplainNode") -> "None":
-        cur_num = len(vertices)
-        vertex = node_to_feature_tensor(node)
-        vertices.append(vertex)
-        edges.append([cur_num + padding_shift])
-
-        for child in node.plans:
-            child_num = len(vertices)
-            edges[cur_num].append(child_num + padding_shift)
-            recurse(node=child)
-
-        n_missing_children = 2 - len(node.plans)
-        for _ in range(n_missing_children):
-            edges[cur_num].append(padding_num)
-
-    recurse(node=plan.plan)
-    return torch.stack(vertices), torch.tensor(edges, dtype=torch.long)
+    vertices, edges, _ = extract_packed_vertices_and_edges([plan])
+    return vertices, edges
@@ -0,0 +1,110 @@
+import os
+from typing import Dict, List, Tuple
+import numpy as np
+import torch
+from torch import Tensor
+from hbo_bench.data_types import ExplainPlan
+from hbo_bench.vectorization import (
+    ALL_FEATURES,
+    FEATURES_SCHEMA_HASH,
+    MAX_N_CHILDREN,
+    get_plan_fingerprint,
+    extract_vertices_and_edges,
+)
+
+FINGERPRINT_LENGTH = 40
+VECTORIZATION_CACHE_PREFIX = "vectorized_plans"
+# one record per node, nodes of every plan are stored contiguously starting from `position == 0`
+NODE_DTYPE = np.dtype(
+    [
+        ("fingerprint", f"S{FINGERPRINT_LENGTH}"),
+        ("position", np.int32),
+        ("vertex", np.float32, (len(ALL_FEATURES),)),
+        ("edges", np.int64, (MAX_N_CHILDREN + 1,)),
+    ]
+)
+
+
+def get_path_to_vectorization_cache(path_to_processed: "str") -> "str":
+    """the name depends on the feature schema, so changed features never hit old vectors"""
+    return f"{os.path.normpath(path_to_processed)}/{VECTORIZATION_CACHE_PREFIX}.{FEATURES_SCHEMA_HASH}.npy"
+
+
+def _load_records(path: "str") -> "np.ndarray":
+    if os.path.exists(path):
+        records = np.load(path, mmap_mode="r")
+        if records.dtype == NODE_DTYPE:
+            return records
+    return np.zeros(0, dtype=NODE_DTYPE)
+
+
+def _build_index(records: "np.ndarray") -> "Dict[bytes, Tuple[int, int]]":
+    starts = np.flatnonzero(records["position"] == 0)
+    ends = np.append(starts[1:], len(records))
+    fingerprints = records["fingerprint"][starts].tolist()
+    return dict(zip(fingerprints, zip(starts.tolist(), ends.tolist())))
+
+
+def _to_records(fingerprint: "bytes", vertices: "Tensor", edges: "Tensor") -> "np.ndarray":
+    records = np.zeros(len(vertices), dtype=NODE_DTYPE)
+    records["fingerprint"] = fingerprint
+    records["position"] = np.arange(len(vertices))
+    records["vertex"] = vertices.numpy()
+    records["edges"] = edges.numpy()
+    return records
+
+
+class VectorizationCache:
+    def __init__(self, path_to_processed: "str", read_only: "bool" = False):
+        """
+        Vectorized plans (see `extract_vertices_and_edges`) keyed by `get_plan_fingerprint`, so identical
+        physical plans are vectorized only once. Stored vectors are memory-mapped from a single file next to
+        processed benchmarks; new ones are kept in memory until `save`, which merges them with the file.
+        A `read_only` cache (e.g. in worker processes) never saves, its new vectors are merged by `add_records`.
+        """
+        self.path_to_processed = path_to_processed
+        self.read_only = read_only
+        self.path = get_path_to_vectorization_cache(path_to_processed)
+        self.records = _load_records(self.path)
+        self.index = _build_index(self.records)
+        self.new_records: "Dict[bytes, np.ndarray]" = {}
+
+    def __len__(self) -> "int":
+        return len(self.index) + len(self.new_records)
+
+    def get_vertices_and_edges(self, plan: "ExplainPlan") -> "Tuple[Tensor, Tensor]":
+        fingerprint = get_plan_fingerprint(plan).encode()
+        if fingerprint in self.index:
+            start, end = self.index[fingerprint]
+            records = self.records[start:end]
+        elif fingerprint in self.new_records:
+            records = self.new_records[fingerprint]
+        else:
+            vertices, edges = extract_vertices_and_edges(plan)
+            self.new_records[fingerprint] = _to_records(fingerprint, vertices, edges)
+            return vertices, edges
+        return torch.from_numpy(np.array(records["vertex"])), torch.from_numpy(np.array(records["edges"]))
+
+    def add_records(self, new_records: "Dict[bytes, np.ndarray]") -> "None":
+        """adds vectors computed elsewhere (see `new_records`), they're written to the file by `save`"""
+        for fingerprint, records in new_records.items():
+            if fingerprint not in self.index:
+                self.new_records.setdefault(fingerprint, records)
+
+    def save(self) -> "None":
+        """adds new vectors to the file, keeping the ones saved there by other processes in the meantime"""
+        assert not self.read_only, "Read-only cache can't be saved"
+        if not self.new_records:
+            return
+        records = _load_records(self.path)
+        index = _build_index(records)
+        new_records: "List[np.ndarray]" = [rec for fp, rec in self.new_records.items() if fp not in index]
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(tmp_path, "wb") as cache_file:
+            np.save(cache_file, np.concatenate([records] + new_records))
+        os.replace(tmp_path, self.path)
+
+        self.records = _load_records(self.path)
+        self.index = _build_index(self.records)
+        self.new_records = {}
@@ -0,0 +1,26 @@
+import numpy as np
+from hbo_bench.oracle import Oracle
+from hbo_bench.query_explorer import QueryExplorer, SearchingSettings, STATE_TO_CODE
+from hbo_bench.batch_explorer import BatchQueryExplorer
+from hbo_bench import local_search_settings
+
+
+def test_identical_to_query_explorer(tpch_oracle: "Oracle"):
+    presets = [getattr(local_search_settings, name) for name in dir(local_search_settings) if name.endswith("_SS")]
+    presets.append(SearchingSettings(disable_scans=True, decrease_dop=True, relative_boost_threshold=1.2, max_iter=2))
+    presets.append(local_search_settings.ALL_SS._replace(hardcoded_batch_size=10, prune_hardcoded=True))
+    presets.append(
+        SearchingSettings(hardcoded_hintsets=[0, 3, 5], hardcoded_batch_size=2, relative_boost_threshold=1.5)
+    )
+    for ss in presets:
+        batch_explorer = BatchQueryExplorer(tpch_oracle, ss)
+        best_states = batch_explorer.run()
+        for query_id, query_name in enumerate(batch_explorer.query_names):
+            explorer = QueryExplorer(tpch_oracle, query_name, ss)
+            assert best_states[query_id] == explorer.run()
+            assert batch_explorer.parallel_planning_times[query_id] == explorer.parallel_planning_time
+            assert batch_explorer.parallel_e2e_times[query_id] == explorer.parallel_e2e_time
+            tried_codes = np.nonzero(batch_explorer.tried_mask[query_id])[0].tolist()
+            assert tried_codes == sorted(STATE_TO_CODE[st] for st in explorer.tried_states)
+            explored_codes = np.nonzero(batch_explorer.explored_mask[query_id])[0].tolist()
+            assert explored_codes == sorted(STATE_TO_CODE[st] for st in explorer.explored_states)
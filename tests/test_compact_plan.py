@@ -0,0 +1,42 @@
+import torch
+from hbo_bench.oracle import Oracle, OracleKey
+from hbo_bench.compact_plan import CompactPlan
+from hbo_bench.vectorization import extract_packed_vertices_and_edges, get_plan_fingerprint
+from hbo_bench.utils import get_logical_tree, get_full_plan, get_selectivities, get_cardinalities
+from hbo_bench.data_config import DOPS, HINTSETS
+
+
+def test_compact_plan_conversion(tpch_oracle: "Oracle"):
+    for hintset in HINTSETS:
+        request = OracleKey("q11", DOPS[-1], hintset)
+        plan = tpch_oracle.get_explain_plan(request)
+        compact_plan = CompactPlan.from_plan(plan)
+        assert compact_plan.to_explain_plan() == plan
+        assert len(compact_plan) == len(get_cardinalities(plan))
+        assert compact_plan.parents[0] == -1
+        for num in range(1, len(compact_plan)):
+            assert num in compact_plan.get_children(int(compact_plan.parents[num])).tolist()
+
+        analyze_plan = tpch_oracle.get_explain_analyze_plan(request)
+        if analyze_plan is not None:
+            assert CompactPlan.from_plan(analyze_plan).to_explain_analyze_plan() == analyze_plan
+
+
+def test_compact_plan_consumers(tpch_oracle: "Oracle"):
+    plans = [tpch_oracle.get_explain_plan(OracleKey("q17", dop, hintset)) for dop in DOPS for hintset in HINTSETS]
+    compact_plans = [CompactPlan.from_plan(plan) for plan in plans]
+    for plan, compact_plan in zip(plans, compact_plans):
+        assert get_plan_fingerprint(plan) == get_plan_fingerprint(compact_plan)
+        assert get_cardinalities(plan) == get_cardinalities(compact_plan)
+        assert get_selectivities(plan) == get_selectivities(compact_plan)
+        for with_rels in [True, False]:
+            assert get_logical_tree(plan, with_rels) == get_logical_tree(compact_plan, with_rels)
+            assert get_full_plan(plan, with_rels) == get_full_plan(compact_plan, with_rels)
+
+    expected = extract_packed_vertices_and_edges(plans)
+    mixed_plans = [
+        compact_plan if idx % 3 else plan for idx, (plan, compact_plan) in enumerate(zip(plans, compact_plans))
+    ]
+    for packed in [extract_packed_vertices_and_edges(compact_plans), extract_packed_vertices_and_edges(mixed_plans)]:
+        for tensor, expected_tensor in zip(packed, expected):
+            assert torch.equal(tensor, expected_tensor)
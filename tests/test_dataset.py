@@ -1,9 +1,16 @@
 from hbo_bench.oracle import Oracle, OracleRequest
-from hbo_bench.vectorization import extract_vertices_and_edges
-from hbo_bench.dataset import WeightedBinaryTreeDataset, weighted_binary_tree_collate
+from hbo_bench.vectorization import extract_vertices_and_edges, extract_packed_vertices_and_edges
+from hbo_bench.dataset import (
+    WeightedBinaryTreeDataset,
+    PackedTrees,
+    CollatedTreeDataset,
+    LengthBucketBatchSampler,
+    weighted_binary_tree_collate,
+)
 from hbo_bench.utils import preprocess, MAX_TREE_LENGTH
+import bisect
 import torch
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, BatchSampler, SequentialSampler
 
 
 def test_dataset(tpch_oracle: "Oracle"):
@@ -27,3 +34,118 @@ def test_dataset(tpch_oracle: "Oracle"):
         assert torch.all(e[0] - edges == 0)
         assert torch.all(t[0] - time == 0)
         assert torch.all(f[0] - torch.Tensor([freq]) == 0)
+
+
+def test_packed_dataset(tpch_oracle: "Oracle"):
+    plans, list_time = [], []
+    for query_name in tpch_oracle.get_query_names():
+        for hintset in [0, 1, 2, 42]:
+            plans.append(tpch_oracle.get_explain_plan(OracleRequest(query_name=query_name, hintset=hintset, dop=16)))
+            list_time.append(torch.tensor(float(hintset)))
+    plans, list_time = plans + plans[::3], list_time + list_time[::3]
+    list_vertices, list_edges = zip(*[extract_vertices_and_edges(plan) for plan in plans])
+    trees = PackedTrees(*extract_packed_vertices_and_edges(plans))
+    device = torch.device("cpu")
+    dataset = WeightedBinaryTreeDataset(list(list_vertices), list(list_edges), list_time, device)
+    packed_dataset = WeightedBinaryTreeDataset(trees, [], list_time, device)
+    assert len(trees) == len(plans) and len(dataset) == len(packed_dataset) < len(plans)
+
+    def collate(batch):
+        return weighted_binary_tree_collate(batch, MAX_TREE_LENGTH)
+
+    dataloader = DataLoader(dataset=dataset, batch_size=5, shuffle=False, collate_fn=collate)
+    packed_dataloader = DataLoader(
+        dataset=packed_dataset,
+        sampler=BatchSampler(SequentialSampler(packed_dataset), batch_size=5, drop_last=False),
+        batch_size=None,
+        collate_fn=collate,
+    )
+    for ((v, e, f), t), ((packed_v, packed_e, packed_f), packed_t) in zip(dataloader, packed_dataloader):
+        assert torch.equal(v, packed_v) and torch.equal(e, packed_e)
+        assert torch.equal(f, packed_f) and torch.equal(t, packed_t)
+
+
+def test_dataset_aggregation(tpch_oracle: "Oracle"):
+    plans = [tpch_oracle.get_explain_plan(OracleRequest(query_name=name, hintset=0, dop=1)) for name in ["q01", "q11"]]
+    (vertices, edges), (other_vertices, other_edges) = [extract_vertices_and_edges(plan) for plan in plans]
+    list_vertices = [vertices, other_vertices, vertices, vertices]
+    list_edges = [edges, other_edges, edges, edges]
+    list_time = [torch.tensor(1.0), torch.tensor(5.0), torch.tensor(2.0), torch.tensor(6.0)]
+    dataset = WeightedBinaryTreeDataset(list_vertices, list_edges, list_time, torch.device("cpu"))
+    assert len(dataset) == 2
+    assert torch.equal(dataset.frequencies, torch.tensor([3, 1])) and torch.equal(
+        dataset.times, torch.tensor([3.0, 5.0])
+    )
+    assert torch.equal(dataset.trees[0][0], vertices) and torch.equal(dataset.trees[1][1], other_edges)
+
+    # different ids of equal trees still give one unique tree
+    tree_ids = [7, 3, 7, 5]
+    dataset_with_ids = WeightedBinaryTreeDataset(list_vertices, list_edges, list_time, torch.device("cpu"), tree_ids)
+    assert torch.equal(dataset_with_ids.frequencies, dataset.frequencies)
+    assert torch.equal(dataset_with_ids.times, dataset.times)
+
+
+def test_length_buckets(tpch_oracle: "Oracle"):
+    plans = [
+        tpch_oracle.get_explain_plan(OracleRequest(query_name=query_name, hintset=hintset, dop=dop))
+        for query_name in tpch_oracle.get_query_names()
+        for dop in [1, 64]
+        for hintset in [0, 7]
+    ]
+    trees = PackedTrees(*extract_packed_vertices_and_edges(plans))
+    dataset = WeightedBinaryTreeDataset(trees, [], [torch.tensor(1.0)] * len(plans), torch.device("cpu"))
+    lengths = dataset.get_lengths()
+    boundaries = [4, 8, 16, 32, MAX_TREE_LENGTH]
+
+    sampler = LengthBucketBatchSampler(lengths, batch_size=3, bucket_boundaries=boundaries)
+    batches = list(sampler)
+    assert len(batches) == len(sampler) and sorted(sum(batches, [])) == list(range(len(dataset)))
+    assert batches != list(sampler)  # new order on every epoch
+    for batch in batches:
+        assert len({bisect.bisect_left(boundaries, lengths[idx]) for idx in batch}) == 1
+
+    exact_sampler = LengthBucketBatchSampler(lengths, batch_size=2, shuffle=False, drop_last=True)
+    assert all(len(batch) == 2 and lengths[batch[0]] == lengths[batch[1]] for batch in exact_sampler)
+
+    batch_ids = batches[0] + batches[-1]
+    max_length = max(lengths[idx] for idx in batch_ids)
+    (full_v, full_e, full_f), full_t = weighted_binary_tree_collate(
+        [dataset[idx] for idx in batch_ids], MAX_TREE_LENGTH
+    )
+    (v, e, f), t = weighted_binary_tree_collate([dataset[idx] for idx in batch_ids])
+    assert v.shape[-1] == e.shape[-2] == max_length
+    assert torch.equal(v, full_v[..., :max_length]) and torch.equal(e, full_e[..., :max_length, :])
+    assert torch.equal(f, full_f) and torch.equal(t, full_t)
+    (packed_v, packed_e, _), _ = weighted_binary_tree_collate(dataset[batch_ids], bucket_boundaries=boundaries)
+    padded_length = min(boundary for boundary in boundaries if boundary >= max_length)
+    assert torch.equal(packed_v, full_v[..., :padded_length]) and torch.equal(packed_e, full_e[..., :padded_length, :])
+
+    dataloader = DataLoader(dataset=dataset, batch_sampler=sampler, collate_fn=weighted_binary_tree_collate)
+    assert sum(int(f.sum()) for (_, _, f), _ in dataloader) == len(plans)
+
+
+def test_collated_dataset(tpch_oracle: "Oracle"):
+    plans = [
+        tpch_oracle.get_explain_plan(OracleRequest(query_name=query_name, hintset=hintset, dop=64))
+        for query_name in tpch_oracle.get_query_names()
+        for hintset in [0, 3]
+    ]
+    list_time = [torch.tensor(float(idx)) for idx in range(len(plans))]
+    trees = PackedTrees(*extract_packed_vertices_and_edges(plans))
+    dataset = WeightedBinaryTreeDataset(trees, [], list_time, torch.device("cpu"))
+    collated_dataset = CollatedTreeDataset(dataset, MAX_TREE_LENGTH)
+    assert len(collated_dataset) == len(dataset)
+    assert collated_dataset.vertices.shape == (len(dataset), trees.vertices.shape[1], MAX_TREE_LENGTH)
+    assert collated_dataset.edges.shape == (len(dataset), 1, MAX_TREE_LENGTH, 3)
+
+    dataloader = DataLoader(
+        dataset=dataset, batch_size=4, collate_fn=lambda el: weighted_binary_tree_collate(el, MAX_TREE_LENGTH)
+    )
+    for ((v, e, f), t), ((collated_v, collated_e, collated_f), collated_t) in zip(
+        dataloader, collated_dataset.iterate_batches(batch_size=4)
+    ):
+        assert torch.equal(v, collated_v) and torch.equal(e, collated_e)
+        assert torch.equal(f, collated_f) and torch.equal(t, collated_t)
+
+    shuffled_times = torch.cat([t for _, t in collated_dataset.iterate_batches(batch_size=4, shuffle=True)])
+    assert torch.equal(shuffled_times.sort().values, dataset.times.sort().values)
@@ -0,0 +1,83 @@
+import os
+import numpy as np
+from hbo_bench.oracle import Oracle, OracleKey, TIMEOUT
+from hbo_bench.effective_times import (
+    MEASURED,
+    MEAN_OF_LOGICAL_PLAN,
+    TWICE_MAX_DEFAULT_TIME,
+    EffectiveTimes,
+    compute_effective_times,
+    save_effective_times,
+    load_effective_times,
+)
+from hbo_bench.utils import get_logical_tree
+from hbo_bench.data_config import DOPS, HINTSETS, DEFAULT_HINTSET
+
+
+def test_compute_effective_times():
+    execution_times = np.array([[[10.0, 20.0, TIMEOUT, TIMEOUT], [30.0, TIMEOUT, 40.0, TIMEOUT]]])
+    is_timeout = execution_times == TIMEOUT
+    logical_plan_ids = np.array([[[0, 1, 1, 2], [0, 2, 1, 2]]])
+    table = compute_effective_times(execution_times, is_timeout, logical_plan_ids)
+    assert table.effective_execution_time.tolist() == [[[10.0, 20.0, 30.0, 60.0], [30.0, 60.0, 40.0, 60.0]]]
+    assert table.imputation_rule.tolist() == [[[0, 0, 1, 2], [0, 2, 0, 2]]]
+    assert np.array_equal(table.logical_plan_id, logical_plan_ids)
+
+
+def test_effective_times_persistence(tmp_path):
+    rng = np.random.default_rng(0)
+    shape = (3, len(DOPS), len(HINTSETS))
+    table = EffectiveTimes(rng.random(shape), rng.integers(0, 3, shape).astype(np.int8), rng.integers(0, 5, shape))
+    path = str(tmp_path / "bench.effective_times.npz")
+    save_effective_times(path, "fingerprint", ["a", "b", "c"], table)
+
+    loaded = load_effective_times(path, "fingerprint", ["c", "a", "b"])
+    assert loaded is not None
+    for column, loaded_column in zip(table, loaded):
+        assert np.array_equal(column[[2, 0, 1]], loaded_column)
+    assert load_effective_times(path, "other fingerprint", ["a", "b", "c"]) is None
+    assert load_effective_times(path, "fingerprint", ["a", "b"]) is None
+    assert load_effective_times(str(tmp_path / "missing.npz"), "fingerprint", ["a"]) is None
+
+    # persisting is best-effort, e.g. a file in place of the folder isn't an error
+    (tmp_path / "file").write_text("")
+    assert not save_effective_times(str(tmp_path / "file" / "bench.effective_times.npz"), "fingerprint", ["a"], table)
+    assert sorted(os.listdir(tmp_path)) == ["bench.effective_times.npz", "file"]
+
+
+def test_oracle_effective_times_cache_dir(tpch_oracle: "Oracle", tmp_path):
+    oracle = Oracle(tpch_oracle.path_to_bench, use_store=True, cache_dir=str(tmp_path))
+    query_names = oracle.get_query_names()
+    expected_times = tpch_oracle.get_effective_execution_times(query_names)
+    assert np.array_equal(oracle.get_effective_execution_times(query_names), expected_times)
+    assert os.listdir(tmp_path) == ["tpch_10gb.effective_times.npz"]
+    assert oracle.get_reopen_args()[1][-1] == str(tmp_path)
+
+
+def test_oracle_effective_times(tpch_oracle: "Oracle"):
+    query_name = "q11"
+    effective_times = tpch_oracle.get_effective_execution_times([query_name])[0]
+    rules = tpch_oracle.get_imputation_rules([query_name])[0]
+    execution_times = tpch_oracle.get_execution_times([query_name], timeout_value=np.nan)[0]
+    is_timeout = np.isnan(execution_times)
+    assert np.array_equal(rules == MEASURED, ~is_timeout)
+    assert np.array_equal(effective_times[~is_timeout], execution_times[~is_timeout])
+
+    logical_trees = [
+        [get_logical_tree(tpch_oracle.get_explain_plan(OracleKey(query_name, dop, hs))) for hs in HINTSETS]
+        for dop in DOPS
+    ]
+    for dop_idx, dop in enumerate(DOPS):
+        for hintset in HINTSETS:
+            request = OracleKey(query_name, dop, hintset)
+            assert tpch_oracle.get_effective_execution_time(request) == effective_times[dop_idx, hintset]
+            if not is_timeout[dop_idx, hintset]:
+                continue
+            same_plan = np.array([[tree == logical_trees[dop_idx][hintset] for tree in row] for row in logical_trees])
+            if rules[dop_idx, hintset] == MEAN_OF_LOGICAL_PLAN:
+                expected = np.mean(execution_times[same_plan & ~is_timeout])
+            else:
+                assert rules[dop_idx, hintset] == TWICE_MAX_DEFAULT_TIME
+                assert not (same_plan & ~is_timeout).any()
+                expected = 2 * np.max(execution_times[(same_plan & is_timeout).any(axis=1), DEFAULT_HINTSET])
+            assert np.isclose(effective_times[dop_idx, hintset], expected)
@@ -0,0 +1,46 @@
+import pytest
+import pstats
+from hbo_bench.oracle import Oracle, OracleKey
+from hbo_bench.runner import run_benchmark
+from hbo_bench.instrumentation import INSTRUMENTED, instrument, profile
+from hbo_bench.local_search_settings import LOCAL_SS
+
+
+def test_instrument(tpch_oracle: "Oracle"):
+    originals = [vars(owner)[name] for owner, name, _ in INSTRUMENTED]
+    query_names = ["q01", "q11"]
+    with instrument() as stats:
+        store_oracle = Oracle(tpch_oracle.path_to_bench, use_store=True)
+        run_benchmark(store_oracle, LOCAL_SS, query_names)
+        request = OracleKey("q01", 1, 0)
+        store_oracle.get_explain_plan(request)
+        store_oracle.get_explain_plan(request)
+    assert originals == [vars(owner)[name] for owner, name, _ in INSTRUMENTED]
+
+    assert stats.calls["Oracle.__init__"] == 1
+    assert stats.calls["QueryExplorer.run"] == len(query_names)
+    assert stats.calls["QueryExplorer._explore_codes_in_parallel"] >= len(query_names)
+    assert stats.calls["Oracle.get_explain_plan"] == stats.calls["Oracle._get_plans"] == 2
+    assert stats.calls["Oracle._get_plans <- test_instrument"] == 2
+    assert stats.calls["QueryExplorer._get_neighbor_codes"] >= len(query_names)
+    assert stats.counters["plans_cache_misses"] == stats.counters["plans_cache_hits"] == 1
+    assert all(seconds >= 0 for seconds in stats.seconds.values())
+    assert "QueryExplorer.run" in str(stats) and stats.to_dict()["calls"] == dict(stats.calls)
+
+    with instrument():
+        with pytest.raises(RuntimeError):
+            with instrument():
+                pass  # pragma: no cover
+    assert originals == [vars(owner)[name] for owner, name, _ in INSTRUMENTED]
+
+    # nothing is counted outside of the context
+    run_benchmark(tpch_oracle, LOCAL_SS, query_names)
+    assert stats.calls["QueryExplorer.run"] == len(query_names)
+
+
+def test_profile(tpch_oracle: "Oracle", tmp_path):
+    path = str(tmp_path / "sweep.prof")
+    with profile(path):
+        run_benchmark(tpch_oracle, LOCAL_SS, ["q01"])
+    functions = pstats.Stats(path).get_stats_profile().func_profiles
+    assert "run_query" in functions
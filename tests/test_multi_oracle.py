@@ -0,0 +1,55 @@
+import numpy as np
+from hbo_bench.oracle import Oracle, OracleKey
+from hbo_bench.multi_oracle import MultiOracle, make_query_name, split_query_name
+from hbo_bench.runner import run_query, imap_with_oracle
+from hbo_bench.local_search_settings import LOCAL_SS
+from hbo_bench.utils import extract_list_info
+from hbo_bench.sweep import score_states
+
+PATH_TO_DATA: "str" = "src/hbo_bench/data/processed"
+BENCH_NAMES = ["tpch_10gb", "sample_queries"]
+
+
+def test_multi_oracle():
+    multi_oracle = MultiOracle(PATH_TO_DATA, BENCH_NAMES, workers=2)
+    tpch_oracle = Oracle(f"{PATH_TO_DATA}/tpch_10gb", use_store=True)
+    sq_oracle = Oracle(f"{PATH_TO_DATA}/sample_queries", use_store=True)
+    query_names = [make_query_name("tpch_10gb", name) for name in tpch_oracle.get_query_names()]
+    query_names += [make_query_name("sample_queries", name) for name in sq_oracle.get_query_names()]
+    assert multi_oracle.get_query_names() == query_names
+    assert split_query_name(query_names[0]) == ("tpch_10gb", tpch_oracle.get_query_names()[0])
+
+    n_tpch_queries = len(tpch_oracle.get_query_names())
+    assert np.array_equal(multi_oracle.get_execution_times()[:n_tpch_queries], tpch_oracle.get_execution_times())
+    assert np.array_equal(multi_oracle.get_planning_times()[n_tpch_queries:], sq_oracle.get_planning_times())
+    assert np.array_equal(
+        multi_oracle.get_effective_execution_times()[:n_tpch_queries], tpch_oracle.get_effective_execution_times()
+    )
+    optimal_e2e_times = multi_oracle.get_optimum_index().optimal_e2e_time
+    assert np.array_equal(optimal_e2e_times[n_tpch_queries:], sq_oracle.get_optimum_index().optimal_e2e_time)
+
+    request = OracleKey(make_query_name("sample_queries", "q10_2a265"), 16, 42)
+    plan = multi_oracle.get_explain_plan(request)
+    assert plan == sq_oracle.get_explain_plan(OracleKey("q10_2a265", 16, 42))
+    other_plan = multi_oracle.get_explain_plan(request._replace(hintset=43))
+    assert plan.plan.node_type is other_plan.plan.node_type
+
+    query_name = make_query_name("tpch_10gb", "q01")
+    assert run_query(multi_oracle, LOCAL_SS, query_name) == run_query(tpch_oracle, LOCAL_SS, "q01")
+    list_info = extract_list_info(multi_oracle, [query_name])
+    assert len(list_info) == len(extract_list_info(tpch_oracle, ["q01"]))
+    assert all(info["query_name"] == query_name for info in list_info)
+
+    states = {query_name: run_query(multi_oracle, LOCAL_SS, query_name).best_state}
+    assert score_states(multi_oracle, states) == score_states(tpch_oracle, {"q01": states[query_name]})
+
+
+def _get_execution_time(oracle: "Oracle", request: "OracleKey") -> "float":
+    return oracle.get_execution_time(request)
+
+
+def test_multi_oracle_spawn_workers():
+    multi_oracle = MultiOracle(PATH_TO_DATA, BENCH_NAMES)
+    requests = [OracleKey(name, 16, 42) for name in multi_oracle.get_query_names()[::10]]
+    times = list(imap_with_oracle(multi_oracle, _get_execution_time, requests, workers=2, start_method="spawn"))
+    assert times == [multi_oracle.get_execution_time(request) for request in requests]
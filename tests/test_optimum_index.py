@@ -0,0 +1,49 @@
+import os
+import numpy as np
+from hbo_bench.oracle import Oracle, OracleKey
+from hbo_bench.optimum_index import compute_optimum_index, save_optimum_index, load_optimum_index
+from hbo_bench.data_config import DOPS, HINTSETS, DEFAULT_DOP, DEFAULT_HINTSET
+
+
+def test_compute_optimum_index():
+    # `[query, dop_idx, hintset]` for all `DOPS` and two hintsets
+    e2e_times = np.array([[[3.0, 1.0], [2.0, 4.0], [5.0, 1.0]]])
+    index = compute_optimum_index(e2e_times)
+    assert index.default_e2e_time.tolist() == [5.0]
+    # ties are broken by `(hintset, dop)` order of states
+    assert index.optimal_e2e_time.tolist() == [1.0]
+    assert (index.optimal_hintset.tolist(), index.optimal_dop_idx.tolist()) == ([1], [0])
+    assert index.state_rank.tolist() == [[[3, 0], [2, 4], [5, 1]]]
+    assert index.dop_optimal_e2e_time.tolist() == [[1.0, 2.0, 1.0]]
+    assert index.dop_optimal_hintset.tolist() == [[1, 0, 1]]
+
+
+def test_oracle_optimum_index(tpch_oracle: "Oracle", tmp_path):
+    oracle = Oracle(tpch_oracle.path_to_bench, use_store=True, cache_dir=str(tmp_path / "cache"))
+    index = oracle.get_optimum_index()
+    assert os.listdir(tmp_path / "cache") == ["tpch_10gb.optimum_index.npz"]
+    for query_id, query_name in enumerate(oracle.get_query_names()):
+        e2e_times = oracle.get_planning_times([query_name])[0] + oracle.get_execution_times([query_name])[0]
+        request = OracleKey(query_name, DEFAULT_DOP, DEFAULT_HINTSET)
+        default_e2e_time = oracle.get_planning_time(request) + oracle.get_execution_time(request)
+        assert index.default_e2e_time[query_id] == default_e2e_time
+        assert index.optimal_e2e_time[query_id] == e2e_times.min()
+        assert e2e_times[index.optimal_dop_idx[query_id], index.optimal_hintset[query_id]] == e2e_times.min()
+        assert sorted(index.state_rank[query_id].ravel().tolist()) == list(range(len(DOPS) * len(HINTSETS)))
+        assert np.array_equal(index.dop_optimal_e2e_time[query_id], e2e_times.min(axis=1))
+
+    query_names = oracle.get_query_names()[::-1]
+    assert np.array_equal(oracle.get_default_e2e_times(query_names), index.default_e2e_time[::-1])
+    assert np.array_equal(oracle.get_optimal_e2e_times(), index.optimal_e2e_time)
+    ranks = oracle.get_state_ranks(query_names[:2], [DEFAULT_DOP, DOPS[0]], [DEFAULT_HINTSET, 1])
+    default_dop_idx = DOPS.index(DEFAULT_DOP)
+    assert ranks.tolist() == [index.state_rank[-1, default_dop_idx, DEFAULT_HINTSET], index.state_rank[-2, 0, 1]]
+
+    path = str(tmp_path / "bench.optimum_index.npz")
+    query_names = oracle.get_query_names()
+    save_optimum_index(path, oracle.get_fingerprint(), query_names, index)
+    loaded = load_optimum_index(path, oracle.get_fingerprint(), query_names[::-1])
+    assert loaded is not None
+    for column, loaded_column in zip(index, loaded):
+        assert np.array_equal(column[::-1], loaded_column)
+    assert load_optimum_index(path, "other fingerprint", query_names) is None
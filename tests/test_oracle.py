@@ -1,6 +1,10 @@
+import os
+import math
+import shutil
 from typing import Dict
-from hbo_bench.oracle import Oracle, OracleRequest
-from hbo_bench.data_config import BENCH_NAME_TO_SIZE
+import pytest
+from hbo_bench.oracle import Oracle, OracleRequest, OracleKey, TIMEOUT
+from hbo_bench.data_config import BENCH_NAME_TO_SIZE, DOPS, HINTSETS
 from hbo_bench.data_types import ExplainAnalyzePlan, ExplainPlan, Time, QueryName, Cost
 
 
@@ -23,3 +27,70 @@ def test_types_and_sizes():
         assert isinstance(oracle.get_explain_analyze_plan(request=oracle_request), (type(None), ExplainAnalyzePlan))
         assert isinstance(oracle.get_explain_plan(request=oracle_request), ExplainPlan)
         assert isinstance(oracle.get_cost(request=oracle_request), Cost)
+
+
+def test_store_consistency():
+    for bench_name, query_name in BENCH_NAME_TO_EXAMPLE_QUERY.items():
+        oracle, store_oracle = Oracle(f"{PATH_TO_DATA}/{bench_name}"), Oracle(f"{PATH_TO_DATA}/{bench_name}", True)
+        assert sorted(oracle.get_query_names()) == sorted(store_oracle.get_query_names())
+        for hintset in [0, 42, 127]:
+            oracle_request = OracleRequest(query_name=query_name, dop=16, hintset=hintset)
+            assert oracle.get_planning_time(oracle_request) == store_oracle.get_planning_time(oracle_request)
+            assert oracle.get_execution_time(oracle_request) == store_oracle.get_execution_time(oracle_request)
+            assert oracle.get_cost(oracle_request) == store_oracle.get_cost(oracle_request)
+            assert oracle.get_explain_plan(oracle_request) == store_oracle.get_explain_plan(oracle_request)
+
+
+def test_lazy_plans_cache():
+    oracle = Oracle(f"{PATH_TO_DATA}/tpch_10gb", use_store=True, plans_cache_size=2)
+    for hintset in [0, 1, 0, 2, 1]:
+        plan = oracle.get_explain_plan(OracleRequest(query_name="q01", dop=1, hintset=hintset))
+        assert isinstance(plan, ExplainPlan)
+    cache_info = oracle.get_plans_cache_info()
+    assert (cache_info.hits, cache_info.misses, cache_info.currsize) == (1, 4, 2)
+
+
+def test_batched_lookups(tpch_oracle: "Oracle"):
+    query_names = tpch_oracle.get_query_names()
+    execution_times = tpch_oracle.get_execution_times()
+    assert execution_times.shape == (len(query_names), len(DOPS), len(HINTSETS))
+    assert tpch_oracle.get_planning_times(query_names=["q01", "q02"], dops=[1]).shape == (2, 1, len(HINTSETS))
+
+    triples = [("q01", 1, 0), ("q11", 64, 42), ("q22", 16, 127)]
+    names, dops, hintsets = zip(*triples)
+    planning_times = tpch_oracle.get_planning_times(names, dops, hintsets)
+    masked_times = tpch_oracle.get_execution_times(names, dops, hintsets, timeout_value=float("nan"))
+    for (name, dop, hintset), planning_time, masked_time in zip(triples, planning_times, masked_times):
+        request = OracleRequest(query_name=name, dop=dop, hintset=hintset)
+        assert planning_time == tpch_oracle.get_planning_time(request)
+        execution_time = tpch_oracle.get_execution_time(request)
+        assert masked_time == execution_time if execution_time != TIMEOUT else math.isnan(masked_time)
+        query_id, dop_idx = query_names.index(name), DOPS.index(dop)
+        assert execution_times[query_id, dop_idx, hintset] == execution_time
+
+
+def test_unvalidated_keys(tpch_oracle: "Oracle"):
+    request, key = OracleRequest(query_name="q01", dop=16, hintset=42), OracleKey("q01", 16, 42)
+    assert tpch_oracle.get_planning_time(request) == tpch_oracle.get_planning_time(key)
+    assert tpch_oracle.get_execution_time(request) == tpch_oracle.get_execution_time(key)
+    assert tpch_oracle.get_explain_plan(request) == tpch_oracle.get_explain_plan(key)
+
+
+def test_outdated_store(tmp_path):
+    path_to_bench = str(tmp_path / "bench")
+    shutil.copytree(f"{PATH_TO_DATA}/tpch_10gb", path_to_bench)
+    query_names = Oracle(path_to_bench, use_store=True).get_query_names()
+
+    # removed queries aren't served by the old store
+    os.remove(f"{path_to_bench}/q01.json")
+    assert Oracle(path_to_bench, use_store=True).get_query_names() == query_names[1:]
+
+    # added queries are found even when their files are older than the store
+    shutil.copy2(f"{PATH_TO_DATA}/tpch_10gb/q01.json", f"{path_to_bench}/q01.json")
+    os.utime(f"{path_to_bench}/q01.json", (0, 0))
+    assert Oracle(path_to_bench, use_store=True).get_query_names() == query_names
+
+    for file_name in os.listdir(path_to_bench):
+        os.remove(f"{path_to_bench}/{file_name}")
+    with pytest.raises(AssertionError):
+        Oracle(path_to_bench, use_store=True)
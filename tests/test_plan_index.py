@@ -0,0 +1,48 @@
+import os
+import torch
+from hbo_bench.oracle import Oracle, OracleKey
+import numpy as np
+from hbo_bench.plan_index import PlanIndex, get_plan_key, get_plan_index, get_path_to_plan_index
+from hbo_bench.vectorization import extract_vertices_and_edges
+from hbo_bench.data_config import DOPS, HINTSETS
+
+
+def test_plan_index(tpch_oracle: "Oracle"):
+    query_names = ["q01", "q11", "q17"]
+    plan_index = PlanIndex(tpch_oracle, query_names)
+    assert 0 < len(plan_index) <= len(query_names) * len(DOPS) * len(HINTSETS)
+    assert sum(len(plan_index.get_group(plan_id)) for plan_id in range(len(plan_index))) == plan_index.plan_ids.size
+
+    for plan_id in range(len(plan_index)):
+        representative = plan_index.get_representative(plan_id)
+        plan_key = get_plan_key(tpch_oracle.get_explain_plan(representative))
+        vertices, edges = extract_vertices_and_edges(tpch_oracle.get_explain_plan(representative))
+        for request in plan_index.get_group(plan_id):
+            assert plan_index.get_plan_id(*request) == plan_id
+            plan = tpch_oracle.get_explain_plan(request)
+            assert get_plan_key(plan) == plan_key
+            other_vertices, other_edges = extract_vertices_and_edges(plan)
+            assert torch.equal(vertices, other_vertices) and torch.equal(edges, other_edges)
+
+    plan_ids = plan_index.get_query_plan_ids("q11")
+    assert plan_ids.shape == (len(DOPS), len(HINTSETS))
+    assert plan_ids[0, 0] == plan_index.get_plan_id("q11", DOPS[0], 0)
+    assert OracleKey("q11", DOPS[0], 0) in plan_index.get_group(int(plan_ids[0, 0]))
+
+
+def test_benchmark_plan_index(tpch_oracle: "Oracle", tmp_path):
+    oracle = Oracle(tpch_oracle.path_to_bench, cache_dir=str(tmp_path))
+    plan_index = get_plan_index(oracle)
+    assert get_plan_index(oracle) is plan_index
+    assert plan_index.query_names == oracle.get_query_names()
+    assert len(plan_index) == len(np.unique(plan_index.plan_ids))
+    assert os.listdir(tmp_path) == ["tpch_10gb.plan_index.npz"]
+
+    oracle = Oracle(tpch_oracle.path_to_bench, use_store=True, cache_dir=str(tmp_path))
+    persisted_plan_index = get_plan_index(oracle)
+    assert oracle.get_plans_cache_info().misses == 0
+    order = [plan_index.query_name_to_id[name] for name in oracle.get_query_names()]
+    assert np.array_equal(persisted_plan_index.plan_ids, plan_index.plan_ids[order])
+    for plan_id in range(len(plan_index)):
+        assert sorted(persisted_plan_index.get_group(plan_id)) == sorted(plan_index.get_group(plan_id))
+    assert get_path_to_plan_index(oracle.cache_prefix) == str(tmp_path / "tpch_10gb.plan_index.npz")
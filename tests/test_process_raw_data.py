@@ -0,0 +1,120 @@
+import os
+from json import load, dump, dumps
+import pytest
+import process_raw_data as process_raw_data_module
+from process_raw_data import iterate_raw_queries, process_raw_data, process_benchmark, DOPS
+
+BENCH_NAME = "tpch_10gb"
+
+
+def _make_sql_data(cost: "float", is_timeout: "bool" = False) -> "dict":
+    explain_plan = {"Plan": {"Node Type": "Seq Scan", "Relation Name": "t", "Plan Rows": 1, "Total Cost": cost}}
+    analyze_plan = {"Plan": {**explain_plan["Plan"], "Actual Total Rows": 2}, "Total Runtime": 1.0}
+    if is_timeout:
+        analyze_plan = {"Timeout": True}
+    return {
+        "hs_to_planning_time": {"0": 0.1, "1": 0.2},
+        "hs_to_explain_plan": {"0": explain_plan, "1": explain_plan},
+        "explain_plan_to_explain_analyze_plan": {dumps(explain_plan): analyze_plan},
+    }
+
+
+def _write_raw_data(path_to_raw: "str", dop_to_raw_data: "dict") -> "None":
+    for dop, raw_data in dop_to_raw_data.items():
+        os.makedirs(f"{path_to_raw}/dop{dop}", exist_ok=True)
+        with open(f"{path_to_raw}/dop{dop}/{BENCH_NAME}.json", "w") as raw_file:
+            dump(raw_data, raw_file, indent=2)
+
+
+def _load_output(path_to_processed: "str", query_name: "str") -> "dict":
+    with open(f"{path_to_processed}/{BENCH_NAME}/{query_name}.json", "r") as output_file:
+        return load(output_file)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_iterate_raw_queries(tmp_path, chunk_size: "int"):
+    path = str(tmp_path / "raw.json")
+    raw_text = ' \n{ "a\\"b.sql" : {"x": [1, 2.5e3, "\\u00e9}"]} ,\n"c.sql":123456,"d.sql":"ы"  }\n'
+    with open(path, "w") as raw_file:
+        raw_file.write(raw_text)
+    queries = list(iterate_raw_queries(path, chunk_size))
+    assert [(name, data) for name, data, _ in queries] == [
+        ('a"b.sql', {"x": [1, 2500.0, "é}"]}),
+        ("c.sql", 123456),
+        ("d.sql", "ы"),
+    ]
+    # hashes depend only on raw text of values
+    assert queries == list(iterate_raw_queries(path, 1024))
+
+    with open(path, "w") as raw_file:
+        raw_file.write(" {} ")
+    assert not list(iterate_raw_queries(path, chunk_size))
+    with open(path, "w") as raw_file:
+        raw_file.write('{"a": 1 "b": 2}')
+    with pytest.raises(AssertionError):
+        list(iterate_raw_queries(path, chunk_size))
+
+
+def test_process_raw_data(tmp_path):
+    path_to_raw, path_to_processed = str(tmp_path / "raw"), str(tmp_path / "processed")
+    dop_to_raw_data = {dop: {"q1.sql": _make_sql_data(1.0), "q2.sql": _make_sql_data(2.0, True)} for dop in DOPS}
+    _write_raw_data(path_to_raw, dop_to_raw_data)
+    assert process_raw_data(path_to_raw, path_to_processed, [BENCH_NAME]) == {BENCH_NAME: ["q1.sql", "q2.sql"]}
+    q1_data = _load_output(path_to_processed, "q1")
+    assert list(q1_data) == [str((dop, hintset)) for dop in DOPS for hintset in [0, 1]]
+    assert q1_data["(16, 1)"]["explain_analyze_plan"]["Plan"]["Actual Rows"] == 2
+    assert _load_output(path_to_processed, "q2")["(1, 0)"]["explain_analyze_plan"] is None
+
+    # unchanged queries are skipped
+    assert process_raw_data(path_to_raw, path_to_processed, [BENCH_NAME]) == {BENCH_NAME: []}
+
+    # only the changed dop is reprocessed, the order of settings is kept
+    dop_to_raw_data[16]["q1.sql"] = _make_sql_data(3.0)
+    _write_raw_data(path_to_raw, dop_to_raw_data)
+    assert process_raw_data(path_to_raw, path_to_processed, [BENCH_NAME], workers=2) == {BENCH_NAME: ["q1.sql"]}
+    new_q1_data = _load_output(path_to_processed, "q1")
+    assert list(new_q1_data) == list(q1_data)
+    assert new_q1_data["(16, 0)"]["explain_plan"]["Plan"]["Total Cost"] == 3.0
+    assert new_q1_data["(64, 0)"] == q1_data["(64, 0)"]
+
+    # missing outputs are rebuilt
+    os.remove(f"{path_to_processed}/{BENCH_NAME}/q2.json")
+    assert process_raw_data(path_to_raw, path_to_processed, [BENCH_NAME]) == {BENCH_NAME: ["q2.sql"]}
+    assert len(_load_output(path_to_processed, "q2")) == len(DOPS) * 2
+
+    # removed queries are pruned
+    for raw_data in dop_to_raw_data.values():
+        del raw_data["q2.sql"]
+    _write_raw_data(path_to_raw, dop_to_raw_data)
+    assert process_raw_data(path_to_raw, path_to_processed, [BENCH_NAME]) == {BENCH_NAME: ["q2.sql"]}
+    assert os.listdir(f"{path_to_processed}/{BENCH_NAME}") == ["q1.json"]
+
+
+def test_process_benchmark_writes_once(tmp_path, monkeypatch):
+    path_to_raw, path_to_processed = str(tmp_path / "raw"), str(tmp_path / "processed")
+    dop_to_raw_data = {dop: {"q1.sql": _make_sql_data(1.0), "q2.sql": _make_sql_data(2.0)} for dop in DOPS}
+    _write_raw_data(path_to_raw, dop_to_raw_data)
+    written_paths = []
+    write_text = process_raw_data_module._write_text  # pylint: disable=protected-access
+
+    def counting_write_text(text: "str", path: "str") -> "None":
+        written_paths.append(os.path.basename(path))
+        write_text(text, path)
+
+    monkeypatch.setattr(process_raw_data_module, "_write_text", counting_write_text)
+    hashes, updated = process_benchmark(path_to_raw, path_to_processed, BENCH_NAME, {})
+    assert updated == ["q1.sql", "q2.sql"] and sorted(written_paths) == ["q1.json", "q2.json"]
+    # the text is the same as `json.dumps` of the whole data
+    q1_data = _load_output(path_to_processed, "q1")
+    with open(f"{path_to_processed}/{BENCH_NAME}/q1.json", "r") as output_file:
+        assert output_file.read() == dumps(q1_data)
+
+    written_paths.clear()
+    del dop_to_raw_data[1]["q2.sql"]
+    dop_to_raw_data[16]["q2.sql"] = _make_sql_data(3.0)
+    _write_raw_data(path_to_raw, dop_to_raw_data)
+    assert process_benchmark(path_to_raw, path_to_processed, BENCH_NAME, hashes)[1] == ["q2.sql"]
+    assert written_paths == ["q2.json"]
+    q2_data = _load_output(path_to_processed, "q2")
+    assert list(q2_data) == [str((dop, hintset)) for dop in DOPS[1:] for hintset in [0, 1]]
+    assert q2_data["(16, 0)"]["explain_plan"]["Plan"]["Total Cost"] == 3.0
@@ -1,7 +1,15 @@
 from hbo_bench.oracle import Oracle
-from hbo_bench.query_explorer import QueryExplorer, SearchingState
+from hbo_bench.query_explorer import (
+    QueryExplorer,
+    SearchingState,
+    get_neighbor_table,
+    ALL_STATES,
+    STATE_TO_CODE,
+    N_STATES,
+    OFF_INL_HINT,
+)
 from hbo_bench.data_config import DEFAULT_DOP, DEFAULT_HINTSET
-from hbo_bench.local_search_settings import LOCAL_SS, LOCAL_DEF_DOP_SS
+from hbo_bench.local_search_settings import LOCAL_SS, LOCAL_DEF_DOP_SS, ALL_SS, EMPTY_SS
 
 
 def test_boost(tpch_oracle: "Oracle"):
@@ -9,3 +17,35 @@ def test_boost(tpch_oracle: "Oracle"):
         explorer = QueryExplorer(tpch_oracle, "q11", ss)
         def_state, best_state = SearchingState(DEFAULT_HINTSET, DEFAULT_DOP), explorer.run()
         assert explorer.get_e2e_time(def_state) > explorer.get_e2e_time(best_state)
+
+
+def test_neighbor_table():
+    table = get_neighbor_table(True, True, True, True, True)
+    assert len(table) == N_STATES
+    state = SearchingState(hintset=0, dop=64)
+    neighbors = [ALL_STATES[code] for code in table[STATE_TO_CODE[state]]]
+    assert neighbors[0] == state and len(set(neighbors)) == len(neighbors)
+    assert SearchingState(hintset=OFF_INL_HINT, dop=1) in neighbors
+    assert SearchingState(hintset=0, dop=16) in neighbors
+    assert get_neighbor_table(False, False, False, False, False)[STATE_TO_CODE[state]] == (STATE_TO_CODE[state],)
+
+
+def test_hardcoded_exploration(tpch_oracle: "Oracle"):
+    # only the default state is explored for the empty grid
+    explorer = QueryExplorer(tpch_oracle, "q11", EMPTY_SS)
+    def_state = SearchingState(DEFAULT_HINTSET, DEFAULT_DOP)
+    assert explorer.run() == def_state and explorer.tried_states == {def_state}
+    assert explorer.parallel_e2e_time == explorer.get_e2e_time(def_state)
+
+    explorer = QueryExplorer(tpch_oracle, "q11", ALL_SS)
+    best_state = explorer.run()
+    assert explorer.tried_states == set(ALL_STATES)
+    assert explorer.get_e2e_time(best_state) == min(explorer.get_e2e_time(st) for st in ALL_STATES)
+
+    for batch_size in [16, 64]:
+        batched_explorer = QueryExplorer(tpch_oracle, "q11", ALL_SS._replace(hardcoded_batch_size=batch_size))
+        pruned_ss = ALL_SS._replace(hardcoded_batch_size=batch_size, prune_hardcoded=True)
+        pruned_explorer = QueryExplorer(tpch_oracle, "q11", pruned_ss)
+        assert batched_explorer.run() == pruned_explorer.run() == best_state
+        assert batched_explorer.parallel_e2e_time >= explorer.parallel_e2e_time
+        assert pruned_explorer.tried_states <= batched_explorer.tried_states
@@ -0,0 +1,12 @@
+from hbo_bench.oracle import Oracle
+from hbo_bench.runner import run_benchmark, run_query
+from hbo_bench.local_search_settings import LOCAL_SS, PRUNED_GREEDY_SS
+
+
+def test_parallel_run(tpch_oracle: "Oracle"):
+    for ss in [LOCAL_SS, PRUNED_GREEDY_SS]:
+        results = run_benchmark(tpch_oracle, ss, workers=2)
+        assert list(results) == tpch_oracle.get_query_names()
+        for query_name, result in results.items():
+            assert result == run_query(tpch_oracle, ss, query_name)
+            assert result.boost >= 1.0
@@ -0,0 +1,29 @@
+import multiprocessing as mp
+import numpy as np
+from hbo_bench.oracle import Oracle, OracleKey
+from hbo_bench.shared_store import SharedStore
+
+PATH_TO_BENCH: "str" = "src/hbo_bench/data/processed/tpch_10gb"
+
+
+def _get_execution_times(name: "str") -> "np.ndarray":
+    return Oracle(PATH_TO_BENCH, shared_memory_name=name).get_execution_times()
+
+
+def test_shared_store():
+    oracle = Oracle(PATH_TO_BENCH, use_store=True)
+    with SharedStore(PATH_TO_BENCH) as shared_store:
+        client_oracle = Oracle(PATH_TO_BENCH, shared_memory_name=shared_store.name)
+        assert client_oracle.get_query_names() == oracle.get_query_names()
+        assert client_oracle.get_fingerprint() == oracle.get_fingerprint()
+        assert np.array_equal(client_oracle.get_costs(), oracle.get_costs())
+        request = OracleKey("q01", 16, 42)
+        assert client_oracle.get_planning_time(request) == oracle.get_planning_time(request)
+        assert client_oracle.get_explain_analyze_plan(request) == oracle.get_explain_analyze_plan(request)
+        assert not client_oracle.store.execution_time.flags.writeable
+
+        # clients in other processes neither copy nor destroy the shared store
+        with mp.get_context("spawn").Pool(processes=2) as pool:
+            for execution_times in pool.map(_get_execution_times, [shared_store.name] * 2):
+                assert np.array_equal(execution_times, oracle.get_execution_times())
+        assert np.array_equal(client_oracle.get_execution_times(), oracle.get_execution_times())
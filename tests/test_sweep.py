@@ -0,0 +1,57 @@
+import pytest
+from hbo_bench.oracle import Oracle
+from hbo_bench import sweep
+from hbo_bench.sweep import (
+    generate_settings_grid,
+    canonicalize_settings,
+    run_sweep,
+    summarize,
+    score_states,
+    SweepPoint,
+)
+from hbo_bench.runner import run_benchmark
+from hbo_bench.local_search_settings import ALL_SS, LOCAL_SS
+
+
+def test_grid_and_canonicalization():
+    grid = generate_settings_grid(max_iter=[1, 1000, float("inf")], use_joined_search=[False, True])
+    assert len(grid) == 6
+    assert len({canonicalize_settings(settings) for settings in grid}) == 1
+    grid = generate_settings_grid(disable_scans=[True], decrease_dop=[False, True], relative_boost_threshold=[1.0, 1.5])
+    assert len({canonicalize_settings(settings) for settings in grid}) == 4
+    grid = generate_settings_grid(
+        hardcoded_hintsets=[[0, 1]], hardcoded_dops=[[64], None], hardcoded_batch_size=[None, 1000], max_iter=[1, 2]
+    )
+    assert len({canonicalize_settings(settings) for settings in grid}) == 1
+    with pytest.raises(AssertionError):
+        generate_settings_grid(unknown_field=[1])
+
+
+def test_sweep_with_cache(tpch_oracle: "Oracle", tmp_path, monkeypatch):
+    grid = generate_settings_grid(disable_scans=[True], disable_joins=[True], max_iter=[1, float("inf")])
+    points = run_sweep({"tpch_10gb": tpch_oracle}, grid, cache_dir=str(tmp_path), workers=2)
+    assert len(points) == len(grid)
+    for point in points:
+        assert point.results == run_benchmark(tpch_oracle, point.settings)
+        assert summarize(point)["boost"] >= 1.0
+
+    monkeypatch.setattr(sweep, "run_tasks", lambda *args: pytest.fail("results should be taken from cache"))
+    assert run_sweep({"tpch_10gb": tpch_oracle}, grid, cache_dir=str(tmp_path)) == points
+
+
+def test_vectorized_sweep(tpch_oracle: "Oracle"):
+    grid = generate_settings_grid(disable_scans=[True], decrease_dop=[False, True], max_iter=[1, float("inf")])
+    points = run_sweep({"tpch_10gb": tpch_oracle}, grid)
+    assert run_sweep({"tpch_10gb": tpch_oracle}, grid, vectorized=True) == points
+
+
+def test_score_states(tpch_oracle: "Oracle"):
+    for settings in [LOCAL_SS, ALL_SS]:
+        results = run_benchmark(tpch_oracle, settings)
+        scores = score_states(tpch_oracle, {query_name: result.best_state for query_name, result in results.items()})
+        summary = summarize(SweepPoint("tpch_10gb", settings, results))
+        assert pytest.approx(summary["def_e2e_time"]) == scores["def_e2e_time"]
+        assert pytest.approx(summary["best_e2e_time"]) == scores["e2e_time"]
+        assert pytest.approx(summary["boost"]) == scores["boost"]
+        assert scores["regret"] >= 0 and scores["optimal_boost"] >= scores["boost"]
+    assert scores["regret"] == 0 and scores["mean_rank"] == 0
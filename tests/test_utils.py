@@ -0,0 +1,42 @@
+import os
+import pytest
+import torch
+from hbo_bench.oracle import Oracle
+from hbo_bench import utils
+from hbo_bench.utils import extract_list_info, iterate_list_info, QueryInfo
+
+
+def _assert_same_info(info: "QueryInfo", other_info: "QueryInfo"):
+    for key in ["query_name", "hintset", "dop", "plan_id"]:
+        assert info[key] == other_info[key]  # type: ignore[literal-required]
+    for key in ["time", "vertices", "edges"]:
+        assert torch.equal(info[key], other_info[key])  # type: ignore[literal-required]
+
+
+def test_iterate_list_info(tpch_oracle: "Oracle", tmp_path, monkeypatch):
+    query_names = ["q01", "q11", "q17"]
+    list_info = extract_list_info(tpch_oracle, query_names)
+    # settings with the same plan share vectors, also across queries
+    plan_id_to_vertices = {info["plan_id"]: info["vertices"] for info in list_info}
+    assert all(info["vertices"] is plan_id_to_vertices[info["plan_id"]] for info in list_info)
+    for workers in [1, 2]:
+        streamed_list_info = list(iterate_list_info(tpch_oracle, query_names, workers=workers))
+        assert len(streamed_list_info) == len(list_info)
+        for info, streamed_info in zip(list_info, streamed_list_info):
+            _assert_same_info(info, streamed_info)
+
+    checkpoint_dir = str(tmp_path)
+    stream = iterate_list_info(tpch_oracle, query_names, checkpoint_dir=checkpoint_dir)
+    assert next(stream)["query_name"] == "q01"
+    (subdir,) = os.listdir(checkpoint_dir)
+    assert os.listdir(f"{checkpoint_dir}/{subdir}") == ["q01.pt"]
+
+    monkeypatch.setattr(utils, "extract_query_info", lambda *args: pytest.fail("q01 should be taken from checkpoint"))
+    resumed_stream = iterate_list_info(tpch_oracle, query_names[:1], checkpoint_dir=checkpoint_dir)
+    for info, resumed_info in zip(list_info, resumed_stream):
+        _assert_same_info(info, resumed_info)
+
+    # records with outdated imputed times aren't reused
+    monkeypatch.setattr(utils, "IMPUTATION_VERSION", utils.IMPUTATION_VERSION + 1)
+    with pytest.raises(pytest.fail.Exception):
+        next(iterate_list_info(tpch_oracle, query_names[:1], checkpoint_dir=checkpoint_dir))
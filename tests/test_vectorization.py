@@ -1,5 +1,12 @@
+from typing import List, Tuple
 from hbo_bench.oracle import Oracle, OracleRequest
-from hbo_bench.vectorization import extract_vertices_and_edges, ALL_OPERATIONS
+from hbo_bench.data_types import ExplainNode, ExplainPlan
+from hbo_bench.vectorization import (
+    extract_vertices_and_edges,
+    extract_packed_vertices_and_edges,
+    node_to_feature_tensor,
+    ALL_OPERATIONS,
+)
 import math
 import torch
 
@@ -14,3 +21,43 @@ def test_vertices_and_edges(tpch_oracle: "Oracle"):
     assert vertices[0][-1] == 1.0
     assert vertices[0][-2] == math.log(6.0)
     assert torch.allclose(edges[0], torch.tensor([1, 2, 0], dtype=torch.long))
+
+
+def _extract_vertices_and_edges_recursively(plan: "ExplainPlan") -> "Tuple[torch.Tensor, torch.Tensor]":
+    vertices: "List[torch.Tensor]" = []
+    edges: "List[List[int]]" = []
+
+    def recurse(node: "ExplainNode") -> "None":
+        cur_num = len(vertices)
+        vertices.append(node_to_feature_tensor(node))
+        edges.append([cur_num + 1])
+        for child in node.plans:
+            edges[cur_num].append(len(vertices) + 1)
+            recurse(child)
+        edges[cur_num].extend([0] * (2 - len(node.plans)))
+
+    recurse(plan.plan)
+    return torch.stack(vertices), torch.tensor(edges, dtype=torch.long)
+
+
+def test_vertices_and_edges_match_node_features(tpch_oracle: "Oracle"):
+    for query_name in tpch_oracle.get_query_names():
+        for hintset in [0, 42, 127]:
+            plan = tpch_oracle.get_explain_plan(OracleRequest(query_name=query_name, hintset=hintset, dop=64))
+            expected_vertices, expected_edges = _extract_vertices_and_edges_recursively(plan)
+            vertices, edges = extract_vertices_and_edges(plan)
+            assert vertices.dtype == torch.float32 and edges.dtype == torch.long
+            assert torch.equal(vertices, expected_vertices) and torch.equal(edges, expected_edges)
+
+
+def test_packed_vertices_and_edges(tpch_oracle: "Oracle"):
+    plans = [
+        tpch_oracle.get_explain_plan(OracleRequest(query_name=query_name, hintset=0, dop=1))
+        for query_name in tpch_oracle.get_query_names()
+    ]
+    vertices, edges, offsets = extract_packed_vertices_and_edges(plans)
+    assert len(offsets) == len(plans) + 1 and offsets[-1] == len(vertices) == len(edges)
+    for plan, start, end in zip(plans, offsets[:-1], offsets[1:]):
+        expected_vertices, expected_edges = extract_vertices_and_edges(plan)
+        assert torch.equal(vertices[start:end], expected_vertices)
+        assert torch.equal(edges[start:end], torch.where(expected_edges > 0, expected_edges + start, 0))
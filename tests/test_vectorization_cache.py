@@ -0,0 +1,67 @@
+import os
+import pytest
+import torch
+from hbo_bench.oracle import Oracle, OracleRequest
+from hbo_bench import vectorization_cache
+from hbo_bench.vectorization import extract_vertices_and_edges, get_plan_fingerprint
+from hbo_bench.vectorization_cache import VectorizationCache
+from hbo_bench.utils import extract_list_info, iterate_list_info
+
+
+def test_vectorization_cache(tpch_oracle: "Oracle", tmp_path, monkeypatch):
+    plans = [
+        tpch_oracle.get_explain_plan(OracleRequest(query_name="q01", hintset=hintset, dop=dop))
+        for dop in [1, 64]
+        for hintset in range(8)
+    ]
+    cache = VectorizationCache(str(tmp_path))
+    for plan in plans:
+        vertices, edges = extract_vertices_and_edges(plan)
+        cached_vertices, cached_edges = cache.get_vertices_and_edges(plan)
+        assert torch.equal(vertices, cached_vertices) and torch.equal(edges, cached_edges)
+    assert len(cache) == len({get_plan_fingerprint(plan) for plan in plans})
+    cache.save()
+
+    reopened_cache = VectorizationCache(str(tmp_path))
+    assert len(reopened_cache) == len(cache) and not reopened_cache.new_records
+    for plan in plans:
+        vertices, edges = extract_vertices_and_edges(plan)
+        cached_vertices, cached_edges = reopened_cache.get_vertices_and_edges(plan)
+        assert torch.equal(vertices, cached_vertices) and torch.equal(edges, cached_edges)
+
+    monkeypatch.setattr(vectorization_cache, "FEATURES_SCHEMA_HASH", "changed")
+    assert len(VectorizationCache(str(tmp_path))) == 0
+
+
+def test_extract_list_info_with_cache(tpch_oracle: "Oracle", tmp_path):
+    list_info = extract_list_info(tpch_oracle, ["q01", "q11"])
+    for _ in range(2):
+        cached_list_info = extract_list_info(tpch_oracle, ["q01", "q11"], VectorizationCache(str(tmp_path)))
+        assert len(os.listdir(tmp_path)) == 1
+        assert len(cached_list_info) == len(list_info)
+        for info, cached_info in zip(list_info, cached_list_info):
+            assert info["time"] == cached_info["time"]
+            assert torch.equal(info["vertices"], cached_info["vertices"])
+            assert torch.equal(info["edges"], cached_info["edges"])
+
+
+def test_iterate_list_info_with_cache_and_workers(tpch_oracle: "Oracle", tmp_path):
+    query_names = ["q01", "q11", "q15"]
+    list_info = extract_list_info(tpch_oracle, query_names)
+    cache = VectorizationCache(str(tmp_path))
+    streamed_list_info = list(iterate_list_info(tpch_oracle, query_names, cache, workers=2))
+    assert len(streamed_list_info) == len(list_info)
+    for info, streamed_info in zip(list_info, streamed_list_info):
+        assert torch.equal(info["vertices"], streamed_info["vertices"])
+
+    # new vectors of workers are merged and saved by the parent
+    assert len(cache) > 0 and not cache.new_records
+    reopened_cache = VectorizationCache(str(tmp_path))
+    assert len(reopened_cache) == len(cache)
+    list(iterate_list_info(tpch_oracle, query_names, reopened_cache, workers=2))
+    assert not reopened_cache.new_records
+
+    read_only_cache = VectorizationCache(str(tmp_path), read_only=True)
+    read_only_cache.add_records({b"new": read_only_cache.records[:1]})
+    with pytest.raises(AssertionError):
+        read_only_cache.save()